@@ -0,0 +1,153 @@
+"""Cache of AI dispatch and ATC replies for routine exchanges.
+
+Most radio calls are routine ("request taxi", "ready for departure") and
+arrive with a near-identical aircraft state. Replies are cached under a key
+built from the controller, airport, normalised pilot message and a coarse
+bucket of the mission state (phase, altitude band, position cell). Prompts
+carry the mission's recent radio transcript, so that is part of the key too.
+The callsign is stored as a placeholder and substituted back in for each
+requester.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+AI_CACHE_TTL_SECONDS = float(os.environ.get('AI_CACHE_TTL_SECONDS', 900))
+AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000))
+AI_CACHE_ALTITUDE_BAND_FT = int(os.environ.get('AI_CACHE_ALTITUDE_BAND_FT', 500))
+AI_CACHE_CELL_DEG = float(os.environ.get('AI_CACHE_CELL_DEG', 0.1))
+
+CALLSIGN_PLACEHOLDER = '{callsign}'
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_message(message: str, callsign: Optional[str] = None) -> str:
+    """Lower-case, drop punctuation and the aircraft's own callsign, collapse whitespace"""
+    text = message.lower()
+    if callsign:
+        text = re.sub(re.escape(callsign.lower()), ' ', text)
+    text = _PUNCTUATION.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def state_bucket(tracking: Dict) -> Tuple[str, int, int, int]:
+    """(phase, altitude band, latitude cell, longitude cell)"""
+    altitude = _float(tracking.get('altitudeFt', tracking.get('altitude')))
+    return (
+        str(tracking.get('phase') or ''),
+        int(altitude // AI_CACHE_ALTITUDE_BAND_FT),
+        int(_float(tracking.get('latitude')) // AI_CACHE_CELL_DEG),
+        int(_float(tracking.get('longitude')) // AI_CACHE_CELL_DEG),
+    )
+
+
+def _digest(parts) -> str:
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':'), default=str).encode()).hexdigest()
+
+
+def atc_cache_key(
+    mission: Dict,
+    controller_type: str,
+    airport_code: Optional[str],
+    frequency: Optional[str],
+    message: str,
+    history: str = '',
+) -> str:
+    return _digest([
+        'atc',
+        controller_type,
+        (airport_code or '').upper(),
+        frequency or '',
+        (mission.get('helicopter') or {}).get('model'),
+        normalize_message(message, mission.get('callsign')),
+        state_bucket(mission.get('tracking') or {}),
+        history,
+    ])
+
+
+def dispatch_cache_key(mission: Dict, message: str, history: str = '') -> str:
+    # Dispatch replies can refer to the patient and destination, so those are part of the key
+    return _digest([
+        'dispatch',
+        mission.get('mission_type'),
+        mission.get('patient_age'),
+        mission.get('patient_gender'),
+        mission.get('patient_details'),
+        (mission.get('destination') or {}).get('name'),
+        normalize_message(message, mission.get('callsign')),
+        state_bucket(mission.get('tracking') or {}),
+        history,
+    ])
+
+
+def templatize(text: str, callsign: Optional[str]) -> str:
+    if not callsign:
+        return text
+    return re.sub(re.escape(callsign), CALLSIGN_PLACEHOLDER, text, flags=re.IGNORECASE)
+
+
+def render(template: str, callsign: Optional[str]) -> str:
+    return template.replace(CALLSIGN_PLACEHOLDER, callsign or '')
+
+
+class AIResponseCache:
+    """TTL + LRU cache of reply templates keyed by ``atc_cache_key`` / ``dispatch_cache_key``"""
+
+    def __init__(self, ttl_seconds: float = AI_CACHE_TTL_SECONDS, max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (template, expires_at, generation time in ms)
+        self._entries: 'OrderedDict[str, Tuple[str, float, float]]' = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_ms = 0.0
+
+    def get(self, key: str, callsign: Optional[str]) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_ms += entry[2]
+        return render(entry[0], callsign)
+
+    def put(self, key: str, text: str, callsign: Optional[str], elapsed_ms: float):
+        if self.ttl_seconds <= 0 or not text:
+            return
+        self._entries[key] = (templatize(text, callsign), time.monotonic() + self.ttl_seconds, elapsed_ms)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "saved_ms": round(self.saved_ms, 1),
+        }
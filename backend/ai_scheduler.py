@@ -0,0 +1,221 @@
+"""Admission control for Bedrock calls.
+
+Every AI request takes a slot from a global concurrency limit. When all
+slots are busy, requests wait in one FIFO queue per user. Freed slots are
+handed out round-robin across users, so one chatty pilot cannot starve
+everyone else. A request that waits longer than its queue deadline, or that
+finds the queue full, fails fast with ``AIBusyError``. The API turns that
+into 429 with ``Retry-After``. Bedrock throttling is retried with
+full-jitter exponential backoff before giving up the same way.
+"""
+import os
+import math
+import time
+import random
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from botocore.exceptions import ClientError
+
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 8))
+AI_MAX_QUEUE = int(os.environ.get('AI_MAX_QUEUE', 200))
+AI_MAX_QUEUE_PER_USER = int(os.environ.get('AI_MAX_QUEUE_PER_USER', 4))
+AI_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('AI_QUEUE_TIMEOUT_SECONDS', 15))
+AI_THROTTLE_RETRIES = int(os.environ.get('AI_THROTTLE_RETRIES', 3))
+AI_RETRY_BASE_SECONDS = float(os.environ.get('AI_RETRY_BASE_SECONDS', 0.25))
+AI_RETRY_MAX_SECONDS = 4.0
+
+THROTTLE_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+}
+
+T = TypeVar('T')
+
+
+class AIBusyError(Exception):
+    """No Bedrock capacity within the deadline; retry after ``retry_after`` seconds"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def is_throttle(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+class AILease:
+    """One held slot; ``release`` is idempotent"""
+
+    __slots__ = ('_scheduler', '_released')
+
+    def __init__(self, scheduler: 'AIScheduler'):
+        self._scheduler = scheduler
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+
+class AIScheduler:
+    """Global concurrency limit with per-user round-robin queues"""
+
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        max_queue: int = AI_MAX_QUEUE,
+        max_queue_per_user: int = AI_MAX_QUEUE_PER_USER,
+        queue_timeout_seconds: float = AI_QUEUE_TIMEOUT_SECONDS,
+        throttle_retries: int = AI_THROTTLE_RETRIES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.throttle_retries = throttle_retries
+
+        self._active = 0
+        self._depth = 0
+        # user_id -> waiting futures; order of keys is the round-robin rotation
+        self._queues: 'OrderedDict[str, deque]' = OrderedDict()
+
+        self.admitted = 0
+        self.rejected_full = 0
+        self.expired = 0
+        self.retries = 0
+        self.throttled = 0
+        self.peak_depth = 0
+        self.wait_total_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.service_total_ms = 0.0
+        self.completed = 0
+
+    def retry_after(self) -> int:
+        """Rough seconds until a new request would be admitted"""
+        avg_service = self.service_total_ms / self.completed / 1000 if self.completed else 2.0
+        return max(1, math.ceil(avg_service * (self._depth + 1) / self.max_concurrency))
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(AI_RETRY_MAX_SECONDS, AI_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+    def _record_wait(self, started: float):
+        waited = (time.monotonic() - started) * 1000
+        self.admitted += 1
+        self.wait_total_ms += waited
+        self.max_wait_ms = max(self.max_wait_ms, waited)
+
+    def _remove_waiter(self, user_id: str, future: asyncio.Future):
+        queue = self._queues.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+            self._depth -= 1
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[user_id]
+
+    async def acquire(self, user_id: str) -> AILease:
+        started = time.monotonic()
+        if self._active < self.max_concurrency and not self._depth:
+            self._active += 1
+            self._record_wait(started)
+            return AILease(self)
+
+        user_id = user_id or ''
+        if self._depth >= self.max_queue:
+            self.rejected_full += 1
+            raise AIBusyError(self.retry_after(), "AI request queue is full")
+        if len(self._queues.get(user_id, ())) >= self.max_queue_per_user:
+            self.rejected_full += 1
+            raise AIBusyError(self.retry_after(), "Too many AI requests in progress")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queues.setdefault(user_id, deque()).append(future)
+        self._depth += 1
+        self.peak_depth = max(self.peak_depth, self._depth)
+        # A timer rather than wait_for: wait_for can swallow a cancel that races the grant
+        timer = loop.call_later(self.queue_timeout_seconds, self._expire, user_id, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancel arrived
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self._remove_waiter(user_id, future)
+            raise
+        finally:
+            timer.cancel()
+        self._record_wait(started)
+        return AILease(self)
+
+    def _expire(self, user_id: str, future: asyncio.Future):
+        if not future.done():
+            self._remove_waiter(user_id, future)
+            self.expired += 1
+            future.set_exception(AIBusyError(self.retry_after(), "Timed out waiting for AI capacity"))
+
+    def _release(self):
+        """Pass the slot to the next user in rotation, or free it"""
+        while self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._depth -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not future.done():
+                future.set_result(True)
+                return
+        self._active -= 1
+
+    def record_service(self, started: float):
+        self.completed += 1
+        self.service_total_ms += (time.monotonic() - started) * 1000
+
+    async def call(self, user_id: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` under a slot, retrying Bedrock throttling with jittered backoff"""
+        lease = await self.acquire(user_id)
+        started = time.monotonic()
+        try:
+            for attempt in range(self.throttle_retries + 1):
+                try:
+                    return await fn()
+                except ClientError as e:
+                    if not is_throttle(e):
+                        raise
+                    if attempt == self.throttle_retries:
+                        self.throttled += 1
+                        raise AIBusyError(self.retry_after(), "AI service is throttling requests")
+                    self.retries += 1
+                    await asyncio.sleep(self.backoff(attempt))
+        finally:
+            self.record_service(started)
+            lease.release()
+
+    def stats(self) -> Dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._depth,
+            "queued_users": len(self._queues),
+            "peak_queue_depth": self.peak_depth,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "expired": self.expired,
+            "throttle_retries": self.retries,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self.wait_total_ms / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
@@ -0,0 +1,273 @@
+"""Admin dashboard counters maintained from the write paths.
+
+Registration, profile updates and mission creation/completion bump atomic
+counters in the analytics table, with mission counts bucketed per UTC day
+so "last N days" is a sum over N small items. Because a counter update can
+fail after the primary write succeeds, a periodic parallel-segment scan
+recomputes every counter from the source tables and overwrites them.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from aws_async import AsyncDynamoDB, AsyncTable
+
+ANALYTICS_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RETENTION_DAYS', 90))
+ANALYTICS_RECONCILE_SECONDS = float(os.environ.get('ANALYTICS_RECONCILE_SECONDS', 3600))
+ANALYTICS_SCAN_SEGMENTS = int(os.environ.get('ANALYTICS_SCAN_SEGMENTS', 4))
+BATCH_GET_LIMIT = 100
+RETRY_DELAY_SECONDS = 0.05
+RECONCILE_LOCK_KEY = 'reconcile#lock'
+
+USERS_COUNTER = 'users'
+COMPLETE_PROFILES_COUNTER = 'complete_profiles'
+PROFILE_FIELDS = ('first_name', 'last_name', 'bio')
+
+
+def profile_complete(profile: Dict) -> bool:
+    """Same definition the dashboard has always used: name and bio are present"""
+    return all(field in profile for field in PROFILE_FIELDS)
+
+
+def day_bucket(timestamp: str) -> str:
+    return timestamp[:10]
+
+
+def missions_counter(day: str) -> str:
+    return f'missions#{day}'
+
+
+def completed_counter(day: str) -> str:
+    return f'completed#{day}'
+
+
+def recent_days(days: int, now: Optional[datetime] = None) -> List[str]:
+    today = (now or datetime.now(timezone.utc)).date()
+    return [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+class AnalyticsCounters:
+    """Atomic dashboard counters with periodic reconciliation against the source tables"""
+
+    def __init__(
+        self,
+        db: AsyncDynamoDB,
+        table: AsyncTable,
+        users_table: AsyncTable,
+        missions_table: AsyncTable,
+        retention_days: int = ANALYTICS_RETENTION_DAYS,
+        reconcile_seconds: float = ANALYTICS_RECONCILE_SECONDS,
+        scan_segments: int = ANALYTICS_SCAN_SEGMENTS,
+    ):
+        self.db = db
+        self.table = table
+        self.users_table = users_table
+        self.missions_table = missions_table
+        self.retention_days = retention_days
+        self.reconcile_seconds = reconcile_seconds
+        self.scan_segments = scan_segments
+        self._task: Optional[asyncio.Task] = None
+
+        self.increments = 0
+        self.increment_errors = 0
+        self.reconciles = 0
+        self.last_reconcile_ms = 0.0
+        self.last_reconcile_at: Optional[str] = None
+
+    # ---- write paths ----
+
+    async def increment(self, counter: str, amount: int = 1):
+        """Atomically add to a counter; failures are logged and left to reconciliation"""
+        try:
+            await self.table.update_item(
+                Key={'counter': counter},
+                UpdateExpression='ADD #c :n',
+                ExpressionAttributeNames={'#c': 'count'},
+                ExpressionAttributeValues={':n': amount}
+            )
+            self.increments += 1
+        except Exception as e:
+            self.increment_errors += 1
+            print(f"Analytics counter {counter} update failed: {e}")
+
+    async def user_registered(self, profile: Dict):
+        counters = [USERS_COUNTER]
+        if profile_complete(profile):
+            counters.append(COMPLETE_PROFILES_COUNTER)
+        await asyncio.gather(*(self.increment(counter) for counter in counters))
+
+    async def profile_updated(self, before: Dict, after: Dict):
+        was_complete, is_complete = profile_complete(before), profile_complete(after)
+        if was_complete != is_complete:
+            await self.increment(COMPLETE_PROFILES_COUNTER, 1 if is_complete else -1)
+
+    async def mission_created(self, created_at: str):
+        await self.increment(missions_counter(day_bucket(created_at)))
+
+    async def mission_completed(self, completed_at: str):
+        await self.increment(completed_counter(day_bucket(completed_at)))
+
+    # ---- reads ----
+
+    async def read_counters(self, counters: List[str]) -> Dict[str, int]:
+        """Fetch counters with BatchGetItem; missing counters read as zero"""
+        values = {counter: 0 for counter in counters}
+        chunks = [counters[i:i + BATCH_GET_LIMIT] for i in range(0, len(counters), BATCH_GET_LIMIT)]
+        responses = await asyncio.gather(*(self._batch_get(chunk) for chunk in chunks))
+        for items in responses:
+            for item in items:
+                values[item['counter']] = int(item.get('count', 0))
+        return values
+
+    async def _batch_get(self, counters: List[str]) -> List[Dict]:
+        name = self.table.name
+        request = {name: {'Keys': [{'counter': counter} for counter in counters], 'ConsistentRead': True}}
+        items: List[Dict] = []
+        while request:
+            response = await self.db.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(name, []))
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+        return items
+
+    async def summary(self, days: int = 30) -> Dict:
+        """Dashboard totals; mission counts cover ``days`` UTC calendar days including today
+
+        The window is whole day buckets, not a rolling ``days`` x 24 h, so it
+        is reported as ``created_missions`` rather than the old rolling
+        ``recent_missions``.
+        """
+        days = max(1, min(days, self.retention_days))
+        window = recent_days(days)
+        counters = [USERS_COUNTER, COMPLETE_PROFILES_COUNTER]
+        counters += [missions_counter(day) for day in window] + [completed_counter(day) for day in window]
+        values = await self.read_counters(counters)
+
+        total_users = values[USERS_COUNTER]
+        complete_profiles = values[COMPLETE_PROFILES_COUNTER]
+        return {
+            "total_users": total_users,
+            "complete_profiles": complete_profiles,
+            "created_missions": sum(values[missions_counter(day)] for day in window),
+            "completed_missions": sum(values[completed_counter(day)] for day in window),
+            "missions_by_day": {day: values[missions_counter(day)] for day in reversed(window)},
+            "completion_rate": round((complete_profiles / total_users * 100) if total_users > 0 else 0, 1),
+            "days": days,
+            "reconciled_at": self.last_reconcile_at
+        }
+
+    # ---- reconciliation ----
+
+    async def _scan_segments(self, table: AsyncTable, visit: Callable[[Dict], None], **kwargs):
+        """Parallel scan calling ``visit`` per item as pages arrive, so nothing is accumulated"""
+        async def scan_segment(segment: int):
+            params = dict(kwargs, Segment=segment, TotalSegments=self.scan_segments)
+            while True:
+                response = await table.scan(**params)
+                for item in response.get('Items', []):
+                    visit(item)
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    return
+                params['ExclusiveStartKey'] = last_key
+
+        await asyncio.gather(*(scan_segment(segment) for segment in range(self.scan_segments)))
+
+    async def _acquire_reconcile_lease(self) -> bool:
+        """Only one API worker reconciles per interval"""
+        now = int(time.time())
+        try:
+            await self.table.put_item(
+                Item={'counter': RECONCILE_LOCK_KEY, 'lease_until': now + int(self.reconcile_seconds * 0.9)},
+                ConditionExpression='attribute_not_exists(lease_until) OR lease_until < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    async def reconcile(self, force: bool = False) -> bool:
+        """Recompute every counter from full scans; returns False if another worker holds the lease"""
+        if not force and not await self._acquire_reconcile_lease():
+            return False
+
+        started = time.perf_counter()
+        window = recent_days(self.retention_days)
+        counts = {USERS_COUNTER: 0, COMPLETE_PROFILES_COUNTER: 0}
+        counts.update({missions_counter(day): 0 for day in window})
+        counts.update({completed_counter(day): 0 for day in window})
+
+        def count_user(user: Dict):
+            counts[USERS_COUNTER] += 1
+            counts[COMPLETE_PROFILES_COUNTER] += profile_complete(user)
+
+        def count_mission(mission: Dict):
+            created = missions_counter(day_bucket(mission.get('created_at', '')))
+            if created in counts:
+                counts[created] += 1
+            if mission.get('status') == 'completed':
+                completed = completed_counter(day_bucket(mission.get('completed_at') or mission.get('updated_at', '')))
+                if completed in counts:
+                    counts[completed] += 1
+
+        await asyncio.gather(
+            self._scan_segments(self.users_table, count_user, ProjectionExpression=', '.join(PROFILE_FIELDS)),
+            self._scan_segments(
+                self.missions_table,
+                count_mission,
+                ProjectionExpression='created_at, completed_at, updated_at, #s',
+                ExpressionAttributeNames={'#s': 'status'}
+            )
+        )
+
+        # Increments racing with the scan may be overwritten; the next cycle corrects them
+        requests = [{'PutRequest': {'Item': {'counter': counter, 'count': value}}} for counter, value in counts.items()]
+        for i in range(0, len(requests), 25):
+            pending = {self.table.name: requests[i:i + 25]}
+            while pending:
+                response = await self.db.batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or None
+                if pending:
+                    await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+        self.reconciles += 1
+        self.last_reconcile_ms = (time.perf_counter() - started) * 1000
+        self.last_reconcile_at = datetime.now(timezone.utc).isoformat()
+        return True
+
+    async def start(self):
+        if self._task is None and self.reconcile_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"Analytics reconcile failed: {e}")
+            await asyncio.sleep(self.reconcile_seconds)
+
+    def stats(self) -> Dict:
+        return {
+            "increments": self.increments,
+            "increment_errors": self.increment_errors,
+            "reconciles": self.reconciles,
+            "last_reconcile_ms": round(self.last_reconcile_ms, 1),
+            "last_reconcile_at": self.last_reconcile_at,
+        }
@@ -0,0 +1,349 @@
+"""Local, rule-based replies for routine ATC transmissions.
+
+Most pilot calls ("request taxi to the pad", "ready for departure",
+"inbound for landing") get a reply in fixed phraseology. The engine
+classifies the pilot's message against a small set of intents. It scores
+how much of the message the matched intent accounts for, and fills that
+intent's template from the mission's callsign, tracking and the controller's
+position. It needs no network access, and the same input always gives the
+same reply.
+
+When no intent applies to the controller, more than one intent matches, the
+message mentions an emergency, negates or cancels something, or too much of
+it is unexplained, ``reply`` returns ``None`` and the caller falls back to
+the model.
+"""
+import os
+import re
+import math
+import time
+import hashlib
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from ai_prompts import ATC_CONTROLLER_CONTEXTS
+from ai_response_cache import normalize_message
+
+ATC_LOCAL_ENGINE = os.environ.get('ATC_LOCAL_ENGINE', 'on').lower() not in ('0', 'false', 'off')
+ATC_LOCAL_MIN_CONFIDENCE = float(os.environ.get('ATC_LOCAL_MIN_CONFIDENCE', 0.75))
+# Top of the VFR block helicopters are held at or below after departure
+ATC_LOCAL_DEPARTURE_CEILING_FT = int(os.environ.get('ATC_LOCAL_DEPARTURE_CEILING_FT', 2000))
+
+# Anything that sounds like trouble goes to the model
+EMERGENCY = re.compile(r'\b(mayday|pan pan|emergency|fire|smoke|failure|fail(?:ed|ing)?|lost|unable|minimum fuel|low fuel|bird strike|chip light|squawk(?:ing)? 7[067]00)\b')
+
+# "not ready", "unable", "cancel my request": the template would answer the opposite
+NEGATION = re.compile(r'\b(not|no|negative|unable|cannot|can t|won t|don t|cancel\w*|disregard|abort\w*)\b')
+
+# Words that carry no request of their own: greetings, station names, position-report filler
+FILLER = frozenset("""
+a an the and with you we are is am at on in of for to from this that our
+tower ground approach departure center control radio helicopter medevac lifeguard heli
+request requesting like would please good morning afternoon evening day
+over out thanks thank information alpha bravo charlie delta echo foxtrot
+have has here now currently level ft feet miles mile nm msl
+north south east west northeast northwest southeast southwest
+""".split())
+
+COMPASS = ('north', 'northeast', 'east', 'southeast', 'south', 'southwest', 'west', 'northwest')
+DIGITS = ('zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'niner')
+NUMBER = re.compile(r'^\d+$')
+RUNWAY = re.compile(r'\brunway (\d{1,2})\s?(l|r|c|left|right|center)?\b')
+RUNWAY_SIDES = {'l': 'left', 'r': 'right', 'c': 'center'}
+
+
+# ---- spoken numbers ----
+
+def say_digits(value) -> str:
+    """Digit by digit: 125.3 -> one two five point three"""
+    return ' '.join('point' if c == '.' else DIGITS[int(c)] for c in str(value) if c.isdigit() or c == '.')
+
+
+def say_altitude(feet: float) -> str:
+    """Thousands and hundreds, rounded to 100 ft: 1500 -> one thousand five hundred"""
+    feet = max(0, int(round(feet / 100.0)) * 100)
+    if feet == 0:
+        return 'the surface'
+    thousands, hundreds = divmod(feet, 1000)
+    words = []
+    if thousands:
+        words.append(f"{' '.join(DIGITS[int(d)] for d in str(thousands))} thousand")
+    if hundreds:
+        words.append(f"{DIGITS[hundreds // 100]} hundred")
+    return ' '.join(words)
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compass_direction(mission: Dict) -> Optional[str]:
+    """Eight-point direction from the aircraft to its destination"""
+    tracking = mission.get('tracking') or {}
+    destination = mission.get('destination') or {}
+    lat1, lon1 = _float(tracking.get('latitude')), _float(tracking.get('longitude'))
+    lat2, lon2 = _float(destination.get('latitude')), _float(destination.get('longitude'))
+    if None in (lat1, lon1, lat2, lon2) or (lat1 == lat2 and lon1 == lon2):
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    y = math.sin(dlon) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlon)
+    bearing = (math.degrees(math.atan2(y, x)) + 360) % 360
+    return COMPASS[int((bearing + 22.5) // 45) % 8]
+
+
+def squawk_code(mission_id: str) -> str:
+    """Stable discrete code per mission, avoiding 1200 and the emergency codes"""
+    digest = hashlib.sha256(mission_id.encode()).digest()
+    code = ''.join(str(b % 8) for b in digest[:4])
+    if code in ('1200', '7500', '7600', '7700') or code.startswith('0'):
+        code = '4' + code[1:]
+    return code
+
+
+def facility_name(controller_type: str, airport_code: Optional[str]) -> str:
+    """Radio name of the controller, e.g. KJFK Tower"""
+    name = ATC_CONTROLLER_CONTEXTS.get(controller_type, {}).get('facility', controller_type.title())
+    return f"{airport_code.upper()} {name}" if airport_code else name
+
+
+# ---- intents ----
+
+class Slots:
+    """Values a template can use; computed on demand"""
+
+    def __init__(self, mission: Dict, controller_type: str, airport_code: Optional[str], message: str):
+        self.mission = mission
+        self.controller_type = controller_type
+        self.callsign = mission.get('callsign') or 'Aircraft'
+        self.facility = facility_name(controller_type, airport_code)
+        self.message = message
+        self.tracking = mission.get('tracking') or {}
+
+    @property
+    def altitude(self) -> Optional[str]:
+        feet = _float(self.tracking.get('altitudeFt')) or 0
+        return say_altitude(feet) if feet >= 100 else None
+
+    @property
+    def destination(self) -> str:
+        return (self.mission.get('destination') or {}).get('name') or 'your destination'
+
+    @property
+    def direction(self) -> Optional[str]:
+        return compass_direction(self.mission)
+
+    @property
+    def requested_altitude(self) -> Optional[str]:
+        match = re.search(r'\b(\d{3,5})\b', self.message)
+        return say_altitude(int(match.group(1))) if match else None
+
+    @property
+    def runway(self) -> Optional[str]:
+        """Spoken runway from the request, e.g. runway 4L -> runway four left"""
+        match = RUNWAY.search(self.message)
+        if match is None:
+            return 'the active runway' if re.search(r'\brunway\b', self.message) else None
+        side = match.group(2)
+        side = f" {RUNWAY_SIDES.get(side, side)}" if side else ''
+        return f"runway {say_digits(match.group(1))}{side}"
+
+    @property
+    def squawk(self) -> str:
+        return say_digits(squawk_code(self.mission.get('mission_id') or self.callsign))
+
+
+def _taxi(s: Slots) -> str:
+    runway = s.runway
+    if runway:
+        return f"{s.callsign}, {s.facility}, taxi to {runway}, hold short of {runway}, report ready for departure."
+    return f"{s.callsign}, {s.facility}, air taxi to the departure pad, remain clear of all runways, report ready for departure."
+
+
+def _takeoff(s: Slots) -> str:
+    departure = f", departure to the {s.direction} approved" if s.direction else ""
+    clearance = f"{s.runway}, cleared for takeoff" if s.runway else "cleared for takeoff from the pad"
+    return (f"{s.callsign}, {s.facility}, {clearance}{departure}, "
+            f"maintain at or below {say_altitude(ATC_LOCAL_DEPARTURE_CEILING_FT)} until clear of the surface area.")
+
+
+def _landing(s: Slots) -> str:
+    return f"{s.callsign}, {s.facility}, medevac priority, proceed direct to the helipad, cleared to land, report on the ground."
+
+
+def _check_in(s: Slots) -> str:
+    altitude = f", {s.altitude}" if s.altitude else ""
+    return f"{s.callsign}, {s.facility}, radar contact{altitude}. Maintain VFR, proceed on course to {s.destination}."
+
+
+def _flight_following(s: Slots) -> str:
+    return f"{s.callsign}, {s.facility}, squawk {s.squawk}, maintain VFR, advise of any altitude changes."
+
+
+def _altitude_change(s: Slots) -> str:
+    climb = re.search(r'\b(climb|higher|up)\b', s.message) is not None
+    altitude = s.requested_altitude
+    if altitude is None:
+        return f"{s.callsign}, {s.facility}, {'climb' if climb else 'descent'} at pilot's discretion approved, maintain VFR."
+    return f"{s.callsign}, {s.facility}, {'climb' if climb else 'descend'} and maintain {altitude}."
+
+
+def _approach(s: Slots) -> str:
+    return (f"{s.callsign}, {s.facility}, descend at pilot's discretion, maintain VFR, "
+            f"proceed direct {s.destination}, report the field in sight.")
+
+
+def _frequency_change(s: Slots) -> str:
+    return f"{s.callsign}, {s.facility}, frequency change approved, good day."
+
+
+class Intent:
+    """A routine call: a trigger pattern, words it accounts for, and a reply template"""
+
+    __slots__ = ('name', 'controllers', 'trigger', 'vocabulary', 'template')
+
+    def __init__(self, name: str, controllers: Tuple[str, ...], trigger: str, vocabulary: str, template: Callable[[Slots], str]):
+        self.name = name
+        self.controllers = controllers
+        self.trigger = re.compile(trigger)
+        self.vocabulary: FrozenSet[str] = frozenset(vocabulary.split())
+        self.template = template
+
+
+INTENTS: List[Intent] = [
+    Intent('taxi', ('ground',), r'\b(taxi|hover taxi|air taxi)\b',
+           'taxi hover air pad helipad ramp parking hangar fuel departure runway ready',
+           _taxi),
+    Intent('takeoff', ('tower',), r'\b(ready (for )?(departure|takeoff|take off|lift)|request (takeoff|departure)|departure from)\b',
+           'ready departure takeoff take off lift pad helipad runway departing bound northbound southbound eastbound westbound',
+           _takeoff),
+    Intent('landing', ('tower',), r'\b(inbound|landing|to land|for the pad|final)\b',
+           'inbound landing land pad helipad hospital final patient onboard aboard full stop straight in',
+           _landing),
+    Intent('check_in', ('departure', 'approach', 'center'), r'\b(with you|checking in|check in|climbing through|leveling)\b',
+           'with you checking check in climbing through leveling level off vfr',
+           _check_in),
+    Intent('flight_following', ('departure', 'center', 'approach'), r'\bflight following\b',
+           'flight following vfr enroute en route destination',
+           _flight_following),
+    Intent('altitude_change', ('departure', 'approach', 'center'), r'\b(climb|descend|descent|higher|lower)\b',
+           'climb descend descent higher lower altitude maintain up down',
+           _altitude_change),
+    Intent('approach', ('approach',), r'\b(approach|inbound|descending)\b',
+           'approach inbound descending visual destination hospital field landing full stop',
+           _approach),
+    Intent('frequency_change', ('departure', 'approach', 'center', 'tower', 'ground'), r'\b(frequency change|leaving (the )?frequency|switching)\b',
+           'frequency change leaving switching',
+           _frequency_change),
+]
+
+
+class LocalReply:
+    __slots__ = ('text', 'intent', 'confidence')
+
+    def __init__(self, text: str, intent: str, confidence: float):
+        self.text = text
+        self.intent = intent
+        self.confidence = confidence
+
+
+def _drop_station_callup(words: List[str], controller_type: str, airport_code: Optional[str]) -> List[str]:
+    """Remove the addressed station's name from the call-up and sign-off
+
+    "Approach, Lifeguard 12, with you" names the approach facility without
+    asking for an approach. Station words are dropped only from the leading
+    and trailing runs of filler and numbers, so "request visual approach"
+    still counts.
+    """
+    station = set(facility_name(controller_type, airport_code).lower().split()) | {controller_type}
+    routine = FILLER | station
+
+    def callup(word: str) -> bool:
+        return word in routine or NUMBER.match(word) is not None
+
+    lead = 0
+    while lead < len(words) and callup(words[lead]):
+        lead += 1
+    trail = len(words)
+    while trail > lead and callup(words[trail - 1]):
+        trail -= 1
+    return (
+        [word for word in words[:lead] if word not in station]
+        + words[lead:trail]
+        + [word for word in words[trail:] if word not in station]
+    )
+
+
+class ATCPhraseologyEngine:
+    """Classifies pilot transmissions and answers routine ones from templates"""
+
+    def __init__(self, enabled: bool = ATC_LOCAL_ENGINE, min_confidence: float = ATC_LOCAL_MIN_CONFIDENCE):
+        self.enabled = enabled
+        self.min_confidence = min_confidence
+        self.requests = 0
+        self.served_local = 0
+        self.fallbacks = 0
+        self.by_intent: Dict[str, int] = {}
+        self.local_total_ms = 0.0
+
+    def classify(self, mission: Dict, controller_type: str, airport_code: Optional[str], message: str) -> Tuple[Optional[Intent], float]:
+        """(intent, confidence); confidence is the share of the message the intent explains"""
+        text = normalize_message(message, mission.get('callsign'))
+        if EMERGENCY.search(text) or NEGATION.search(text):
+            return None, 0.0
+        words = _drop_station_callup(text.split(), controller_type, airport_code)
+        if not words:
+            return None, 0.0
+        text = ' '.join(words)
+        applicable = [intent for intent in INTENTS if controller_type in intent.controllers and intent.trigger.search(text)]
+        if not applicable:
+            return None, 0.0
+
+        # Place names from the mission are expected in position reports
+        places = {(airport_code or '').lower()}
+        for leg in ('origin', 'pickup', 'destination'):
+            places.update(normalize_message((mission.get(leg) or {}).get('name') or '').split())
+
+        best, confidence = None, -1.0
+        for intent in applicable:
+            known = FILLER | intent.vocabulary | places
+            explained = sum(1 for word in words if word in known or NUMBER.match(word))
+            if explained / len(words) > confidence:
+                best, confidence = intent, explained / len(words)
+        # A second routine request in the same call means the template would answer only half of it
+        start, end = best.trigger.search(text).span()
+        for other in applicable:
+            if other is not best and any(m.end() <= start or m.start() >= end for m in other.trigger.finditer(text)):
+                confidence *= 0.5
+                break
+        return best, confidence
+
+    def reply(self, mission: Dict, controller_type: str, airport_code: Optional[str], message: str) -> Optional[LocalReply]:
+        """Templated reply, or ``None`` when the model should answer"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        self.requests += 1
+        intent, confidence = self.classify(mission, controller_type, airport_code, message)
+        if intent is None or confidence < self.min_confidence:
+            self.fallbacks += 1
+            return None
+        text = intent.template(Slots(mission, controller_type, airport_code, normalize_message(message, mission.get('callsign'))))
+        self.served_local += 1
+        self.by_intent[intent.name] = self.by_intent.get(intent.name, 0) + 1
+        self.local_total_ms += (time.perf_counter() - started) * 1000
+        return LocalReply(text, intent.name, round(confidence, 3))
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "served_local": self.served_local,
+            "fallbacks": self.fallbacks,
+            "local_ratio": round(self.served_local / self.requests, 3) if self.requests else None,
+            "by_intent": dict(self.by_intent),
+            "avg_local_ms": round(self.local_total_ms / self.served_local, 3) if self.served_local else None,
+        }
@@ -0,0 +1,180 @@
+"""Non-blocking access to boto3 from async FastAPI handlers.
+
+boto3 is synchronous, so every call is dispatched to a bounded thread pool
+owned by its AWS service. Each pool's size is that service's concurrency
+limit, which keeps a burst of slow Bedrock calls from occupying the workers
+that DynamoDB telemetry writes need.
+"""
+import os
+import asyncio
+import threading
+import functools
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import boto3
+
+DEFAULT_CONCURRENCY = {
+    'dynamodb': 32,
+    'cognito': 8,
+    's3': 16,
+    'bedrock': 8,
+    'polly': 8,
+}
+
+
+def concurrency_limit(service: str) -> int:
+    """Per-service limit, overridable with AWS_MAX_CONCURRENCY_<SERVICE>"""
+    env_name = f"AWS_MAX_CONCURRENCY_{service.upper().replace('-', '_')}"
+    return int(os.environ.get(env_name, DEFAULT_CONCURRENCY.get(service, 8)))
+
+
+def convert_floats(obj):
+    """Convert floats to Decimal for DynamoDB"""
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: convert_floats(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_floats(i) for i in obj]
+    return obj
+
+
+def decimal_default(value):
+    """``json.dumps`` default that renders DynamoDB Decimals as plain numbers"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ServiceExecutor:
+    """Bounded worker pool for one AWS service's blocking calls"""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"aws-{name}")
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.errors = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "errors": self.errors,
+        }
+
+
+class AsyncClient:
+    """Awaitable proxy for a boto3 client; botocore clients are thread-safe"""
+
+    def __init__(self, client, executor: ServiceExecutor):
+        self.client = client
+        self.executor = executor
+
+    def __getattr__(self, name: str):
+        method = getattr(self.client, name)
+
+        async def call(*args, **kwargs):
+            return await self.executor.run(method, *args, **kwargs)
+
+        return call
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a composite blocking operation (e.g. call + stream read) in this service's pool"""
+        return await self.executor.run(fn, *args, **kwargs)
+
+
+class AsyncTable:
+    """Awaitable DynamoDB table; the underlying resource is created per worker thread.
+
+    Item and expression values are passed through ``convert_floats`` because
+    the boto3 resource layer rejects Python floats.
+    """
+
+    def __init__(self, name: str, db: 'AsyncDynamoDB'):
+        self.name = name
+        self._db = db
+
+    def _call(self, method: str, kwargs: Dict) -> Any:
+        for arg in ('Item', 'ExpressionAttributeValues'):
+            if arg in kwargs:
+                kwargs[arg] = convert_floats(kwargs[arg])
+        table = self._db.resource().Table(self.name)
+        return getattr(table, method)(**kwargs)
+
+    async def get_item(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'get_item', kwargs)
+
+    async def put_item(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'put_item', kwargs)
+
+    async def update_item(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'update_item', kwargs)
+
+    async def delete_item(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'delete_item', kwargs)
+
+    async def query(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'query', kwargs)
+
+    async def scan(self, **kwargs) -> Dict:
+        return await self._db.executor.run(self._call, 'scan', kwargs)
+
+
+class AsyncDynamoDB:
+    """DynamoDB service resource whose calls run on a bounded pool.
+
+    boto3 resources are not thread-safe, so each worker thread lazily builds
+    its own session and resource.
+    """
+
+    def __init__(self, region_name: str, max_concurrency: Optional[int] = None):
+        self.region_name = region_name
+        self.executor = ServiceExecutor('dynamodb', max_concurrency or concurrency_limit('dynamodb'))
+        self._local = threading.local()
+        self._tables: Dict[str, AsyncTable] = {}
+
+    def resource(self):
+        resource = getattr(self._local, 'resource', None)
+        if resource is None:
+            resource = boto3.session.Session().resource('dynamodb', region_name=self.region_name)
+            self._local.resource = resource
+        return resource
+
+    def Table(self, name: str) -> AsyncTable:
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = AsyncTable(name, self)
+        return table
+
+    async def batch_write_item(self, **kwargs) -> Dict:
+        request_items = convert_floats(kwargs.pop('RequestItems'))
+        return await self.executor.run(lambda: self.resource().batch_write_item(RequestItems=request_items, **kwargs))
+
+    async def batch_get_item(self, **kwargs) -> Dict:
+        return await self.executor.run(lambda: self.resource().batch_get_item(**kwargs))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.executor.run(fn, *args, **kwargs)
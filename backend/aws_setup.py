@@ -194,6 +194,28 @@ def create_dynamodb_tables():
                 {'AttributeName': 'id', 'AttributeType': 'S'},
             ],
             'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': 'VirtualHEMS_Analytics',
+            'KeySchema': [
+                {'AttributeName': 'counter', 'KeyType': 'HASH'},
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'counter', 'AttributeType': 'S'},
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': 'VirtualHEMS_RadioLogs',
+            'KeySchema': [
+                {'AttributeName': 'mission_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'seq', 'KeyType': 'RANGE'},
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'mission_id', 'AttributeType': 'S'},
+                {'AttributeName': 'seq', 'AttributeType': 'N'},
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
         }
     ]
     
@@ -279,7 +301,9 @@ def main():
             'users': 'VirtualHEMS_Users',
             'hems_bases': 'VirtualHEMS_HemsBases',
             'hospitals': 'VirtualHEMS_Hospitals',
-            'helicopters': 'VirtualHEMS_Helicopters'
+            'helicopters': 'VirtualHEMS_Helicopters',
+            'analytics': 'VirtualHEMS_Analytics',
+            'radio_logs': 'VirtualHEMS_RadioLogs'
         }
     }
     
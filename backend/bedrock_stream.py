@@ -0,0 +1,133 @@
+"""Token streaming from Claude on Bedrock.
+
+``invoke_model_with_response_stream`` returns a blocking event stream. It is
+read on the Bedrock worker pool, and each event is handed to the event loop
+as soon as it arrives. Handlers can therefore relay text deltas to the client
+(as server-sent events) while the model is still generating.
+"""
+import json
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from aws_async import AsyncClient
+
+
+def sse_event(data: Dict) -> bytes:
+    """One ``text/event-stream`` message"""
+    return f"data: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop nginx from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+class CompletionStream:
+    """Async iterator over the text deltas of one streamed completion"""
+
+    def __init__(self, streamer: 'BedrockStreamer', body: Dict):
+        self._streamer = streamer
+        self._body = body
+        self.text_parts = []
+        self.usage: Dict[str, int] = {}
+        self.first_token_ms: Optional[float] = None
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.text_parts)
+
+    def _record(self, event: Dict):
+        kind = event.get('type')
+        if kind == 'message_start':
+            self.usage.update((event.get('message') or {}).get('usage') or {})
+        elif kind == 'message_delta':
+            self.usage.update(event.get('usage') or {})
+            self.stop_reason = (event.get('delta') or {}).get('stop_reason') or self.stop_reason
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        streamer = self._streamer
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        started = time.perf_counter()
+
+        def pump():
+            try:
+                response = streamer.bedrock.client.invoke_model_with_response_stream(
+                    modelId=streamer.model_id,
+                    contentType='application/json',
+                    accept='application/json',
+                    body=json.dumps(self._body)
+                )
+                stream = response['body']
+                for event in stream:
+                    if cancelled.is_set():
+                        stream.close()
+                        break
+                    chunk = event.get('chunk')
+                    if chunk:
+                        loop.call_soon_threadsafe(queue.put_nowait, json.loads(chunk['bytes']))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        streamer.streams += 1
+        reader = asyncio.ensure_future(streamer.bedrock.run(pump))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                self._record(event)
+                delta = event.get('delta') or {}
+                if event.get('type') == 'content_block_delta' and delta.get('type') == 'text_delta':
+                    if self.first_token_ms is None:
+                        self.first_token_ms = (time.perf_counter() - started) * 1000
+                        streamer.record_first_token(self.first_token_ms)
+                    self.text_parts.append(delta['text'])
+                    yield delta['text']
+            # Surfaces any error raised while opening or reading the stream
+            await reader
+            if streamer.on_usage is not None:
+                streamer.on_usage(self.usage)
+        except Exception:
+            streamer.errors += 1
+            raise
+        finally:
+            # The client went away or the consumer stopped early; let the reader thread exit
+            cancelled.set()
+
+
+class BedrockStreamer:
+    """Opens streamed completions against one model and tracks time-to-first-token"""
+
+    def __init__(self, bedrock: AsyncClient, model_id: str, on_usage: Optional[Callable[[Dict], None]] = None):
+        self.bedrock = bedrock
+        self.model_id = model_id
+        # Receives the token usage of each completed stream
+        self.on_usage = on_usage
+        self.streams = 0
+        self.errors = 0
+        self.first_tokens = 0
+        self.first_token_total_ms = 0.0
+        self.last_first_token_ms = 0.0
+
+    def stream(self, body: Dict) -> CompletionStream:
+        return CompletionStream(self, body)
+
+    def record_first_token(self, elapsed_ms: float):
+        self.first_tokens += 1
+        self.first_token_total_ms += elapsed_ms
+        self.last_first_token_ms = elapsed_ms
+
+    def stats(self) -> Dict:
+        return {
+            "streams": self.streams,
+            "errors": self.errors,
+            "avg_first_token_ms": round(self.first_token_total_ms / self.first_tokens, 1) if self.first_tokens else None,
+            "last_first_token_ms": round(self.last_first_token_ms, 1),
+        }
@@ -0,0 +1,318 @@
+"""Live position state for every active mission.
+
+Tracking values are stored column-wise in NumPy arrays, one row per mission,
+so updating an aircraft costs one row write. A fleet snapshot is built with
+vectorised reads rather than by walking dicts of Decimals. Each API worker
+keeps its own store. A periodic resync against the ``status-index`` GSI
+picks up missions and positions that other workers received.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from boto3.dynamodb.conditions import Key
+
+from aws_async import AsyncTable
+
+FLEET_INITIAL_CAPACITY = int(os.environ.get('FLEET_INITIAL_CAPACITY', 1024))
+FLEET_RESYNC_SECONDS = float(os.environ.get('FLEET_RESYNC_SECONDS', 10))
+FLEET_SNAPSHOT_MAX_AGE_SECONDS = float(os.environ.get('FLEET_SNAPSHOT_MAX_AGE_SECONDS', 1.0))
+RECENTLY_CLOSED_LIMIT = 10000
+REMOVAL_LOG_LIMIT = 10000
+
+# Numeric tracking fields, in column order
+TRACKING_FIELDS = (
+    'latitude',
+    'longitude',
+    'altitudeFt',
+    'groundSpeedKts',
+    'headingDeg',
+    'verticalSpeedFtMin',
+    'fuelRemainingLbs',
+    'timeEnrouteMinutes',
+)
+# Names used by the tracking block that create_mission writes
+FIELD_ALIASES = {
+    'altitudeFt': 'altitude',
+    'groundSpeedKts': 'speedKnots',
+    'headingDeg': 'heading',
+}
+
+
+def _number(tracking: Dict, field: str) -> float:
+    value = tracking.get(field)
+    if value is None:
+        value = tracking.get(FIELD_ALIASES.get(field, field))
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class FleetState:
+    """Column-oriented tracking state keyed by mission_id"""
+
+    def __init__(self, capacity: int = FLEET_INITIAL_CAPACITY):
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._allocate(capacity)
+
+        self._recently_closed: 'OrderedDict[str, None]' = OrderedDict()
+        self._phases: List[str] = []
+        self._phase_codes: Dict[str, int] = {}
+        self._sequence = 0
+        # (sequence, mission_id) of recent removals, for change feeds
+        self._removals: deque = deque()
+        self._removals_floor = 0
+        self._snapshot: Optional[bytes] = None
+        self._snapshot_sequence = -1
+        self._snapshot_built_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self.updates = 0
+        self.unknown_updates = 0
+        self.resyncs = 0
+        self.snapshot_builds = 0
+        self.last_resync_ms = 0.0
+
+    def _allocate(self, capacity: int):
+        self.values = np.zeros((capacity, len(TRACKING_FIELDS)), dtype=np.float64)
+        self.last_update = np.zeros(capacity, dtype=np.int64)
+        self.phase = np.zeros(capacity, dtype=np.int16)
+        self.sequence = np.zeros(capacity, dtype=np.int64)
+        # When the mission was last known to be active (create_mission or a resync); telemetry does not count
+        self.registered = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.mission_ids: List[Optional[str]] = [None] * capacity
+        self.user_ids: List[Optional[str]] = [None] * capacity
+        self.callsigns: List[Optional[str]] = [None] * capacity
+
+    def _grow(self):
+        old = (self.values, self.last_update, self.phase, self.sequence, self.registered, self.active)
+        old_meta = (self.mission_ids, self.user_ids, self.callsigns)
+        capacity = len(self.active)
+        self._allocate(capacity * 2)
+        for new, previous in zip((self.values, self.last_update, self.phase, self.sequence, self.registered, self.active), old):
+            new[:capacity] = previous
+        for new, previous in zip((self.mission_ids, self.user_ids, self.callsigns), old_meta):
+            new[:capacity] = previous
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _phase_code(self, phase: Optional[str]) -> int:
+        phase = phase or ''
+        code = self._phase_codes.get(phase)
+        if code is None:
+            code = self._phase_codes[phase] = len(self._phases)
+            self._phases.append(phase)
+        return code
+
+    def _row(self, mission_id: str) -> int:
+        row = self._rows.get(mission_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size == len(self.active):
+                    self._grow()
+                row = self._size
+                self._size += 1
+            self._rows[mission_id] = row
+            self.mission_ids[row] = mission_id
+            self.active[row] = True
+        return row
+
+    def _write(self, row: int, tracking: Dict):
+        self.values[row] = [_number(tracking, field) for field in TRACKING_FIELDS]
+        self.last_update[row] = int(tracking.get('lastUpdate') or 0)
+        self.phase[row] = self._phase_code(tracking.get('phase'))
+        self._sequence += 1
+        self.sequence[row] = self._sequence
+
+    # ---- write paths ----
+
+    def upsert(self, mission_id: str, user_id: Optional[str], callsign: Optional[str], tracking: Dict):
+        """Register an active mission (create_mission, resync)"""
+        self._recently_closed.pop(mission_id, None)
+        row = self._row(mission_id)
+        self.user_ids[row] = user_id or self.user_ids[row]
+        self.callsigns[row] = callsign or self.callsigns[row]
+        self.registered[row] = time.monotonic()
+        self._write(row, tracking)
+
+    def update_tracking(self, mission_id: str, user_id: Optional[str], tracking: Dict):
+        """Apply a telemetry sample to a registered mission; older samples are ignored
+
+        Telemetry never creates a row. A mission created on another worker
+        appears with the next resync, so an unknown or already completed
+        mission_id cannot keep itself on the live map.
+        """
+        row = self._rows.get(mission_id)
+        if row is None:
+            self.unknown_updates += 1
+            return
+        if int(tracking.get('lastUpdate') or 0) < self.last_update[row]:
+            return
+        self._write(row, tracking)
+        self.updates += 1
+
+    def remove(self, mission_id: str):
+        """Drop a mission that is no longer active (complete_mission, resync)"""
+        self._recently_closed[mission_id] = None
+        while len(self._recently_closed) > RECENTLY_CLOSED_LIMIT:
+            self._recently_closed.popitem(last=False)
+        row = self._rows.pop(mission_id, None)
+        if row is None:
+            return
+        self.active[row] = False
+        self.mission_ids[row] = self.user_ids[row] = self.callsigns[row] = None
+        self._free.append(row)
+        self._sequence += 1
+        self._removals.append((self._sequence, mission_id))
+        if len(self._removals) > REMOVAL_LOG_LIMIT:
+            self._removals_floor = self._removals.popleft()[0]
+
+    # ---- reads ----
+
+    @property
+    def current_sequence(self) -> int:
+        return self._sequence
+
+    def active_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.active[:self._size])
+
+    def changed_rows(self, since: int) -> np.ndarray:
+        """Active rows written after sequence ``since``"""
+        size = self._size
+        return np.flatnonzero((self.sequence[:size] > since) & self.active[:size])
+
+    def removed_since(self, since: int) -> Optional[List[str]]:
+        """Missions removed after ``since``, or None if the log no longer reaches back that far"""
+        if since < self._removals_floor:
+            return None
+        removed = []
+        for sequence, mission_id in reversed(self._removals):
+            if sequence <= since:
+                break
+            removed.append(mission_id)
+        return removed
+
+    def positions(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.values[rows, 0], self.values[rows, 1]
+
+    def records(self, rows: np.ndarray) -> List[Dict]:
+        values = self.values[rows].tolist()
+        last_update = self.last_update[rows].tolist()
+        phases = self.phase[rows].tolist()
+        return [
+            {
+                'mission_id': self.mission_ids[row],
+                'user_id': self.user_ids[row],
+                'callsign': self.callsigns[row],
+                'tracking': {
+                    **dict(zip(TRACKING_FIELDS, row_values)),
+                    'phase': self._phases[phase],
+                    'lastUpdate': updated
+                }
+            }
+            for row, row_values, updated, phase in zip(rows.tolist(), values, last_update, phases)
+        ]
+
+    def tracking(self, mission_id: str) -> Optional[Dict]:
+        """Latest tracking held for one mission, or None if it is not active here"""
+        row = self._rows.get(mission_id)
+        if row is None:
+            return None
+        return self.records(np.array([row]))[0]['tracking']
+
+    def snapshot(self) -> bytes:
+        """JSON body for the whole fleet, rebuilt at most every FLEET_SNAPSHOT_MAX_AGE_SECONDS"""
+        now = time.monotonic()
+        stale = self._snapshot_sequence != self._sequence
+        if self._snapshot is None or (stale and now - self._snapshot_built_at >= FLEET_SNAPSHOT_MAX_AGE_SECONDS):
+            self._snapshot = json.dumps({'missions': self.records(self.active_rows())}, separators=(',', ':')).encode()
+            self._snapshot_sequence = self._sequence
+            self._snapshot_built_at = now
+            self.snapshot_builds += 1
+        return self._snapshot
+
+    # ---- resync ----
+
+    async def resync(self, missions_table: AsyncTable):
+        """Merge active missions from DynamoDB and drop ones no longer active there"""
+        started = time.monotonic()
+        kwargs = {
+            'IndexName': 'status-index',
+            'KeyConditionExpression': Key('status').eq('active'),
+            'ProjectionExpression': 'mission_id, user_id, callsign, tracking',
+        }
+        seen = set()
+        while True:
+            response = await missions_table.query(**kwargs)
+            for item in response.get('Items', []):
+                mission_id = item['mission_id']
+                seen.add(mission_id)
+                tracking = item.get('tracking') or {}
+                row = self._rows.get(mission_id)
+                if row is None:
+                    if mission_id not in self._recently_closed:
+                        self.upsert(mission_id, item.get('user_id'), item.get('callsign'), tracking)
+                    continue
+                self.user_ids[row] = self.user_ids[row] or item.get('user_id')
+                self.callsigns[row] = self.callsigns[row] or item.get('callsign')
+                self.registered[row] = time.monotonic()
+                if int(tracking.get('lastUpdate') or 0) > self.last_update[row]:
+                    self._write(row, tracking)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+
+        # Rows registered during the query may belong to missions created since it began
+        for mission_id, row in list(self._rows.items()):
+            if mission_id not in seen and self.registered[row] < started:
+                self.remove(mission_id)
+        self.resyncs += 1
+        self.last_resync_ms = (time.monotonic() - started) * 1000
+
+    async def start(self, missions_table: AsyncTable, resync_seconds: float = FLEET_RESYNC_SECONDS):
+        try:
+            await self.resync(missions_table)
+        except Exception as e:
+            print(f"Fleet state resync failed: {e}")
+        if self._task is None and resync_seconds > 0:
+            self._task = asyncio.create_task(self._run(missions_table, resync_seconds))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, missions_table: AsyncTable, resync_seconds: float):
+        while True:
+            await asyncio.sleep(resync_seconds)
+            try:
+                await self.resync(missions_table)
+            except Exception as e:
+                print(f"Fleet state resync failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self._rows),
+            "capacity": len(self.active),
+            "updates": self.updates,
+            "unknown_updates": self.unknown_updates,
+            "resyncs": self.resyncs,
+            "snapshot_builds": self.snapshot_builds,
+            "last_resync_ms": round(self.last_resync_ms, 1),
+        }
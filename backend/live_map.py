@@ -0,0 +1,264 @@
+"""Server-push live map feed.
+
+Map clients open a WebSocket and subscribe to a bounding box and zoom
+level. On every tick the feed looks up which fleet rows changed since each
+client's last update and sends only those inside its box, plus removals.
+Below ``LIVE_MAP_CLUSTER_MAX_ZOOM`` the client receives grid clusters
+instead of individual aircraft.
+
+Client messages::
+
+    {"type": "subscribe", "bbox": [west, south, east, north], "zoom": 6}
+
+Server messages: ``snapshot`` (all aircraft in the box), ``delta``
+(``updated`` records and ``removed`` mission ids, apply removals first) and
+``clusters``.
+"""
+import os
+import json
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from fleet_state import FleetState
+
+LIVE_MAP_TICK_SECONDS = float(os.environ.get('LIVE_MAP_TICK_SECONDS', 1.0))
+LIVE_MAP_CLUSTER_MAX_ZOOM = int(os.environ.get('LIVE_MAP_CLUSTER_MAX_ZOOM', 7))
+LIVE_MAP_CLUSTER_CELLS_PER_TILE = int(os.environ.get('LIVE_MAP_CLUSTER_CELLS_PER_TILE', 4))
+LIVE_MAP_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_MAP_MAX_SUBSCRIBERS', 5000))
+
+WORLD = (-180.0, -90.0, 180.0, 90.0)
+
+
+def parse_bbox(value) -> Tuple[float, float, float, float]:
+    """[west, south, east, north] in degrees; west > east crosses the antimeridian"""
+    if value is None:
+        return WORLD
+    if len(value) != 4:
+        raise ValueError("bbox must be [west, south, east, north] in degrees")
+    west, south, east, north = (float(v) for v in value)
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("bbox must be [west, south, east, north] in degrees")
+    return west, south, east, north
+
+
+def in_bbox(lat: np.ndarray, lon: np.ndarray, bbox: Tuple[float, float, float, float]) -> np.ndarray:
+    west, south, east, north = bbox
+    inside = (lat >= south) & (lat <= north)
+    if west <= east:
+        return inside & (lon >= west) & (lon <= east)
+    return inside & ((lon >= west) | (lon <= east))
+
+
+def cluster_positions(lat: np.ndarray, lon: np.ndarray, zoom: int) -> List[Dict]:
+    """Bin positions into a grid sized for the zoom level; one centroid per occupied cell"""
+    if not len(lat):
+        return []
+    cell = 360.0 / (2 ** max(zoom, 0)) / LIVE_MAP_CLUSTER_CELLS_PER_TILE
+    cells_x = np.floor((lon + 180.0) / cell).astype(np.int64)
+    cells_y = np.floor((lat + 90.0) / cell).astype(np.int64)
+    keys = cells_y * (int(360.0 / cell) + 1) + cells_x
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    lat_sum = np.bincount(inverse, weights=lat, minlength=len(unique))
+    lon_sum = np.bincount(inverse, weights=lon, minlength=len(unique))
+    return [
+        {'latitude': round(la, 5), 'longitude': round(lo, 5), 'count': count}
+        for la, lo, count in zip((lat_sum / counts).tolist(), (lon_sum / counts).tolist(), counts.tolist())
+    ]
+
+
+class MapSubscription:
+    """One connected map client"""
+
+    __slots__ = ('websocket', 'bbox', 'zoom', 'sequence', 'visible', 'needs_snapshot', 'sending', 'last_clusters')
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.bbox = WORLD
+        self.zoom = 0
+        self.sequence = 0
+        self.visible: Set[str] = set()
+        self.needs_snapshot = False
+        self.sending = False
+        self.last_clusters: Optional[List[Dict]] = None
+
+    @property
+    def clustered(self) -> bool:
+        return self.zoom <= LIVE_MAP_CLUSTER_MAX_ZOOM
+
+    def subscribe(self, bbox, zoom):
+        self.bbox = parse_bbox(bbox)
+        self.zoom = max(0, min(int(zoom), 22))
+        self.needs_snapshot = True
+
+
+class LiveMapFeed:
+    """Fans fleet-state changes out to subscribed map clients on a fixed tick"""
+
+    def __init__(self, fleet: FleetState, tick_seconds: float = LIVE_MAP_TICK_SECONDS):
+        self.fleet = fleet
+        self.tick_seconds = tick_seconds
+        self.subscribers: Set[MapSubscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._pushes: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        # Per-tick cache: fleet positions and clusters keyed by (bbox, zoom)
+        self._tick_positions: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._tick_clusters: Dict[Tuple, Tuple[List[Dict], int]] = {}
+
+        self.ticks = 0
+        self.messages = 0
+        self.aircraft_sent = 0
+        self.send_errors = 0
+
+    def add(self, websocket) -> MapSubscription:
+        if len(self.subscribers) >= LIVE_MAP_MAX_SUBSCRIBERS:
+            raise RuntimeError("Live map subscriber limit reached")
+        subscription = MapSubscription(websocket)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def remove(self, subscription: MapSubscription):
+        self.subscribers.discard(subscription)
+
+    def request_snapshot(self, subscription: MapSubscription):
+        subscription.needs_snapshot = True
+        self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._pushes):
+            task.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Live map tick failed: {e}")
+
+    def tick(self):
+        """Schedule one push per idle subscriber; slow clients catch up from their own sequence"""
+        self.ticks += 1
+        fleet = self.fleet
+        sequence = fleet.current_sequence
+        shared_since = None
+        shared_rows = None
+        self._tick_positions = None
+        self._tick_clusters = {}
+
+        for subscription in self.subscribers:
+            if subscription.sending:
+                continue
+            if not subscription.needs_snapshot and subscription.sequence == sequence:
+                continue
+
+            if subscription.needs_snapshot:
+                message = self._snapshot_message(subscription)
+            else:
+                # Most subscribers are one tick behind; share their changed-row lookup
+                if shared_since != subscription.sequence:
+                    shared_since = subscription.sequence
+                    shared_rows = fleet.changed_rows(shared_since)
+                message = self._delta_message(subscription, shared_rows)
+            subscription.sequence = sequence
+            if message is None:
+                continue
+
+            subscription.sending = True
+            task = asyncio.create_task(self._push(subscription, message))
+            self._pushes.add(task)
+            task.add_done_callback(self._pushes.discard)
+
+    def _rows_in_view(self, subscription: MapSubscription, rows: np.ndarray) -> np.ndarray:
+        lat, lon = self.fleet.positions(rows)
+        return rows[in_bbox(lat, lon, subscription.bbox)]
+
+    def _clusters(self, bbox: Tuple[float, float, float, float], zoom: int) -> Tuple[List[Dict], int]:
+        """Clusters and aircraft count for a view, computed once per tick and shared by subscribers"""
+        key = (bbox, zoom)
+        cached = self._tick_clusters.get(key)
+        if cached is None:
+            if self._tick_positions is None:
+                self._tick_positions = self.fleet.positions(self.fleet.active_rows())
+            lat, lon = self._tick_positions
+            inside = in_bbox(lat, lon, bbox)
+            cached = (cluster_positions(lat[inside], lon[inside], zoom), int(inside.sum()))
+            self._tick_clusters[key] = cached
+        return cached
+
+    def _cluster_message(self, subscription: MapSubscription, force: bool) -> Optional[Dict]:
+        clusters, count = self._clusters(subscription.bbox, subscription.zoom)
+        if not force and clusters == subscription.last_clusters:
+            return None
+        subscription.last_clusters = clusters
+        subscription.visible = set()
+        self.aircraft_sent += count
+        return {'type': 'clusters', 'zoom': subscription.zoom, 'clusters': clusters}
+
+    def _snapshot_message(self, subscription: MapSubscription) -> Dict:
+        subscription.needs_snapshot = False
+        if subscription.clustered:
+            return self._cluster_message(subscription, force=True)
+        subscription.last_clusters = None
+        rows = self._rows_in_view(subscription, self.fleet.active_rows())
+        records = self.fleet.records(rows)
+        subscription.visible = {record['mission_id'] for record in records}
+        self.aircraft_sent += len(records)
+        return {'type': 'snapshot', 'missions': records}
+
+    def _delta_message(self, subscription: MapSubscription, changed: np.ndarray) -> Optional[Dict]:
+        if subscription.clustered:
+            return self._cluster_message(subscription, force=False)
+
+        removed_missions = self.fleet.removed_since(subscription.sequence)
+        if removed_missions is None:
+            return self._snapshot_message(subscription)
+
+        lat, lon = self.fleet.positions(changed)
+        inside = in_bbox(lat, lon, subscription.bbox)
+        records = self.fleet.records(changed[inside])
+        # Aircraft that flew out of view are removed just like completed missions
+        left_view = [self.fleet.mission_ids[row] for row in changed[~inside].tolist()]
+        removed = [mission_id for mission_id in removed_missions + left_view if mission_id in subscription.visible]
+        subscription.visible.difference_update(removed)
+        subscription.visible.update(record['mission_id'] for record in records)
+        if not records and not removed:
+            return None
+        self.aircraft_sent += len(records)
+        return {'type': 'delta', 'updated': records, 'removed': removed}
+
+    async def _push(self, subscription: MapSubscription, message: Dict):
+        try:
+            await subscription.websocket.send_text(json.dumps(message, separators=(',', ':')))
+            self.messages += 1
+        except Exception:
+            self.send_errors += 1
+            self.remove(subscription)
+        finally:
+            subscription.sending = False
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "ticks": self.ticks,
+            "messages": self.messages,
+            "aircraft_sent": self.aircraft_sent,
+            "send_errors": self.send_errors,
+        }
@@ -0,0 +1,334 @@
+"""Rolling per-mission radio transcript for AI dispatch and ATC prompts.
+
+Every exchange (the crew's transmission and the reply) is appended to an
+in-memory ring for the mission and persisted to the radio-log table. Prompts
+include the transcript, so controllers remember earlier clearances. Prompt
+size is kept flat with a token budget: once the recent turns exceed it, the
+oldest are folded into a short running summary by the model, and only the
+summary and the newest turns go into the prompt.
+
+Radio-log items are keyed by ``mission_id`` and ``seq`` (microseconds since
+the epoch). The running summary is stored at ``seq = 0``.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from aws_async import AsyncTable
+
+RADIO_TRANSCRIPT_TOKEN_BUDGET = int(os.environ.get('RADIO_TRANSCRIPT_TOKEN_BUDGET', 800))
+RADIO_SUMMARY_MAX_TOKENS = int(os.environ.get('RADIO_SUMMARY_MAX_TOKENS', 200))
+RADIO_TRANSCRIPT_MAX_TURNS = int(os.environ.get('RADIO_TRANSCRIPT_MAX_TURNS', 64))
+RADIO_TRANSCRIPT_MAX_MISSIONS = int(os.environ.get('RADIO_TRANSCRIPT_MAX_MISSIONS', 2000))
+# Rough English average for Claude's tokenizer; only used for budgeting
+CHARS_PER_TOKEN = 4
+SUMMARY_SEQ = 0
+
+SUMMARY_INSTRUCTIONS = """Summarize this HEMS radio traffic so a controller joining the frequency can continue it.
+Keep callsigns, clearances, assigned altitudes, headings, frequencies, squawk codes, runways or landing zones, and any request still outstanding.
+Drop pleasantries and repeated readbacks. Plain text, no more than 100 words.
+
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class RadioTurn:
+    """One transmission on the transcript"""
+
+    __slots__ = ('seq', 'channel', 'sender', 'message', 'tokens')
+
+    def __init__(self, seq: int, channel: str, sender: str, message: str):
+        self.seq = seq
+        self.channel = channel
+        self.sender = sender
+        self.message = message
+        self.tokens = estimate_tokens(self.line())
+
+    def line(self) -> str:
+        clock = datetime.fromtimestamp(self.seq / 1e6, timezone.utc).strftime('%H:%M:%S')
+        return f"[{clock}Z] {self.sender}: {self.message}"
+
+    @classmethod
+    def from_item(cls, item: Dict) -> 'RadioTurn':
+        return cls(int(item['seq']), item.get('channel', ''), item.get('sender', ''), item.get('message', ''))
+
+
+class MissionTranscript:
+    """In-memory state for one mission: running summary plus a ring of recent turns"""
+
+    __slots__ = ('summary', 'summarized_through', 'turns', 'last_seq', 'summarizing')
+
+    def __init__(self, max_turns: int):
+        self.summary = ''
+        self.summarized_through = 0
+        self.turns: deque = deque(maxlen=max_turns)
+        self.last_seq = 0
+        self.summarizing = False
+
+    def tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+
+class RadioTranscripts:
+    """Per-mission transcripts with a token budget, backed by the radio-log table
+
+    ``summarize(prompt, max_tokens)`` asks the model for a summary and
+    returns its text.
+    """
+
+    def __init__(
+        self,
+        table: AsyncTable,
+        summarize: Callable[[str, int], Awaitable[str]],
+        token_budget: int = RADIO_TRANSCRIPT_TOKEN_BUDGET,
+        max_turns: int = RADIO_TRANSCRIPT_MAX_TURNS,
+        max_missions: int = RADIO_TRANSCRIPT_MAX_MISSIONS,
+    ):
+        self.table = table
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_missions = max_missions
+        self._states: 'OrderedDict[str, MissionTranscript]' = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._writes = set()
+        # mission_id -> its log writes still in flight
+        self._mission_writes: Dict[str, set] = {}
+        self._folds = set()
+
+        self.turns_recorded = 0
+        self.loads = 0
+        self.summaries = 0
+        self.summary_errors = 0
+        self.write_errors = 0
+        self.contexts = 0
+        self.context_tokens = 0
+        self.max_context_tokens = 0
+
+    # ---- state ----
+
+    async def _load(self, mission_id: str) -> MissionTranscript:
+        # A turn recorded while the mission was out of memory may still be in flight
+        pending = self._mission_writes.get(mission_id)
+        if pending:
+            await asyncio.wait(set(pending))
+        state = MissionTranscript(self.max_turns)
+        summary = await self.table.get_item(Key={'mission_id': mission_id, 'seq': SUMMARY_SEQ})
+        if 'Item' in summary:
+            state.summary = summary['Item'].get('summary', '')
+            state.summarized_through = int(summary['Item'].get('summarized_through', 0))
+        response = await self.table.query(
+            KeyConditionExpression=Key('mission_id').eq(mission_id) & Key('seq').gt(state.summarized_through),
+            ScanIndexForward=False,
+            Limit=self.max_turns
+        )
+        for item in reversed(response.get('Items', [])):
+            state.turns.append(RadioTurn.from_item(item))
+        if state.turns:
+            state.last_seq = state.turns[-1].seq
+        self.loads += 1
+        return state
+
+    async def _state(self, mission_id: str) -> MissionTranscript:
+        state = self._states.get(mission_id)
+        if state is not None:
+            self._states.move_to_end(mission_id)
+            return state
+        pending = self._loading.get(mission_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[mission_id] = future
+        try:
+            state = await self._load(mission_id)
+            self._states[mission_id] = state
+            while len(self._states) > self.max_missions:
+                self._states.popitem(last=False)
+            future.set_result(state)
+            return state
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._loading[mission_id]
+
+    def forget(self, mission_id: str):
+        """Drop a finished mission from memory; its log stays in the table"""
+        self._states.pop(mission_id, None)
+
+    def _spawn(self, tasks: set, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    def _write_done(self, mission_id: str, task: asyncio.Task):
+        pending = self._mission_writes.get(mission_id)
+        if pending is not None:
+            pending.discard(task)
+            if not pending:
+                del self._mission_writes[mission_id]
+
+    # ---- prompts ----
+
+    async def context(self, mission_id: str) -> str:
+        """Transcript block for a prompt: the summary plus the newest turns that fit the budget"""
+        state = await self._state(mission_id)
+        lines = []
+        used = estimate_tokens(state.summary) if state.summary else 0
+        for turn in reversed(state.turns):
+            if used + turn.tokens > self.token_budget:
+                break
+            lines.append(turn.line())
+            used += turn.tokens
+        if not lines and not state.summary:
+            return ''
+
+        self.contexts += 1
+        self.context_tokens += used
+        self.max_context_tokens = max(self.max_context_tokens, used)
+        block = ["Radio Transcript (earlier traffic on this mission, oldest first):"]
+        if state.summary:
+            block.append(f"Summary of earlier traffic: {state.summary}")
+        block.extend(reversed(lines))
+        return '\n'.join(block)
+
+    # ---- recording ----
+
+    def record(self, mission_id: str, user_id: Optional[str], channel: str, transmissions: List[Tuple[str, str]]):
+        """Append (sender, message) transmissions and persist them in the background"""
+        state = self._states.get(mission_id)
+        last_seq = state.last_seq if state is not None else 0
+        turns = []
+        for sender, message in transmissions:
+            if not message:
+                continue
+            last_seq = max(last_seq + 1, time.time_ns() // 1000)
+            turns.append(RadioTurn(last_seq, channel, sender, message))
+        if not turns:
+            return
+
+        self.turns_recorded += len(turns)
+        if state is not None:
+            state.last_seq = last_seq
+            state.turns.extend(turns)
+            if state.tokens() > self.token_budget and not state.summarizing:
+                state.summarizing = True
+                self._spawn(self._folds, self._fold(mission_id, state))
+        task = self._spawn(self._writes, self._write(mission_id, user_id, turns))
+        self._mission_writes.setdefault(mission_id, set()).add(task)
+        task.add_done_callback(lambda done: self._write_done(mission_id, done))
+
+    async def _write(self, mission_id: str, user_id: Optional[str], turns: List[RadioTurn]):
+        timestamp = datetime.now(timezone.utc).isoformat()
+        try:
+            for turn in turns:
+                await self.table.put_item(Item={
+                    'mission_id': mission_id,
+                    'seq': turn.seq,
+                    'user_id': user_id,
+                    'channel': turn.channel,
+                    'sender': turn.sender,
+                    'message': turn.message,
+                    'timestamp': timestamp
+                })
+        except ClientError as e:
+            self.write_errors += 1
+            print(f"Radio log write failed for {mission_id}: {e}")
+
+    async def _fold(self, mission_id: str, state: MissionTranscript):
+        """Fold the oldest turns into the summary until the rest fit in half the budget"""
+        try:
+            remaining = state.tokens()
+            folded = []
+            for turn in state.turns:
+                if remaining <= self.token_budget // 2:
+                    break
+                folded.append(turn)
+                remaining -= turn.tokens
+            if not folded:
+                return
+
+            prompt = SUMMARY_INSTRUCTIONS
+            if state.summary:
+                prompt += f"Summary so far: {state.summary}\n\n"
+            prompt += '\n'.join(turn.line() for turn in folded)
+            try:
+                summary = (await self.summarize(prompt, RADIO_SUMMARY_MAX_TOKENS)).strip()
+            except Exception as e:
+                # Prompts stay within budget regardless; the next exchange retries
+                self.summary_errors += 1
+                print(f"Radio transcript summary failed for {mission_id}: {e}")
+                return
+
+            through = folded[-1].seq
+            state.summary = summary
+            state.summarized_through = through
+            while state.turns and state.turns[0].seq <= through:
+                state.turns.popleft()
+            self.summaries += 1
+            await self.table.put_item(Item={
+                'mission_id': mission_id,
+                'seq': SUMMARY_SEQ,
+                'summary': summary,
+                'summarized_through': through,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            })
+        except ClientError as e:
+            self.write_errors += 1
+            print(f"Radio summary write failed for {mission_id}: {e}")
+        finally:
+            state.summarizing = False
+
+    # ---- reads ----
+
+    async def log(self, mission_id: str, limit: int) -> Tuple[str, List[Dict]]:
+        """(summary, the mission's first ``limit`` transmissions) from the table"""
+        response = await self.table.query(
+            KeyConditionExpression=Key('mission_id').eq(mission_id),
+            Limit=limit + 1
+        )
+        summary = ''
+        messages = []
+        for item in response.get('Items', []):
+            if int(item['seq']) == SUMMARY_SEQ:
+                summary = item.get('summary', '')
+                continue
+            messages.append({
+                'seq': int(item['seq']),
+                'channel': item.get('channel'),
+                'sender': item.get('sender'),
+                'message': item.get('message'),
+                'timestamp': item.get('timestamp')
+            })
+        return summary, messages[:limit]
+
+    async def stop(self):
+        """Finish pending log writes and summaries"""
+        pending = self._writes | self._folds
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "missions": len(self._states),
+            "token_budget": self.token_budget,
+            "turns_recorded": self.turns_recorded,
+            "loads": self.loads,
+            "summaries": self.summaries,
+            "summary_errors": self.summary_errors,
+            "write_errors": self.write_errors,
+            "avg_context_tokens": round(self.context_tokens / self.contexts, 1) if self.contexts else 0.0,
+            "max_context_tokens": self.max_context_tokens,
+        }
@@ -0,0 +1,144 @@
+"""In-memory snapshots of rarely-changing reference tables.
+
+HEMS bases, hospitals and helicopters change only when ``seed_data.py`` or an
+admin edits them, so each table is scanned in full (following
+``LastEvaluatedKey``) and served from memory. Every snapshot is pre-encoded
+once with a content hash that doubles as its ``ETag``.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aws_async import AsyncTable, decimal_default
+
+REFERENCE_DATA_REFRESH_SECONDS = float(os.environ.get('REFERENCE_DATA_REFRESH_SECONDS', 300))
+
+
+async def scan_all(table: AsyncTable, **kwargs) -> List[Dict]:
+    """Scan a whole table, following LastEvaluatedKey across 1 MB pages"""
+    items: List[Dict] = []
+    while True:
+        response = await table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return items
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+class ReferenceSnapshot:
+    __slots__ = ('items', 'body', 'etag', 'loaded_at')
+
+    def __init__(self, items: List[Dict], body: bytes, etag: str):
+        self.items = items
+        self.body = body
+        self.etag = etag
+        self.loaded_at = time.time()
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True when an If-None-Match header names this snapshot's ETag"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return any(tag.removeprefix('W/') == self.etag for tag in tags)
+
+
+class ReferenceDataCache:
+    """Loads reference tables completely and serves them from memory"""
+
+    def __init__(
+        self,
+        tables: Dict[str, Tuple[AsyncTable, str]],
+        refresh_seconds: float = REFERENCE_DATA_REFRESH_SECONDS,
+    ):
+        # name -> (table, response key), e.g. 'hospitals' -> (table, 'hospitals')
+        self.tables = tables
+        self.refresh_seconds = refresh_seconds
+        self._snapshots: Dict[str, ReferenceSnapshot] = {}
+        self._locks = {name: asyncio.Lock() for name in tables}
+        self._listeners: Dict[str, List[Callable[[List[Dict]], None]]] = {name: [] for name in tables}
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.not_modified = 0
+
+    def subscribe(self, name: str, listener: Callable[[List[Dict]], None]):
+        """Call ``listener(items)`` whenever the named table is (re)loaded"""
+        self._listeners[name].append(listener)
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None:
+            listener(snapshot.items)
+
+    async def get(self, name: str) -> ReferenceSnapshot:
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            snapshot = await self.load(name)
+        return snapshot
+
+    async def load(self, name: str, force: bool = False) -> ReferenceSnapshot:
+        """(Re)load a table; concurrent callers share one scan"""
+        before = self._snapshots.get(name)
+        async with self._locks[name]:
+            current = self._snapshots.get(name)
+            # Skip the scan if any snapshot will do, or another caller just reloaded
+            if current is not None and (not force or current is not before):
+                return current
+
+            table, response_key = self.tables[name]
+            items = await scan_all(table)
+            body = json.dumps({response_key: items}, default=decimal_default, separators=(',', ':')).encode()
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            snapshot = ReferenceSnapshot(items, body, etag)
+            self._snapshots[name] = snapshot
+            self.loads += 1
+
+        for listener in self._listeners[name]:
+            try:
+                listener(items)
+            except Exception as e:
+                print(f"Reference data listener failed for {name}: {e}")
+        return snapshot
+
+    async def refresh_all(self):
+        results = await asyncio.gather(*(self.load(name, force=True) for name in self.tables), return_exceptions=True)
+        for name, result in zip(self.tables, results):
+            if isinstance(result, Exception):
+                print(f"Reference data refresh failed for {name}: {result}")
+
+    async def start(self):
+        await self.refresh_all()
+        if self._task is None and self.refresh_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.refresh_all()
+
+    def stats(self) -> Dict:
+        return {
+            "loads": self.loads,
+            "not_modified": self.not_modified,
+            "tables": {
+                name: {
+                    "items": len(snapshot.items),
+                    "bytes": len(snapshot.body),
+                    "etag": snapshot.etag,
+                    "age_seconds": round(time.time() - snapshot.loaded_at, 1)
+                }
+                for name, snapshot in self._snapshots.items()
+            }
+        }
@@ -2,24 +2,52 @@
 import os
 import json
 import uuid
+import time
+import zlib
+import base64
+import asyncio
 import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Tuple
 from contextlib import asynccontextmanager
 
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, EmailStr
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter, ValidationError
 import jwt
-from jwt import PyJWKClient
+
+from ai_prompts import ATC_CONTROLLER_CONTEXTS, PromptUsage, atc_system, dispatch_system, prompt_caching_enabled
+from ai_response_cache import AIResponseCache, atc_cache_key, dispatch_cache_key
+from ai_scheduler import AIBusyError, AIScheduler, is_throttle
+from analytics import ANALYTICS_RETENTION_DAYS, AnalyticsCounters
+from atc_phraseology import ATCPhraseologyEngine, facility_name
+from bedrock_stream import SSE_HEADERS, BedrockStreamer, sse_event
+from aws_async import AsyncClient, AsyncDynamoDB, ServiceExecutor, concurrency_limit, decimal_default
+from fleet_state import FleetState
+from live_map import LiveMapFeed
+from radio_transcript import RadioTranscripts
+from reference_data import ReferenceDataCache
+from spatial_index import FacilityIndex, subscribe_facility_index
+from speech_pipeline import pipeline_speech
+from telemetry_buffer import TelemetryBuffer
+from telemetry_sinks import InProcessSink
+import websocket_server
+from token_cache import JWKSCache, VerifiedClaimsCache
+from track_archive import TrackArchiver
+from tts_cache import TTS_DEFAULT_ENGINE, TTS_DEFAULT_VOICE, TTSCache
+from track_history import TRACK_DEFAULT_POINTS, TRACK_MAX_PAGE_SIZE, TRACK_MAX_POINTS, device_id_for, page_track
 
 # AWS Configuration
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 
+# Run the simulator WebSocket bridge inside this process (no HTTP loopback)
+BRIDGE_IN_PROCESS = os.environ.get('BRIDGE_IN_PROCESS', '').lower() in ('1', 'true', 'yes')
+
 # Load AWS config if available
 config_path = os.path.join(os.path.dirname(__file__), 'aws_config.json')
 if os.path.exists(config_path):
@@ -32,17 +60,111 @@ else:
         's3_bucket': os.environ.get('S3_BUCKET', ''),
     }
 
-# AWS Clients
-cognito = boto3.client('cognito-idp', region_name=AWS_REGION)
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-s3 = boto3.client('s3', region_name=AWS_REGION)
-bedrock = boto3.client('bedrock-runtime', region_name=AWS_REGION)
-polly = boto3.client('polly', region_name=AWS_REGION)
+# AWS Clients (non-blocking; each service runs on its own bounded pool)
+def async_client(service_name: str, pool_name: str) -> AsyncClient:
+    client = boto3.client(service_name, region_name=AWS_REGION)
+    return AsyncClient(client, ServiceExecutor(pool_name, concurrency_limit(pool_name)))
+
+cognito = async_client('cognito-idp', 'cognito')
+dynamodb = AsyncDynamoDB(AWS_REGION)
+s3 = async_client('s3', 's3')
+bedrock = async_client('bedrock-runtime', 'bedrock')
+polly = async_client('polly', 'polly')
+
+def aws_executors() -> List[ServiceExecutor]:
+    return [dynamodb.executor, cognito.executor, s3.executor, bedrock.executor, polly.executor]
 
 # DynamoDB Tables
 def get_table(name: str):
     return dynamodb.Table(f'VirtualHEMS_{name}')
 
+BEDROCK_MODEL_ID = os.environ.get('BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+
+def invoke_claude_sync(body: Dict) -> Dict:
+    """Invoke Claude on Bedrock and read the full response (runs on the Bedrock pool)"""
+    bedrock_response = bedrock.client.invoke_model(
+        modelId=BEDROCK_MODEL_ID,
+        contentType='application/json',
+        accept='application/json',
+        body=json.dumps(body)
+    )
+    return json.loads(bedrock_response['body'].read())
+
+# Static system prompts carry cache_control when the model supports prompt caching
+PROMPT_CACHING = prompt_caching_enabled(BEDROCK_MODEL_ID)
+prompt_usage = PromptUsage()
+
+async def invoke_claude(body: Dict) -> Dict:
+    response_body = await bedrock.run(invoke_claude_sync, body)
+    prompt_usage.record(response_body.get('usage') or {})
+    return response_body
+
+# Streamed completions for the SSE variants of the AI endpoints
+claude_streamer = BedrockStreamer(bedrock, BEDROCK_MODEL_ID, on_usage=prompt_usage.record)
+
+# Global and per-user admission control in front of Bedrock
+ai_scheduler = AIScheduler()
+
+# Replies to routine radio calls, reused across missions with the callsign swapped in
+ai_response_cache = AIResponseCache()
+
+# Polly audio stored once per (voice, engine, text)
+tts_cache = TTSCache(polly, s3, AWS_CONFIG.get('s3_bucket', ''))
+
+async def summarize_radio(prompt: str, max_tokens: int) -> str:
+    # Summaries queue as their own user so they never take a pilot's per-user slots
+    response_body = await ai_scheduler.call('radio-summary', lambda: invoke_claude({
+        'anthropic_version': 'bedrock-2023-05-31',
+        'max_tokens': max_tokens,
+        'messages': [{'role': 'user', 'content': prompt}]
+    }))
+    return response_body['content'][0]['text']
+
+# Routine ATC calls answered from phraseology templates without Bedrock
+atc_phraseology = ATCPhraseologyEngine()
+
+# Per-mission radio history for AI prompts, summarised to stay within a token budget
+radio_transcripts = RadioTranscripts(get_table('RadioLogs'), summarize_radio)
+
+# Reference data served from memory (bases, hospitals, helicopters)
+reference_data = ReferenceDataCache({
+    'hems_bases': (get_table('HemsBases'), 'bases'),
+    'hospitals': (get_table('Hospitals'), 'hospitals'),
+    'helicopters': (get_table('Helicopters'), 'helicopters'),
+})
+
+# Nearest-facility lookups, rebuilt whenever the reference data reloads
+facility_index = FacilityIndex()
+subscribe_facility_index(reference_data, facility_index)
+
+# Dashboard counters maintained from the write paths
+analytics = AnalyticsCounters(dynamodb, get_table('Analytics'), get_table('Users'), get_table('Missions'))
+
+# Write-behind telemetry (flushed periodically and on shutdown)
+telemetry_buffer = TelemetryBuffer(dynamodb, get_table('Missions'), get_table('Telemetry').name)
+
+# Current position of every active mission, served to the live map
+fleet_state = FleetState()
+live_map = LiveMapFeed(fleet_state)
+track_archive = TrackArchiver(dynamodb, s3, AWS_CONFIG.get('s3_bucket', ''), get_table('Missions'), get_table('Telemetry'))
+
+def with_live_tracking(mission: Dict) -> Dict:
+    """Overlay tracking that has been accepted but not yet flushed to DynamoDB
+    
+    The write-behind buffer holds the newest full sample; failing that, the
+    fleet state may hold a newer position than the stored item (e.g. merged
+    in by a resync after another worker's flush).
+    """
+    tracking = telemetry_buffer.latest_tracking(mission.get('mission_id'))
+    if tracking is not None:
+        mission['tracking'] = tracking
+        return mission
+    live = fleet_state.tracking(mission.get('mission_id'))
+    stored = mission.get('tracking') or {}
+    if live is not None and live['lastUpdate'] > int(stored.get('lastUpdate') or 0):
+        mission['tracking'] = {**stored, **live}
+    return mission
+
 # Pydantic Models
 class UserRegister(BaseModel):
     email: EmailStr
@@ -87,8 +209,8 @@ class MissionCreate(BaseModel):
 
 class TelemetryUpdate(BaseModel):
     mission_id: str
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
     altitude_ft: Optional[float] = 0
     ground_speed_kts: Optional[float] = 0
     heading_deg: Optional[float] = 0
@@ -97,11 +219,21 @@ class TelemetryUpdate(BaseModel):
     time_enroute_minutes: Optional[float] = 0
     phase: Optional[str] = 'Dispatch'
     engine_status: Optional[str] = 'Running'
+    timestamp_ms: Optional[int] = Field(None, ge=0)  # capture time; defaults to arrival time
+
+telemetry_batch_adapter = TypeAdapter(List[TelemetryUpdate])
+TELEMETRY_BATCH_MAX_SAMPLES = int(os.environ.get('TELEMETRY_BATCH_MAX_SAMPLES', 1000))
+TELEMETRY_BATCH_MAX_BYTES = int(os.environ.get('TELEMETRY_BATCH_MAX_BYTES', 4 * 1024 * 1024))
 
 class AIDispatchRequest(BaseModel):
     mission_id: str
     message: str
 
+class TTSRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=3000)
+    voice_id: str = TTS_DEFAULT_VOICE
+    engine: str = TTS_DEFAULT_ENGINE
+
 class ATCRequest(BaseModel):
     mission_id: str
     message: str
@@ -109,7 +241,24 @@ class ATCRequest(BaseModel):
     airport_code: Optional[str] = None
     frequency: Optional[str] = None
 
+class ATCSpeechRequest(ATCRequest):
+    voice_id: str = TTS_DEFAULT_VOICE
+    engine: str = TTS_DEFAULT_ENGINE
+
 # JWT Verification
+jwks_cache: Optional[JWKSCache] = None
+claims_cache = VerifiedClaimsCache()
+
+def cognito_issuer() -> str:
+    return f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{AWS_CONFIG.get('user_pool_id', '')}"
+
+def get_jwks_cache() -> JWKSCache:
+    """Return the shared JWKS cache, creating it if lifespan has not run"""
+    global jwks_cache
+    if jwks_cache is None:
+        jwks_cache = JWKSCache(f"{cognito_issuer()}/.well-known/jwks.json")
+    return jwks_cache
+
 async def verify_token(authorization: str = Header(None)) -> Dict:
     """Verify Cognito JWT token"""
     if not authorization:
@@ -118,38 +267,145 @@ async def verify_token(authorization: str = Header(None)) -> Dict:
     try:
         token = authorization.replace('Bearer ', '')
         
-        # Get JWKS URL for Cognito
         user_pool_id = AWS_CONFIG.get('user_pool_id', '')
         if not user_pool_id:
             # Fallback: decode without verification for development
             payload = jwt.decode(token, options={"verify_signature": False})
             return payload
         
-        jwks_url = f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{user_pool_id}/.well-known/jwks.json"
-        jwks_client = PyJWKClient(jwks_url)
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
+        cached = claims_cache.get(token)
+        if cached is not None:
+            return cached
+        
+        signing_key = await get_jwks_cache().get_signing_key(token)
         
+        started = time.perf_counter()
         payload = jwt.decode(
             token,
             signing_key.key,
             algorithms=["RS256"],
             audience=AWS_CONFIG.get('user_pool_client_id'),
-            issuer=f"https://cognito-idp.{AWS_REGION}.amazonaws.com/{user_pool_id}"
+            issuer=cognito_issuer()
         )
+        claims_cache.record_verification(time.perf_counter() - started)
+        claims_cache.put(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    except jwt.PyJWKClientError as e:
+        print(f"JWKS error: {e}")
+        raise HTTPException(status_code=503, detail="Token verification keys unavailable")
+
+# Telemetry ingestion (shared by the REST endpoint and the in-process bridge)
+def tracking_from_telemetry(telemetry: TelemetryUpdate, now: datetime) -> Dict:
+    """Mission tracking state for one sample"""
+    return {
+        'latitude': telemetry.latitude,
+        'longitude': telemetry.longitude,
+        'altitudeFt': telemetry.altitude_ft,
+        'groundSpeedKts': telemetry.ground_speed_kts,
+        'headingDeg': telemetry.heading_deg,
+        'verticalSpeedFtMin': telemetry.vertical_speed_ftmin,
+        'fuelRemainingLbs': telemetry.fuel_remaining_lbs,
+        'timeEnrouteMinutes': telemetry.time_enroute_minutes,
+        'phase': telemetry.phase,
+        'lastUpdate': telemetry.timestamp_ms or int(now.timestamp() * 1000)
+    }
+
+def telemetry_history_item(mission_id: str, user_id: str, tracking_data: Dict) -> Dict:
+    return {
+        'device_id': f"{user_id}:{mission_id}",
+        'timestamp': tracking_data['lastUpdate'] // 1000,
+        'mission_id': mission_id,
+        **tracking_data
+    }
+
+def ingest_telemetry(mission_id: str, telemetry: TelemetryUpdate, user_id: str):
+    """Buffer one telemetry sample for write-behind persistence"""
+    now = datetime.now(timezone.utc)
+    tracking_data = tracking_from_telemetry(telemetry, now)
+    fleet_state.update_tracking(mission_id, user_id, tracking_data)
+    telemetry_buffer.add(mission_id, tracking_data, now.isoformat(), telemetry_history_item(mission_id, user_id, tracking_data))
+
+def ingest_telemetry_batch(mission_id: str, samples: List[TelemetryUpdate], user_id: str):
+    """Buffer an ordered batch; mission tracking is taken from the newest sample only"""
+    now = datetime.now(timezone.utc)
+    tracking = [tracking_from_telemetry(sample, now) for sample in samples]
+    newest = max(range(len(tracking)), key=lambda i: (tracking[i]['lastUpdate'], i))
+    fleet_state.update_tracking(mission_id, user_id, tracking[newest])
+    telemetry_buffer.add_many(
+        mission_id,
+        tracking[newest],
+        now.isoformat(),
+        [telemetry_history_item(mission_id, user_id, t) for t in tracking]
+    )
+
+def decode_request_body(raw: bytes, content_encoding: Optional[str]) -> bytes:
+    """Decompress a gzip request body, refusing anything that inflates past the size limit"""
+    if (content_encoding or '').lower() != 'gzip':
+        return raw
+    try:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(raw, TELEMETRY_BATCH_MAX_BYTES + 1)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    if len(body) > TELEMETRY_BATCH_MAX_BYTES or decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Telemetry batch too large")
+    return body
+
+async def ingest_bridge_telemetry(mission_id: str, payload: Dict, authorization: Optional[str]):
+    """In-process bridge entry point: authenticate the plugin and ingest directly"""
+    token_data = await verify_token(authorization)
+    ingest_telemetry(mission_id, TelemetryUpdate(**payload), token_data.get('sub'))
+
+bridge_sink: Optional[InProcessSink] = None
+
+async def require_admin(token_data: Dict):
+    """Reject callers whose profile is not flagged is_admin"""
+    users_table = get_table('Users')
+    response = await users_table.get_item(Key={'user_id': token_data.get('sub')}, ProjectionExpression='is_admin')
+    if not response.get('Item', {}).get('is_admin'):
+        raise HTTPException(status_code=403, detail="Admin access required")
 
 # Lifespan for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global bridge_sink
     print("VirtualHEMS Backend Starting...")
     print(f"AWS Region: {AWS_REGION}")
     print(f"Config loaded: {bool(AWS_CONFIG.get('user_pool_id'))}")
+    if AWS_CONFIG.get('user_pool_id'):
+        await get_jwks_cache().warm()
+    await telemetry_buffer.start()
+    await reference_data.start()
+    await analytics.start()
+    await fleet_state.start(get_table('Missions'))
+    await live_map.start()
+    await track_archive.start()
+    bridge_task = None
+    if BRIDGE_IN_PROCESS:
+        bridge_sink = InProcessSink(ingest_bridge_telemetry)
+        bridge_task = asyncio.create_task(websocket_server.run_bridge(bridge_sink))
+        print("Simulator bridge running in-process")
     yield
     print("VirtualHEMS Backend Shutting Down...")
+    if bridge_task is not None:
+        bridge_task.cancel()
+        try:
+            await bridge_task
+        except asyncio.CancelledError:
+            pass
+    await track_archive.stop()
+    await radio_transcripts.stop()
+    await live_map.stop()
+    await fleet_state.stop()
+    await analytics.stop()
+    await reference_data.stop()
+    await telemetry_buffer.stop()
+    for executor in aws_executors():
+        executor.shutdown()
 
 # FastAPI App
 app = FastAPI(
@@ -168,6 +424,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(AIBusyError)
+async def ai_busy_handler(request: Request, exc: AIBusyError):
+    """Backpressure from the AI scheduler: 429 with a retry hint"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # ============ AUTH ENDPOINTS ============
 
 @app.post("/api/auth/register")
@@ -181,7 +446,7 @@ async def register_user(user: UserRegister):
             raise HTTPException(status_code=500, detail="AWS Cognito not configured")
         
         # Create user in Cognito
-        response = cognito.sign_up(
+        response = await cognito.sign_up(
             ClientId=client_id,
             Username=user.email,
             Password=user.password,
@@ -197,7 +462,7 @@ async def register_user(user: UserRegister):
         users_table = get_table('Users')
         api_key = str(uuid.uuid4())
         
-        users_table.put_item(Item={
+        profile_item = {
             'user_id': user_sub,
             'email': user.email,
             'first_name': user.first_name,
@@ -208,7 +473,9 @@ async def register_user(user: UserRegister):
             'is_subscribed': True,  # Free access for all
             'created_at': datetime.now(timezone.utc).isoformat(),
             'updated_at': datetime.now(timezone.utc).isoformat()
-        })
+        }
+        await users_table.put_item(Item=profile_item)
+        await analytics.user_registered(profile_item)
         
         return {
             "success": True,
@@ -230,7 +497,7 @@ async def login_user(credentials: UserLogin):
         if not client_id:
             raise HTTPException(status_code=500, detail="AWS Cognito not configured")
         
-        response = cognito.initiate_auth(
+        response = await cognito.initiate_auth(
             ClientId=client_id,
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
@@ -262,7 +529,7 @@ async def refresh_token(refresh_token: str):
     try:
         client_id = AWS_CONFIG.get('user_pool_client_id')
         
-        response = cognito.initiate_auth(
+        response = await cognito.initiate_auth(
             ClientId=client_id,
             AuthFlow='REFRESH_TOKEN_AUTH',
             AuthParameters={'REFRESH_TOKEN': refresh_token}
@@ -284,7 +551,7 @@ async def get_current_user(token_data: Dict = Depends(verify_token)):
     user_id = token_data.get('sub')
     
     users_table = get_table('Users')
-    response = users_table.get_item(Key={'user_id': user_id})
+    response = await users_table.get_item(Key={'user_id': user_id})
     
     if 'Item' not in response:
         raise HTTPException(status_code=404, detail="User profile not found")
@@ -297,16 +564,74 @@ async def get_current_user(token_data: Dict = Depends(verify_token)):
 
 # ============ PROFILE ENDPOINTS ============
 
-@app.get("/api/profiles")
-async def get_all_profiles(token_data: Dict = Depends(verify_token)):
-    """Get all user profiles (for pilot directory)"""
+PROFILE_PROJECTION = 'user_id, first_name, last_name, avatar_url, #loc, bio, simulators, experience, social_links, email_public, updated_at'
+PROFILES_DEFAULT_LIMIT = 100
+PROFILES_MAX_LIMIT = 1000
+
+def encode_cursor(last_evaluated_key: Optional[Dict]) -> Optional[str]:
+    """Opaque pagination token wrapping a DynamoDB LastEvaluatedKey"""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, default=decimal_default, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_profile_cursor(cursor: Optional[str]) -> Optional[Dict]:
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Users is keyed by user_id alone; reject anything else
+    if not isinstance(key, dict) or set(key) != {'user_id'} or not isinstance(key['user_id'], str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+async def scan_profiles_page(limit: int, start_key: Optional[Dict]) -> Dict:
     users_table = get_table('Users')
-    response = users_table.scan(
-        ProjectionExpression='user_id, first_name, last_name, avatar_url, #loc, bio, simulators, experience, social_links, email_public, updated_at',
-        ExpressionAttributeNames={'#loc': 'location'}
-    )
+    kwargs = {
+        'ProjectionExpression': PROFILE_PROJECTION,
+        'ExpressionAttributeNames': {'#loc': 'location'},
+        'Limit': limit
+    }
+    if start_key:
+        kwargs['ExclusiveStartKey'] = start_key
+    return await users_table.scan(**kwargs)
+
+async def stream_profiles(limit: int, start_key: Optional[Dict]):
+    """Yield NDJSON lines as each scan page arrives"""
+    while True:
+        response = await scan_profiles_page(limit, start_key)
+        items = response.get('Items', [])
+        if items:
+            yield ''.join(json.dumps(item, default=decimal_default) + '\n' for item in items).encode()
+        start_key = response.get('LastEvaluatedKey')
+        if not start_key:
+            return
+
+@app.get("/api/profiles")
+async def get_all_profiles(
+    limit: int = Query(PROFILES_DEFAULT_LIMIT, ge=1, le=PROFILES_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    token_data: Dict = Depends(verify_token)
+):
+    """Get user profiles for the pilot directory, one page at a time
+    
+    Pass ``next_cursor`` back as ``cursor`` to fetch the following page. With
+    ``stream=true`` every profile from ``cursor`` onwards is sent as NDJSON,
+    ``limit`` then being the size of each underlying scan page.
+    """
+    start_key = decode_profile_cursor(cursor)
     
-    return {"profiles": response.get('Items', [])}
+    if stream:
+        return StreamingResponse(stream_profiles(limit, start_key), media_type='application/x-ndjson')
+    
+    response = await scan_profiles_page(limit, start_key)
+    return {
+        "profiles": response.get('Items', []),
+        "next_cursor": encode_cursor(response.get('LastEvaluatedKey'))
+    }
 
 @app.get("/api/profiles/{user_id}")
 async def get_user_profile(user_id: str, token_data: Dict = Depends(verify_token)):
@@ -318,7 +643,7 @@ async def get_user_profile(user_id: str, token_data: Dict = Depends(verify_token
         pass
     
     users_table = get_table('Users')
-    response = users_table.get_item(Key={'user_id': user_id})
+    response = await users_table.get_item(Key={'user_id': user_id})
     
     if 'Item' not in response:
         raise HTTPException(status_code=404, detail="User profile not found")
@@ -345,12 +670,16 @@ async def update_profile(profile: UserProfile, token_data: Dict = Depends(verify
             update_expr += f", {key} = :{key}"
             expr_values[f':{key}'] = value
     
-    users_table.update_item(
+    update_kwargs = {'ExpressionAttributeNames': expr_names} if expr_names else {}
+    response = await users_table.update_item(
         Key={'user_id': user_id},
         UpdateExpression=update_expr,
         ExpressionAttributeValues=expr_values,
-        ExpressionAttributeNames=expr_names if expr_names else None
+        ReturnValues='ALL_OLD',
+        **update_kwargs
     )
+    previous = response.get('Attributes', {})
+    await analytics.profile_updated(previous, {**previous, **profile_dict})
     
     return {"success": True, "message": "Profile updated"}
 
@@ -362,7 +691,7 @@ async def rotate_api_key(token_data: Dict = Depends(verify_token)):
     
     new_key = str(uuid.uuid4())
     
-    users_table.update_item(
+    await users_table.update_item(
         Key={'user_id': user_id},
         UpdateExpression='SET api_key = :key, updated_at = :updated',
         ExpressionAttributeValues={
@@ -397,7 +726,7 @@ async def admin_update_user(user_id: str, updates: AdminUserUpdate, token_data:
                 update_expr += f", {key} = :{key}"
                 expr_values[f':{key}'] = value
         
-        users_table.update_item(
+        await users_table.update_item(
             Key={'user_id': user_id},
             UpdateExpression=update_expr,
             ExpressionAttributeValues=expr_values,
@@ -407,39 +736,17 @@ async def admin_update_user(user_id: str, updates: AdminUserUpdate, token_data:
     return {"success": True, "message": f"User {user_id} updated by admin"}
 
 @app.get("/api/admin/analytics")
-async def get_admin_analytics(token_data: Dict = Depends(verify_token)):
-    """Get admin analytics data"""
+async def get_admin_analytics(days: int = Query(30, ge=1, le=ANALYTICS_RETENTION_DAYS), token_data: Dict = Depends(verify_token)):
+    """Get admin analytics data from the maintained counters"""
     # In production, verify admin role here
-    
-    users_table = get_table('Users')
-    missions_table = get_table('Missions')
-    
-    # Get user counts
-    users_response = users_table.scan(Select='COUNT')
-    total_users = users_response.get('Count', 0)
-    
-    # Get users with complete profiles
-    complete_profiles_response = users_table.scan(
-        FilterExpression='attribute_exists(first_name) AND attribute_exists(last_name) AND attribute_exists(bio)',
-        Select='COUNT'
-    )
-    complete_profiles = complete_profiles_response.get('Count', 0)
-    
-    # Get recent missions (last 30 days)
-    thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
-    recent_missions_response = missions_table.scan(
-        FilterExpression='created_at > :date',
-        ExpressionAttributeValues={':date': thirty_days_ago},
-        Select='COUNT'
-    )
-    recent_missions = recent_missions_response.get('Count', 0)
-    
-    return {
-        "total_users": total_users,
-        "complete_profiles": complete_profiles,
-        "recent_missions": recent_missions,
-        "completion_rate": round((complete_profiles / total_users * 100) if total_users > 0 else 0, 1)
-    }
+    return await analytics.summary(days)
+
+@app.post("/api/admin/analytics/reconcile")
+async def reconcile_admin_analytics(token_data: Dict = Depends(verify_token)):
+    """Recount the analytics counters from the source tables now"""
+    await require_admin(token_data)
+    await analytics.reconcile(force=True)
+    return {"success": True, "reconciled_at": analytics.last_reconcile_at}
 
 # ============ MISSION ENDPOINTS ============
 
@@ -484,7 +791,9 @@ async def create_mission(mission: MissionCreate, token_data: Dict = Depends(veri
         'updated_at': now
     }
     
-    missions_table.put_item(Item=mission_item)
+    await missions_table.put_item(Item=mission_item)
+    fleet_state.upsert(mission_id, user_id, mission.callsign, mission_item['tracking'])
+    await analytics.mission_created(now)
     
     return {"success": True, "mission_id": mission_id, "mission": mission_item}
 
@@ -495,12 +804,12 @@ async def get_missions(status: Optional[str] = None, token_data: Dict = Depends(
     missions_table = get_table('Missions')
     
     if status:
-        response = missions_table.query(
+        response = await missions_table.query(
             IndexName='status-index',
             KeyConditionExpression=Key('status').eq(status)
         )
     else:
-        response = missions_table.query(
+        response = await missions_table.query(
             IndexName='user_id-index',
             KeyConditionExpression=Key('user_id').eq(user_id)
         )
@@ -509,131 +818,263 @@ async def get_missions(status: Optional[str] = None, token_data: Dict = Depends(
 
 @app.get("/api/missions/active")
 async def get_active_missions(token_data: Dict = Depends(verify_token)):
-    """Get all active missions (for global map)"""
-    missions_table = get_table('Missions')
+    """Get the position of every active mission (for global map)
     
-    response = missions_table.query(
-        IndexName='status-index',
-        KeyConditionExpression=Key('status').eq('active')
-    )
+    Served from the in-memory fleet state; each entry carries mission_id,
+    user_id, callsign and tracking. Fetch /api/missions/{id} for full details.
+    """
+    return Response(content=fleet_state.snapshot(), media_type='application/json')
+
+@app.websocket("/api/missions/live")
+async def live_map_feed(websocket: WebSocket, token: Optional[str] = None):
+    """Push live positions for a subscribed bounding box (see live_map.py for the protocol)"""
+    authorization = websocket.headers.get('authorization') or (f"Bearer {token}" if token else None)
+    try:
+        await verify_token(authorization)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
     
-    return {"missions": response.get('Items', [])}
+    await websocket.accept()
+    try:
+        subscription = live_map.add(websocket)
+    except RuntimeError as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+    
+    try:
+        while True:
+            message = await websocket.receive_json()
+            if not isinstance(message, dict) or message.get('type') != 'subscribe':
+                continue
+            try:
+                subscription.subscribe(message.get('bbox'), message.get('zoom', 0))
+            except (TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            live_map.request_snapshot(subscription)
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        live_map.remove(subscription)
 
 @app.get("/api/missions/{mission_id}")
 async def get_mission(mission_id: str, token_data: Dict = Depends(verify_token)):
     """Get specific mission details"""
     missions_table = get_table('Missions')
     
-    response = missions_table.get_item(Key={'mission_id': mission_id})
+    response = await missions_table.get_item(Key={'mission_id': mission_id})
     
     if 'Item' not in response:
         raise HTTPException(status_code=404, detail="Mission not found")
     
-    return {"mission": response['Item']}
+    return {"mission": with_live_tracking(response['Item'])}
 
 @app.put("/api/missions/{mission_id}/telemetry")
 async def update_telemetry(mission_id: str, telemetry: TelemetryUpdate, token_data: Dict = Depends(verify_token)):
     """Update mission telemetry"""
-    missions_table = get_table('Missions')
-    telemetry_table = get_table('Telemetry')
+    ingest_telemetry(mission_id, telemetry, token_data.get('sub'))
+    return {"success": True}
+
+@app.put("/api/missions/{mission_id}/telemetry/batch")
+async def update_telemetry_batch(mission_id: str, request: Request, token_data: Dict = Depends(verify_token)):
+    """Upload an ordered array of telemetry samples (optionally gzip-encoded)"""
+    raw = await request.body()
+    if len(raw) > TELEMETRY_BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Telemetry batch too large")
+    body = decode_request_body(raw, request.headers.get('content-encoding'))
     
-    now = datetime.now(timezone.utc)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if isinstance(payload, dict):
+        payload = payload.get('samples')
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Expected an array of telemetry samples")
+    if not payload:
+        return {"success": True, "accepted": 0}
+    if len(payload) > TELEMETRY_BATCH_MAX_SAMPLES:
+        raise HTTPException(status_code=413, detail=f"At most {TELEMETRY_BATCH_MAX_SAMPLES} samples per batch")
     
-    # Update mission tracking
-    tracking_data = {
-        'latitude': telemetry.latitude,
-        'longitude': telemetry.longitude,
-        'altitudeFt': telemetry.altitude_ft,
-        'groundSpeedKts': telemetry.ground_speed_kts,
-        'headingDeg': telemetry.heading_deg,
-        'verticalSpeedFtMin': telemetry.vertical_speed_ftmin,
-        'fuelRemainingLbs': telemetry.fuel_remaining_lbs,
-        'timeEnrouteMinutes': telemetry.time_enroute_minutes,
-        'phase': telemetry.phase,
-        'lastUpdate': int(now.timestamp() * 1000)
-    }
+    try:
+        samples = telemetry_batch_adapter.validate_python(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
     
-    missions_table.update_item(
-        Key={'mission_id': mission_id},
-        UpdateExpression='SET tracking = :tracking, updated_at = :updated',
-        ExpressionAttributeValues={
-            ':tracking': tracking_data,
-            ':updated': now.isoformat()
-        }
-    )
+    ingest_telemetry_batch(mission_id, samples, token_data.get('sub'))
+    return {"success": True, "accepted": len(samples)}
+
+@app.get("/api/missions/{mission_id}/track")
+async def get_mission_track(
+    mission_id: str,
+    start_ms: Optional[int] = Query(None, ge=0),
+    end_ms: Optional[int] = Query(None, ge=0),
+    points: int = Query(TRACK_DEFAULT_POINTS, ge=0, le=TRACK_MAX_POINTS),
+    limit: int = Query(1000, ge=10, le=TRACK_MAX_PAGE_SIZE),
+    token_data: Dict = Depends(verify_token)
+):
+    """Recorded track for replay and debriefs
     
-    # Store telemetry history
-    user_id = token_data.get('sub')
-    telemetry_table.put_item(Item={
-        'device_id': f"{user_id}:{mission_id}",
-        'timestamp': int(now.timestamp()),
-        'mission_id': mission_id,
-        **tracking_data
-    })
+    With ``points`` > 0 the whole time window is downsampled to at most that
+    many points. ``points=0`` returns raw samples a page at a time; pass
+    ``next_start_ms`` back as ``start_ms`` for the next page. Completed
+    missions are read from their S3 archive.
+    """
+    missions_table = get_table('Missions')
+    response = await missions_table.get_item(Key={'mission_id': mission_id}, ProjectionExpression='user_id, track_archive')
+    if 'Item' not in response:
+        raise HTTPException(status_code=404, detail="Mission not found")
     
-    return {"success": True}
+    device_id = device_id_for(response['Item'].get('user_id'), mission_id)
+    archive = response['Item'].get('track_archive')
+    
+    if points:
+        track, _ = await track_archive.read_track(device_id, archive, start_ms, end_ms)
+        sampled = track.downsample(points)
+        return {
+            "mission_id": mission_id,
+            "points": sampled.points(),
+            "total_samples": len(track),
+            "downsampled": len(sampled) < len(track)
+        }
+    
+    track, truncated = await track_archive.read_track(device_id, archive, start_ms, end_ms, max_samples=limit + 1)
+    page, next_start_ms = page_track(track, limit, truncated)
+    return {
+        "mission_id": mission_id,
+        "points": page.points(),
+        "next_start_ms": next_start_ms
+    }
+
+@app.get("/api/missions/{mission_id}/radio")
+async def get_mission_radio_log(
+    mission_id: str,
+    limit: int = Query(200, ge=1, le=1000),
+    token_data: Dict = Depends(verify_token)
+):
+    """Dispatch and ATC transmissions for a mission, oldest first, with the running summary"""
+    summary, messages = await radio_transcripts.log(mission_id, limit)
+    return {"mission_id": mission_id, "summary": summary, "messages": messages}
 
 @app.put("/api/missions/{mission_id}/complete")
 async def complete_mission(mission_id: str, token_data: Dict = Depends(verify_token)):
     """Mark mission as complete"""
     missions_table = get_table('Missions')
     
-    missions_table.update_item(
+    now = datetime.now(timezone.utc).isoformat()
+    
+    response = await missions_table.update_item(
         Key={'mission_id': mission_id},
-        UpdateExpression='SET #s = :status, updated_at = :updated',
+        UpdateExpression='SET #s = :status, updated_at = :updated, completed_at = if_not_exists(completed_at, :updated)',
         ExpressionAttributeNames={'#s': 'status'},
         ExpressionAttributeValues={
             ':status': 'completed',
-            ':updated': datetime.now(timezone.utc).isoformat()
-        }
+            ':updated': now
+        },
+        ReturnValues='ALL_OLD'
     )
+    previous = response.get('Attributes', {})
+    fleet_state.remove(mission_id)
+    radio_transcripts.forget(mission_id)
+    if previous.get('user_id'):
+        # Write the final telemetry chunk with the next flush rather than when it goes idle
+        telemetry_buffer.seal_chunk(device_id_for(previous['user_id'], mission_id))
+    # Only the first completion is counted and archived
+    if previous.get('status') != 'completed':
+        await analytics.mission_completed(now)
+        if previous.get('user_id'):
+            track_archive.schedule(mission_id, previous['user_id'])
     
     return {"success": True}
 
 # ============ DATA ENDPOINTS (PUBLIC) ============
 
+async def reference_data_response(name: str, if_none_match: Optional[str]) -> Response:
+    """Serve a reference-data snapshot, answering 304 when the client's ETag is current"""
+    snapshot = await reference_data.get(name)
+    headers = {'ETag': snapshot.etag, 'Cache-Control': 'public, max-age=60, must-revalidate'}
+    if snapshot.matches(if_none_match):
+        reference_data.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type='application/json', headers=headers)
+
 @app.get("/api/hems-bases")
-async def get_hems_bases():
+async def get_hems_bases(if_none_match: Optional[str] = Header(None)):
     """Get all HEMS bases (public)"""
-    bases_table = get_table('HemsBases')
-    response = bases_table.scan()
-    return {"bases": response.get('Items', [])}
+    return await reference_data_response('hems_bases', if_none_match)
 
 @app.get("/api/hospitals")
-async def get_hospitals():
+async def get_hospitals(if_none_match: Optional[str] = Header(None)):
     """Get all hospitals (public)"""
-    hospitals_table = get_table('Hospitals')
-    response = hospitals_table.scan()
-    return {"hospitals": response.get('Items', [])}
+    return await reference_data_response('hospitals', if_none_match)
 
 @app.get("/api/helicopters")
-async def get_helicopters():
+async def get_helicopters(if_none_match: Optional[str] = Header(None)):
     """Get all helicopters (public)"""
-    helicopters_table = get_table('Helicopters')
-    response = helicopters_table.scan()
-    return {"helicopters": response.get('Items', [])}
+    return await reference_data_response('helicopters', if_none_match)
+
+@app.get("/api/hospitals/nearest")
+async def get_nearest_hospitals(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    radius_nm: Optional[float] = Query(None, gt=0),
+    trauma_center: Optional[bool] = None,
+    trauma_level: Optional[int] = Query(None, ge=1, le=5)
+):
+    """Nearest hospitals by great-circle distance (public)
+    
+    ``trauma_level`` keeps centers of that level or better, e.g. 2 matches levels 1 and 2.
+    """
+    await reference_data.get('hospitals')
+    hospitals = facility_index.nearest_hospitals(lat, lon, k, radius_nm, trauma_center, trauma_level)
+    return {"hospitals": hospitals}
+
+@app.get("/api/hems-bases/nearest")
+async def get_nearest_hems_bases(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    radius_nm: Optional[float] = Query(None, gt=0),
+    fmc_only: bool = False
+):
+    """Nearest HEMS bases, optionally only those with a fully mission capable helicopter (public)"""
+    await asyncio.gather(reference_data.get('hems_bases'), reference_data.get('helicopters'))
+    bases = facility_index.nearest_bases(lat, lon, k, radius_nm, fmc_only)
+    return {"bases": bases}
+
+@app.post("/api/admin/reference-data/invalidate")
+async def invalidate_reference_data(table: Optional[str] = None, token_data: Dict = Depends(verify_token)):
+    """Reload reference data after an admin edit (all tables when none is given)"""
+    await require_admin(token_data)
+    
+    names = [table] if table else list(reference_data.tables)
+    unknown = [name for name in names if name not in reference_data.tables]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown reference table: {unknown[0]}")
+    
+    snapshots = await asyncio.gather(*(reference_data.load(name, force=True) for name in names))
+    return {"success": True, "etags": {name: snapshot.etag for name, snapshot in zip(names, snapshots)}}
 
 # ============ AI DISPATCH ENDPOINTS ============
 
-@app.post("/api/dispatch/ai")
-async def ai_dispatch(request: AIDispatchRequest, token_data: Dict = Depends(verify_token)):
-    """AI-powered dispatch assistant using AWS Bedrock"""
-    try:
-        # Get mission context
-        missions_table = get_table('Missions')
-        response = missions_table.get_item(Key={'mission_id': request.mission_id})
-        
-        if 'Item' not in response:
-            raise HTTPException(status_code=404, detail="Mission not found")
-        
-        mission = response['Item']
-        
-        # Build context for AI
-        context = f"""
-You are a professional HEMS (Helicopter Emergency Medical Services) dispatch coordinator.
-You are assisting the flight crew during an active mission.
+async def get_ai_mission(mission_id: str) -> Dict:
+    missions_table = get_table('Missions')
+    response = await missions_table.get_item(Key={'mission_id': mission_id})
+    
+    if 'Item' not in response:
+        raise HTTPException(status_code=404, detail="Mission not found")
+    
+    # Prompts and local replies describe the aircraft as of its latest sample
+    return with_live_tracking(response['Item'])
 
-Mission Details:
+def transcript_section(history: str) -> str:
+    return f"\n{history}\n" if history else ""
+
+def dispatch_request_body(mission: Dict, message: str, history: str = '') -> Dict:
+    """Bedrock request for a dispatch coordinator reply; instructions are in the system prompt"""
+    context = f"""Mission Details:
 - Mission ID: {mission['mission_id']}
 - Callsign: {mission['callsign']}
 - Type: {mission['mission_type']}
@@ -648,94 +1089,25 @@ Patient Information:
 - Age: {mission.get('patient_age', 'Unknown')}
 - Gender: {mission.get('patient_gender', 'Unknown')}
 - Chief Complaint: {mission.get('patient_details', 'Not specified')}
+{transcript_section(history)}
+Crew Message: {message}"""
+    return {
+        'anthropic_version': 'bedrock-2023-05-31',
+        'max_tokens': 500,
+        'system': dispatch_system(PROMPT_CACHING),
+        'messages': [{
+            'role': 'user',
+            'content': context
+        }]
+    }
 
-Crew Message: {request.message}
-
-Respond professionally and concisely as a dispatch coordinator would over radio.
-Keep responses brief and actionable. Use standard aviation/medical terminology.
-"""
-        
-        # Call Bedrock Claude
-        bedrock_response = bedrock.invoke_model(
-            modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-            contentType='application/json',
-            accept='application/json',
-            body=json.dumps({
-                'anthropic_version': 'bedrock-2023-05-31',
-                'max_tokens': 500,
-                'messages': [{
-                    'role': 'user',
-                    'content': context
-                }]
-            })
-        )
-        
-        response_body = json.loads(bedrock_response['body'].read())
-        ai_response = response_body['content'][0]['text']
-        
-        return {
-            "success": True,
-            "response_text": ai_response,
-            "mission_id": request.mission_id
-        }
-        
-    except ClientError as e:
-        print(f"Bedrock error: {e}")
-        raise HTTPException(status_code=500, detail="AI service unavailable")
-
-@app.post("/api/atc/contact")
-async def atc_contact(request: ATCRequest, token_data: Dict = Depends(verify_token)):
-    """AI-powered ATC communications using AWS Bedrock"""
-    try:
-        # Get mission context
-        missions_table = get_table('Missions')
-        response = missions_table.get_item(Key={'mission_id': request.mission_id})
-        
-        if 'Item' not in response:
-            raise HTTPException(status_code=404, detail="Mission not found")
-        
-        mission = response['Item']
-        
-        # Determine controller personality and context based on type
-        controller_contexts = {
-            'ground': {
-                'role': 'Ground Control',
-                'focus': 'taxi instructions, parking, and ground movement',
-                'style': 'Clear and directive for ground operations'
-            },
-            'tower': {
-                'role': 'Tower Control',
-                'focus': 'takeoff and landing clearances, runway operations',
-                'style': 'Authoritative and safety-focused'
-            },
-            'departure': {
-                'role': 'Departure Control',
-                'focus': 'initial climb instructions, traffic advisories, handoffs',
-                'style': 'Efficient and traffic-aware'
-            },
-            'approach': {
-                'role': 'Approach Control',
-                'focus': 'descent instructions, approach clearances, sequencing',
-                'style': 'Calm and methodical'
-            },
-            'center': {
-                'role': 'Center Control',
-                'focus': 'enroute flight following, altitude changes, weather advisories',
-                'style': 'Professional and informative'
-            }
-        }
-        
-        controller_info = controller_contexts.get(request.controller_type, controller_contexts['tower'])
-        airport_info = f" at {request.airport_code}" if request.airport_code else ""
-        frequency_info = f" on {request.frequency}" if request.frequency else ""
-        
-        # Build context for AI
-        context = f"""
-You are an AI-powered {controller_info['role']} controller{airport_info}{frequency_info}.
-You are communicating with a HEMS helicopter during an emergency medical mission.
-
-Your role focuses on: {controller_info['focus']}
-Communication style: {controller_info['style']}
+def atc_request_body(mission: Dict, request: ATCRequest, history: str = '') -> Dict:
+    """Bedrock request for an ATC controller reply; phraseology and role are in the system prompt"""
+    controller_info = ATC_CONTROLLER_CONTEXTS.get(request.controller_type, ATC_CONTROLLER_CONTEXTS['tower'])
+    airport_info = f" at {request.airport_code}" if request.airport_code else ""
+    frequency_info = f" on {request.frequency}" if request.frequency else ""
+    
+    context = f"""Position: {controller_info['role']}{airport_info}{frequency_info}
 
 Aircraft Information:
 - Callsign: {mission['callsign']}
@@ -752,40 +1124,187 @@ Mission Context:
 - Patient: {mission.get('patient_details', 'Medical emergency')}
 - Origin: {mission['origin'].get('name', 'Unknown')}
 - Destination: {mission['destination'].get('name', 'Unknown')}
+{transcript_section(history)}
+Pilot Transmission: {request.message}"""
+    return {
+        'anthropic_version': 'bedrock-2023-05-31',
+        'max_tokens': 300,
+        'system': atc_system(request.controller_type, PROMPT_CACHING),
+        'messages': [{
+            'role': 'user',
+            'content': context
+        }]
+    }
+
+def atc_station(request: ATCRequest) -> str:
+    return facility_name(request.controller_type, request.airport_code)
+
+def record_radio_exchange(mission: Dict, user_id: Optional[str], channel: str, station: str, message: str, reply: str):
+    radio_transcripts.record(mission['mission_id'], user_id, channel, [
+        (mission.get('callsign') or 'Crew', message),
+        (station, reply)
+    ])
 
-Pilot Transmission: {request.message}
-
-Respond as an ATC controller would over radio:
-- Use proper phraseology (readback, roger, wilco, etc.)
-- Include relevant traffic information if applicable
-- Provide clear, concise instructions
-- Acknowledge emergency priority if appropriate
-- Use standard ATC format: [Callsign], [Controller], [Instruction/Information]
-- Keep response under 50 words
-- Be professional and safety-focused
-"""
+async def cached_ai_reply(body: Dict, cache_key: str, callsign: Optional[str], user_id: str) -> Tuple[str, bool]:
+    """Reply text from the response cache, or from Bedrock (then cached)"""
+    cached = ai_response_cache.get(cache_key, callsign)
+    if cached is not None:
+        return cached, True
+    started = time.perf_counter()
+    response_body = await ai_scheduler.call(user_id, lambda: invoke_claude(body))
+    ai_response = response_body['content'][0]['text']
+    ai_response_cache.put(cache_key, ai_response, callsign, (time.perf_counter() - started) * 1000)
+    return ai_response, False
+
+async def relay_completion(body: Dict, lease, cache_key: str, callsign: Optional[str]) -> AsyncIterator[str]:
+    """Text deltas from Bedrock under a held scheduler lease
+    
+    Throttling before the first token is retried transparently. The lease is
+    released when the stream ends, and a complete reply is cached.
+    """
+    started = time.monotonic()
+    try:
+        for attempt in range(ai_scheduler.throttle_retries + 1):
+            completion = claude_streamer.stream(body)
+            try:
+                async for text in completion:
+                    yield text
+                break
+            except ClientError as e:
+                if is_throttle(e) and not completion.text_parts and attempt < ai_scheduler.throttle_retries:
+                    ai_scheduler.retries += 1
+                    await asyncio.sleep(ai_scheduler.backoff(attempt))
+                    continue
+                if is_throttle(e):
+                    ai_scheduler.throttled += 1
+                raise
+    finally:
+        ai_scheduler.record_service(started)
+        lease.release()
+    ai_response_cache.put(cache_key, completion.text, callsign, (time.monotonic() - started) * 1000)
+
+async def reply_text_stream(
+    body: Dict,
+    cache_key: str,
+    callsign: Optional[str],
+    user_id: str,
+    local_text: Optional[str] = None
+) -> Tuple[AsyncIterator[str], bool, Optional[BackgroundTask]]:
+    """(text deltas, cached, cleanup) for a reply; the scheduler slot is taken before any response starts
+    
+    ``local_text`` is a reply already produced without the model.
+    """
+    text = local_text if local_text is not None else ai_response_cache.get(cache_key, callsign)
+    if text is not None:
+        async def single_text():
+            yield text
+        return single_text(), local_text is None, None
+    
+    lease = await ai_scheduler.acquire(user_id)
+    # The cleanup task covers a client that disconnects before the stream starts
+    return relay_completion(body, lease, cache_key, callsign), False, BackgroundTask(lease.release)
+
+async def stream_ai_response(
+    body: Dict,
+    result: Dict,
+    cache_key: str,
+    callsign: Optional[str],
+    user_id: str,
+    on_reply: Callable[[str], None],
+    local_text: Optional[str] = None
+) -> StreamingResponse:
+    """Relay a streamed completion as server-sent events
+    
+    Emits ``delta`` events with text as it arrives, then a ``done`` event
+    carrying the same fields as the non-streaming endpoint (or ``error``).
+    A cached or local reply is sent as a single delta. A full scheduler
+    queue is a clean 429 because the slot is taken before the response
+    starts. ``on_reply`` receives the complete reply text.
+    """
+    text_stream, cached, cleanup = await reply_text_stream(body, cache_key, callsign, user_id, local_text)
+    
+    async def events():
+        parts = []
+        try:
+            async for text in text_stream:
+                parts.append(text)
+                yield sse_event({"type": "delta", "text": text})
+        except ClientError as e:
+            print(f"Bedrock error: {e}")
+            yield sse_event({"type": "error", "detail": "AI service unavailable"})
+            return
+        reply = ''.join(parts)
+        on_reply(reply)
+        yield sse_event({"type": "done", "success": True, "response_text": reply, "cached": cached, **result})
+    
+    return StreamingResponse(events(), media_type='text/event-stream', headers=SSE_HEADERS, background=cleanup)
+
+@app.post("/api/dispatch/ai")
+async def ai_dispatch(request: AIDispatchRequest, token_data: Dict = Depends(verify_token)):
+    """AI-powered dispatch assistant using AWS Bedrock"""
+    try:
+        mission = await get_ai_mission(request.mission_id)
+        history = await radio_transcripts.context(request.mission_id)
         
-        # Call Bedrock Claude
-        bedrock_response = bedrock.invoke_model(
-            modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-            contentType='application/json',
-            accept='application/json',
-            body=json.dumps({
-                'anthropic_version': 'bedrock-2023-05-31',
-                'max_tokens': 300,
-                'messages': [{
-                    'role': 'user',
-                    'content': context
-                }]
-            })
+        # Call Bedrock Claude unless a routine reply is cached
+        ai_response, cached = await cached_ai_reply(
+            dispatch_request_body(mission, request.message, history),
+            dispatch_cache_key(mission, request.message, history),
+            mission.get('callsign'),
+            token_data.get('sub')
         )
+        record_radio_exchange(mission, token_data.get('sub'), 'dispatch', 'Dispatch', request.message, ai_response)
         
-        response_body = json.loads(bedrock_response['body'].read())
-        ai_response = response_body['content'][0]['text']
+        return {
+            "success": True,
+            "response_text": ai_response,
+            "cached": cached,
+            "mission_id": request.mission_id
+        }
+        
+    except ClientError as e:
+        print(f"Bedrock error: {e}")
+        raise HTTPException(status_code=500, detail="AI service unavailable")
+
+@app.post("/api/dispatch/ai/stream")
+async def ai_dispatch_stream(request: AIDispatchRequest, token_data: Dict = Depends(verify_token)):
+    """Dispatch assistant reply streamed as server-sent events"""
+    mission = await get_ai_mission(request.mission_id)
+    history = await radio_transcripts.context(request.mission_id)
+    return await stream_ai_response(
+        dispatch_request_body(mission, request.message, history),
+        {"mission_id": request.mission_id},
+        dispatch_cache_key(mission, request.message, history),
+        mission.get('callsign'),
+        token_data.get('sub'),
+        lambda reply: record_radio_exchange(mission, token_data.get('sub'), 'dispatch', 'Dispatch', request.message, reply)
+    )
+
+@app.post("/api/atc/contact")
+async def atc_contact(request: ATCRequest, token_data: Dict = Depends(verify_token)):
+    """AI-powered ATC communications using AWS Bedrock"""
+    try:
+        mission = await get_ai_mission(request.mission_id)
+        
+        # Routine calls are answered from phraseology templates; the rest go to Bedrock Claude unless cached
+        local = atc_phraseology.reply(mission, request.controller_type, request.airport_code, request.message)
+        if local is not None:
+            ai_response, cached = local.text, False
+        else:
+            history = await radio_transcripts.context(request.mission_id)
+            ai_response, cached = await cached_ai_reply(
+                atc_request_body(mission, request, history),
+                atc_cache_key(mission, request.controller_type, request.airport_code, request.frequency, request.message, history),
+                mission.get('callsign'),
+                token_data.get('sub')
+            )
+        record_radio_exchange(mission, token_data.get('sub'), 'atc', atc_station(request), request.message, ai_response)
         
         return {
             "success": True,
             "response_text": ai_response,
+            "cached": cached,
+            "local": local is not None,
             "controller_type": request.controller_type,
             "airport_code": request.airport_code,
             "frequency": request.frequency,
@@ -796,38 +1315,150 @@ Respond as an ATC controller would over radio:
         print(f"Bedrock error: {e}")
         raise HTTPException(status_code=500, detail="AI service unavailable")
 
+@app.post("/api/atc/contact/stream")
+async def atc_contact_stream(request: ATCRequest, token_data: Dict = Depends(verify_token)):
+    """ATC controller reply streamed as server-sent events"""
+    mission = await get_ai_mission(request.mission_id)
+    local = atc_phraseology.reply(mission, request.controller_type, request.airport_code, request.message)
+    history = '' if local is not None else await radio_transcripts.context(request.mission_id)
+    return await stream_ai_response(
+        atc_request_body(mission, request, history),
+        {
+            "local": local is not None,
+            "controller_type": request.controller_type,
+            "airport_code": request.airport_code,
+            "frequency": request.frequency,
+            "mission_id": request.mission_id
+        },
+        atc_cache_key(mission, request.controller_type, request.airport_code, request.frequency, request.message, history),
+        mission.get('callsign'),
+        token_data.get('sub'),
+        lambda reply: record_radio_exchange(mission, token_data.get('sub'), 'atc', atc_station(request), request.message, reply),
+        local.text if local is not None else None
+    )
+
+def tts_request(request: Optional[TTSRequest], text: Optional[str]) -> TTSRequest:
+    """JSON body, or the older ``?text=`` query parameter"""
+    if request is not None:
+        return request
+    if text:
+        return TTSRequest(text=text)
+    raise HTTPException(status_code=422, detail="text is required")
+
+@app.post("/api/atc/contact/speech")
+async def atc_contact_speech(
+    request: ATCSpeechRequest,
+    format: str = Query('audio', pattern='^(audio|sse)$'),
+    token_data: Dict = Depends(verify_token)
+):
+    """Spoken ATC reply, synthesised sentence by sentence while the text is still generating
+    
+    ``format=audio`` streams concatenated MP3 segments that can be played as
+    they arrive. ``format=sse`` sends one ``sentence`` event per sentence
+    (text plus base64 MP3), then ``done`` with the full reply text.
+    """
+    mission = await get_ai_mission(request.mission_id)
+    local = atc_phraseology.reply(mission, request.controller_type, request.airport_code, request.message)
+    history = '' if local is not None else await radio_transcripts.context(request.mission_id)
+    text_stream, cached, cleanup = await reply_text_stream(
+        atc_request_body(mission, request, history),
+        atc_cache_key(mission, request.controller_type, request.airport_code, request.frequency, request.message, history),
+        mission.get('callsign'),
+        token_data.get('sub'),
+        local.text if local is not None else None
+    )
+    
+    async def synthesize(sentence: str) -> bytes:
+        audio, _, _ = await tts_cache.audio(sentence, request.voice_id, request.engine)
+        return audio
+    
+    segments = pipeline_speech(text_stream, synthesize)
+    
+    def record(sentences: List[str]):
+        record_radio_exchange(mission, token_data.get('sub'), 'atc', atc_station(request), request.message, ' '.join(sentences))
+    
+    if format == 'audio':
+        async def audio_body():
+            sentences = []
+            try:
+                async for _, sentence, audio in segments:
+                    sentences.append(sentence)
+                    yield audio
+            except ClientError as e:
+                print(f"ATC speech error: {e}")
+                return
+            record(sentences)
+        
+        headers = {
+            'X-Response-Cached': 'true' if cached else 'false',
+            'X-Response-Local': 'true' if local is not None else 'false',
+            'Cache-Control': 'no-store'
+        }
+        return StreamingResponse(audio_body(), media_type='audio/mpeg', headers=headers, background=cleanup)
+    
+    async def events():
+        sentences = []
+        try:
+            async for index, sentence, audio in segments:
+                sentences.append(sentence)
+                yield sse_event({
+                    "type": "sentence",
+                    "index": index,
+                    "text": sentence,
+                    "audio": base64.b64encode(audio).decode()
+                })
+        except ClientError as e:
+            print(f"ATC speech error: {e}")
+            yield sse_event({"type": "error", "detail": "AI service unavailable"})
+            return
+        record(sentences)
+        yield sse_event({
+            "type": "done",
+            "success": True,
+            "response_text": ' '.join(sentences),
+            "cached": cached,
+            "local": local is not None,
+            "controller_type": request.controller_type,
+            "airport_code": request.airport_code,
+            "frequency": request.frequency,
+            "mission_id": request.mission_id
+        })
+    
+    return StreamingResponse(events(), media_type='text/event-stream', headers=SSE_HEADERS, background=cleanup)
+
 @app.post("/api/dispatch/tts")
-async def generate_tts(text: str, token_data: Dict = Depends(verify_token)):
-    """Generate TTS audio using AWS Polly"""
+async def generate_tts(
+    request: Optional[TTSRequest] = None,
+    text: Optional[str] = Query(None, max_length=3000),
+    token_data: Dict = Depends(verify_token)
+):
+    """Generate TTS audio using AWS Polly (cached by content)"""
+    request = tts_request(request, text)
     try:
-        response = polly.synthesize_speech(
-            Text=text,
-            OutputFormat='mp3',
-            VoiceId='Joanna',
-            Engine='neural'
-        )
-        
-        # Save to S3
-        audio_key = f"tts/{uuid.uuid4()}.mp3"
-        bucket = AWS_CONFIG.get('s3_bucket', '')
-        
-        if bucket:
-            s3.put_object(
-                Bucket=bucket,
-                Key=audio_key,
-                Body=response['AudioStream'].read(),
-                ContentType='audio/mpeg'
-            )
-            
-            audio_url = f"https://{bucket}.s3.amazonaws.com/{audio_key}"
-        else:
-            audio_url = None
-        
-        return {"audio_url": audio_url}
+        audio_url, cached = await tts_cache.ensure_url(request.text, request.voice_id, request.engine)
+        return {"audio_url": audio_url, "cached": cached}
         
     except ClientError as e:
         raise HTTPException(status_code=500, detail="TTS service unavailable")
 
+@app.post("/api/dispatch/tts/stream")
+async def stream_tts(
+    request: Optional[TTSRequest] = None,
+    text: Optional[str] = Query(None, max_length=3000),
+    token_data: Dict = Depends(verify_token)
+):
+    """TTS audio in the response body; on a cache miss Polly's stream is relayed as it arrives"""
+    request = tts_request(request, text)
+    try:
+        digest, cached, chunks = await tts_cache.stream(request.text, request.voice_id, request.engine)
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail="TTS service unavailable")
+    
+    headers = {'ETag': f'"{digest}"', 'X-TTS-Cache': 'hit' if cached else 'miss'}
+    if cached:
+        headers['Cache-Control'] = 'private, max-age=86400'
+    return StreamingResponse(chunks, media_type='audio/mpeg', headers=headers)
+
 # ============ HEALTH CHECK ============
 
 @app.get("/api/health")
@@ -840,6 +1471,32 @@ async def health_check():
         "aws_configured": bool(AWS_CONFIG.get('user_pool_id'))
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process cache and performance counters"""
+    return {
+        "auth": {
+            "jwks": jwks_cache.stats() if jwks_cache else None,
+            "claims_cache": claims_cache.stats()
+        },
+        "telemetry_buffer": telemetry_buffer.stats(),
+        "reference_data": reference_data.stats(),
+        "analytics": analytics.stats(),
+        "fleet_state": fleet_state.stats(),
+        "live_map": live_map.stats(),
+        "track_archive": track_archive.stats(),
+        "bedrock_stream": claude_streamer.stats(),
+        "prompt_usage": prompt_usage.stats(),
+        "atc_phraseology": atc_phraseology.stats(),
+        "ai_scheduler": ai_scheduler.stats(),
+        "ai_response_cache": ai_response_cache.stats(),
+        "tts_cache": tts_cache.stats(),
+        "radio_transcripts": radio_transcripts.stats(),
+        "facility_index": facility_index.stats(),
+        "bridge": bridge_sink.stats() if bridge_sink else None,
+        "aws": {executor.name: executor.stats() for executor in aws_executors()}
+    }
+
 @app.get("/api/config")
 async def get_client_config():
     """Get frontend configuration (safe to expose)"""
@@ -0,0 +1,240 @@
+"""Nearest-facility queries over hospitals and HEMS bases.
+
+Facilities are projected onto unit vectors on the sphere and stored in a
+static k-d tree. Straight-line (chord) distance between unit vectors is
+monotonic in great-circle distance, so the tree can prune with ordinary
+bounding boxes and the final distances are converted back to nautical miles.
+"""
+import math
+import heapq
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_NM = 3440.065
+LEAF_SIZE = 16
+
+
+def to_unit_vectors(lat_deg: np.ndarray, lon_deg: np.ndarray) -> np.ndarray:
+    lat = np.radians(lat_deg)
+    lon = np.radians(lon_deg)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_nm(chord):
+    return 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * EARTH_RADIUS_NM
+
+
+def nm_to_chord(distance_nm: float) -> float:
+    angle = min(distance_nm / EARTH_RADIUS_NM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+def initial_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    y = math.sin(dlon) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlon)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+
+class SpatialIndex:
+    """Static k-d tree over facility positions supporting filtered k-nearest queries"""
+
+    def __init__(self, items: List[Dict], leaf_size: int = LEAF_SIZE):
+        located = []
+        for item in items:
+            try:
+                located.append((item, float(item['latitude']), float(item['longitude'])))
+            except (KeyError, TypeError, ValueError):
+                continue  # facilities without coordinates cannot be indexed
+
+        self.items = [item for item, _, _ in located]
+        self.lat = np.array([lat for _, lat, _ in located], dtype=np.float64)
+        self.lon = np.array([lon for _, _, lon in located], dtype=np.float64)
+        self.leaf_size = leaf_size
+
+        points = to_unit_vectors(self.lat, self.lon) if located else np.zeros((0, 3))
+        # Points are permuted so every node covers a contiguous slice
+        self._order = np.arange(len(self.items))
+        self._points = points
+        self._nodes: List[Tuple] = []  # (start, end, box_min, box_max, left, right)
+        if len(self.items):
+            self._build(0, len(self.items))
+        self._points = points[self._order]
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, start: int, end: int) -> int:
+        idx = self._order[start:end]
+        pts = self._points[idx]
+        box_min, box_max = pts.min(axis=0), pts.max(axis=0)
+        node_id = len(self._nodes)
+        self._nodes.append(None)
+
+        if end - start <= self.leaf_size:
+            self._nodes[node_id] = (start, end, box_min, box_max, -1, -1)
+            return node_id
+
+        dim = int(np.argmax(box_max - box_min))
+        self._order[start:end] = idx[np.argsort(pts[:, dim], kind='stable')]
+        mid = (start + end) // 2
+        left = self._build(start, mid)
+        right = self._build(mid, end)
+        self._nodes[node_id] = (start, end, box_min, box_max, left, right)
+        return node_id
+
+    @staticmethod
+    def _box_distance(query: np.ndarray, box_min: np.ndarray, box_max: np.ndarray) -> float:
+        delta = np.maximum(box_min - query, 0) + np.maximum(query - box_max, 0)
+        return float(np.sqrt(np.dot(delta, delta)))
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 5,
+        radius_nm: Optional[float] = None,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[float, int]]:
+        """Return up to k (distance_nm, item index) pairs ordered by distance.
+
+        ``mask`` is a boolean array aligned with ``self.items``; only
+        facilities where it is True are considered.
+        """
+        if not self._nodes or k <= 0:
+            return []
+
+        query = to_unit_vectors(np.array([latitude]), np.array([longitude]))[0]
+        limit = nm_to_chord(radius_nm) if radius_nm is not None else math.inf
+        sorted_mask = mask[self._order] if mask is not None else None
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-chord, item index)
+        frontier = [(0.0, 0)]
+        while frontier:
+            box_dist, node_id = heapq.heappop(frontier)
+            bound = -best[0][0] if len(best) == k else limit
+            if box_dist > bound:
+                break
+
+            start, end, _, _, left, right = self._nodes[node_id]
+            if left < 0:
+                diff = self._points[start:end] - query
+                chords = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+                candidates = chords <= bound
+                if sorted_mask is not None:
+                    candidates &= sorted_mask[start:end]
+                for offset in np.flatnonzero(candidates):
+                    entry = (-float(chords[offset]), int(self._order[start + offset]))
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+                continue
+
+            for child in (left, right):
+                _, _, child_min, child_max, _, _ = self._nodes[child]
+                child_dist = self._box_distance(query, child_min, child_max)
+                if child_dist <= bound:
+                    heapq.heappush(frontier, (child_dist, child))
+
+        results = sorted((-neg_chord, index) for neg_chord, index in best)
+        return [(float(chord_to_nm(chord)), index) for chord, index in results]
+
+    def describe(self, latitude: float, longitude: float, hits: List[Tuple[float, int]]) -> List[Dict]:
+        return [
+            {
+                **self.items[index],
+                'distance_nm': round(distance, 2),
+                'bearing_deg': round(initial_bearing(latitude, longitude, self.lat[index], self.lon[index]), 1),
+            }
+            for distance, index in hits
+        ]
+
+
+class FacilityIndex:
+    """Spatial indexes for hospitals and bases, rebuilt whenever reference data reloads"""
+
+    def __init__(self):
+        self.hospitals = SpatialIndex([])
+        self.bases = SpatialIndex([])
+        self._helicopter_status: Dict[str, str] = {}
+        self._trauma_levels = np.zeros(0)
+        self._trauma_centers = np.zeros(0, dtype=bool)
+        self._fmc_bases = np.zeros(0, dtype=bool)
+
+    def set_hospitals(self, items: List[Dict]):
+        index = SpatialIndex(items)
+        levels = []
+        for item in index.items:
+            try:
+                levels.append(float(item.get('traumaLevel')))
+            except (TypeError, ValueError):
+                levels.append(math.inf)
+        self._trauma_levels = np.array(levels, dtype=np.float64)
+        self._trauma_centers = np.array([bool(item.get('isTraumaCenter')) for item in index.items], dtype=bool)
+        self.hospitals = index
+
+    def set_bases(self, items: List[Dict]):
+        self.bases = SpatialIndex(items)
+        self._refresh_fmc_mask()
+
+    def set_helicopters(self, items: List[Dict]):
+        self._helicopter_status = {item.get('id'): item.get('maintenanceStatus') for item in items}
+        self._refresh_fmc_mask()
+
+    def _refresh_fmc_mask(self):
+        self._fmc_bases = np.array(
+            [self._helicopter_status.get(item.get('helicopterId')) == 'FMC' for item in self.bases.items],
+            dtype=bool
+        )
+
+    def nearest_hospitals(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        radius_nm: Optional[float] = None,
+        trauma_center: Optional[bool] = None,
+        max_trauma_level: Optional[int] = None,
+    ) -> List[Dict]:
+        index = self.hospitals
+        mask = None
+        if trauma_center is not None:
+            mask = self._trauma_centers == trauma_center
+        if max_trauma_level is not None:
+            level_mask = self._trauma_levels <= max_trauma_level
+            mask = level_mask if mask is None else mask & level_mask
+        return index.describe(latitude, longitude, index.nearest(latitude, longitude, k, radius_nm, mask))
+
+    def nearest_bases(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        radius_nm: Optional[float] = None,
+        fmc_only: bool = False,
+    ) -> List[Dict]:
+        index = self.bases
+        mask = self._fmc_bases if fmc_only else None
+        return index.describe(latitude, longitude, index.nearest(latitude, longitude, k, radius_nm, mask))
+
+    def stats(self) -> Dict:
+        return {
+            "hospitals": len(self.hospitals),
+            "bases": len(self.bases),
+            "fmc_bases": int(self._fmc_bases.sum()),
+        }
+
+
+def subscribe_facility_index(reference_data, index: FacilityIndex):
+    """Keep ``index`` in sync with the reference-data cache"""
+    subscriptions: List[Tuple[str, Callable[[List[Dict]], None]]] = [
+        ('hospitals', index.set_hospitals),
+        ('helicopters', index.set_helicopters),
+        ('hems_bases', index.set_bases),
+    ]
+    for name, listener in subscriptions:
+        reference_data.subscribe(name, listener)
@@ -0,0 +1,78 @@
+"""Sentence-pipelined speech for streamed AI replies.
+
+Text deltas from Bedrock are cut into sentences as soon as each one ends.
+Synthesis of a sentence starts immediately, while later sentences are still
+being generated. Audio is released in sentence order, so a client can start
+playback once the first sentence is spoken rather than after the whole reply.
+"""
+import re
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+# Terminal punctuation followed by whitespace (so a frequency like 118.3 is not split) or a line break
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+MIN_SENTENCE_CHARS = 2
+
+
+class SentenceSplitter:
+    """Incremental sentence segmentation over streamed text"""
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[str]:
+        """Add text; returns the sentences it completed"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.start()].strip()
+            if len(sentence) >= MIN_SENTENCE_CHARS:
+                sentences.append(sentence)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        sentence = self._buffer.strip()
+        self._buffer = ''
+        return [sentence] if sentence else []
+
+
+async def pipeline_speech(
+    text_stream: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[bytes]],
+) -> AsyncIterator[Tuple[int, str, bytes]]:
+    """Yield (index, sentence, audio) in order, synthesising sentences while text is still arriving"""
+    pending: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        splitter = SentenceSplitter()
+        try:
+            async for text in text_stream:
+                for sentence in splitter.feed(text):
+                    pending.put_nowait((sentence, asyncio.ensure_future(synthesize(sentence))))
+            for sentence in splitter.flush():
+                pending.put_nowait((sentence, asyncio.ensure_future(synthesize(sentence))))
+            pending.put_nowait((done, None))
+        except Exception as e:
+            pending.put_nowait((done, e))
+
+    producer = asyncio.ensure_future(produce())
+    index = 0
+    try:
+        while True:
+            sentence, task = await pending.get()
+            if sentence is done:
+                if task is not None:
+                    raise task
+                break
+            yield index, sentence, await task
+            index += 1
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            _, task = pending.get_nowait()
+            if isinstance(task, asyncio.Future):
+                task.cancel()
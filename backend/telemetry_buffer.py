@@ -0,0 +1,242 @@
+"""Write-behind buffer for simulator telemetry.
+
+Samples are acknowledged as soon as they are buffered. A background task
+periodically writes the newest tracking state of each mission with one
+``update_item`` and appends history rows to the telemetry table with
+``BatchWriteItem`` in groups of 25.
+
+With ``TELEMETRY_STORAGE=chunked`` (the default) history samples are gathered
+per mission into compressed chunks (see ``telemetry_chunks``), and one item
+is written per chunk instead of one per sample. ``items`` keeps the old
+one-item-per-sample layout.
+"""
+import os
+import time
+import random
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from aws_async import AsyncDynamoDB, AsyncTable
+from telemetry_chunks import TELEMETRY_CHUNK_SECONDS, ChunkAccumulator
+
+TELEMETRY_FLUSH_INTERVAL_SECONDS = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL_SECONDS', 2.0))
+TELEMETRY_MAX_PENDING_SAMPLES = int(os.environ.get('TELEMETRY_MAX_PENDING_SAMPLES', 50000))
+TELEMETRY_STORAGE = os.environ.get('TELEMETRY_STORAGE', 'chunked')
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_MAX_RETRIES = 6
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+
+
+class TelemetryBuffer:
+    """Coalesces tracking updates per mission and batches telemetry history writes"""
+
+    def __init__(
+        self,
+        db: AsyncDynamoDB,
+        missions_table: AsyncTable,
+        telemetry_table_name: str,
+        flush_interval_seconds: float = TELEMETRY_FLUSH_INTERVAL_SECONDS,
+        max_pending_samples: int = TELEMETRY_MAX_PENDING_SAMPLES,
+        storage: str = TELEMETRY_STORAGE,
+        chunk_seconds: float = TELEMETRY_CHUNK_SECONDS,
+    ):
+        self.db = db
+        self.missions_table = missions_table
+        self.telemetry_table_name = telemetry_table_name
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending_samples = max_pending_samples
+        if storage not in ('chunked', 'items'):
+            raise ValueError(f"Unknown telemetry storage mode {storage}")
+        self.storage = storage
+        self.chunk_seconds = chunk_seconds
+
+        # mission_id -> (tracking, updated_at ISO timestamp)
+        self._tracking: Dict[str, Tuple[Dict, str]] = {}
+        # Items ready to write: samples, or sealed chunks in chunked mode
+        self._history: List[Dict] = []
+        self._chunks = ChunkAccumulator(chunk_seconds) if storage == 'chunked' else None
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.samples = 0
+        self.tracking_writes = 0
+        self.history_writes = 0
+        self.batch_requests = 0
+        self.unprocessed_retries = 0
+        self.dropped_samples = 0
+        self.chunks_sealed = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    def add(self, mission_id: str, tracking: Dict, updated_at: str, history_item: Dict):
+        """Buffer one sample; the newest tracking per mission wins"""
+        self._tracking[mission_id] = (tracking, updated_at)
+        self._append_history(history_item)
+        self.samples += 1
+        if len(self._history) >= self.max_pending_samples:
+            self._wakeup.set()
+
+    def add_many(self, mission_id: str, tracking: Dict, updated_at: str, history_items: List[Dict]):
+        """Buffer several samples for one mission with a single tracking update"""
+        self._tracking[mission_id] = (tracking, updated_at)
+        for item in history_items:
+            self._append_history(item)
+        self.samples += len(history_items)
+        if len(self._history) >= self.max_pending_samples:
+            self._wakeup.set()
+
+    def _append_history(self, item: Dict):
+        if self._chunks is None:
+            self._history.append(item)
+            return
+        sealed = self._chunks.add(item['device_id'], item['mission_id'], item, time.monotonic())
+        if sealed is not None:
+            self._history.append(sealed)
+            self.chunks_sealed += 1
+
+    def seal_chunk(self, device_id: str):
+        """Queue a mission's open chunk for the next flush instead of waiting for it to go idle"""
+        if self._chunks is None:
+            return
+        sealed = self._chunks.seal(device_id)
+        if sealed is not None:
+            self._history.append(sealed)
+            self.chunks_sealed += 1
+
+    def latest_tracking(self, mission_id: str) -> Optional[Dict]:
+        """Tracking state that has been accepted but not yet flushed"""
+        pending = self._tracking.get(mission_id)
+        return pending[0] if pending else None
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write everything still buffered"""
+        # Let an in-progress flush finish rather than cancelling it mid-write
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Telemetry flush error: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if self._chunks is not None:
+                # Chunks left open for a whole chunk span belong to missions that went quiet
+                sealed = self._chunks.seal_idle(time.monotonic(), self.chunk_seconds, force=self._stopping)
+                self._history.extend(sealed)
+                self.chunks_sealed += len(sealed)
+            tracking, self._tracking = self._tracking, {}
+            history, self._history = self._history, []
+            if not tracking and not history:
+                return
+
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._write_tracking(mission_id, state, updated_at) for mission_id, (state, updated_at) in tracking.items()),
+                return_exceptions=True
+            )
+            for (mission_id, pending), result in zip(tracking.items(), results):
+                if isinstance(result, Exception):
+                    self.flush_errors += 1
+                    print(f"Tracking flush failed for {mission_id}: {result}")
+                    # Retry next cycle unless a newer sample has arrived meanwhile
+                    self._tracking.setdefault(mission_id, pending)
+
+            failed = await self._write_history(history)
+            if failed:
+                self._requeue_history(failed)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def _write_tracking(self, mission_id: str, tracking: Dict, updated_at: str):
+        await self.missions_table.update_item(
+            Key={'mission_id': mission_id},
+            UpdateExpression='SET tracking = :tracking, updated_at = :updated',
+            ExpressionAttributeValues={
+                ':tracking': tracking,
+                ':updated': updated_at
+            }
+        )
+        self.tracking_writes += 1
+
+    async def _write_history(self, items: List[Dict]) -> List[Dict]:
+        """Write items in BatchWriteItem groups; returns items that could not be written"""
+        # A single BatchWriteItem request may not contain the same key twice
+        unique = {(item['device_id'], item['timestamp']): item for item in items}
+        items = list(unique.values())
+        chunks = [items[i:i + BATCH_WRITE_LIMIT] for i in range(0, len(items), BATCH_WRITE_LIMIT)]
+        results = await asyncio.gather(*(self._write_chunk(chunk) for chunk in chunks), return_exceptions=True)
+
+        failed: List[Dict] = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                self.flush_errors += 1
+                print(f"Telemetry batch write failed: {result}")
+                failed.extend(chunk)
+            else:
+                failed.extend(result)
+        return failed
+
+    async def _write_chunk(self, chunk: List[Dict]) -> List[Dict]:
+        request_items = {self.telemetry_table_name: [{'PutRequest': {'Item': item}} for item in chunk]}
+        for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+            self.batch_requests += 1
+            response = await self.db.batch_write_item(RequestItems=request_items)
+            unprocessed = response.get('UnprocessedItems') or {}
+            pending = unprocessed.get(self.telemetry_table_name, [])
+            self.history_writes += sum(len(requests) for requests in request_items.values()) - len(pending)
+            if not pending:
+                return []
+            request_items = {self.telemetry_table_name: pending}
+            if attempt < BATCH_WRITE_MAX_RETRIES:
+                self.unprocessed_retries += 1
+                delay = BATCH_WRITE_BASE_DELAY_SECONDS * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+        return [request['PutRequest']['Item'] for request in request_items[self.telemetry_table_name]]
+
+    def _requeue_history(self, items: List[Dict]):
+        self._history[:0] = items
+        overflow = len(self._history) - self.max_pending_samples
+        if overflow > 0:
+            dropped = sum(int(item.get('count', 1)) if self._chunks is not None else 1 for item in self._history[:overflow])
+            del self._history[:overflow]
+            self.dropped_samples += dropped
+            print(f"Telemetry buffer full, dropped {dropped} oldest samples")
+
+    def stats(self) -> Dict:
+        return {
+            "pending_missions": len(self._tracking),
+            "storage": self.storage,
+            "pending_samples": len(self._history) if self._chunks is None else len(self._chunks),
+            "pending_chunks": len(self._history) if self._chunks is not None else 0,
+            "chunks_sealed": self.chunks_sealed,
+            "samples": self.samples,
+            "tracking_writes": self.tracking_writes,
+            "history_writes": self.history_writes,
+            "batch_requests": self.batch_requests,
+            "unprocessed_retries": self.unprocessed_retries,
+            "dropped_samples": self.dropped_samples,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
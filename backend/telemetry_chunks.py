@@ -0,0 +1,200 @@
+"""Compressed columnar telemetry chunks.
+
+Rather than one Telemetry item per sample, a mission's samples are gathered
+into time-bounded chunks. Each chunk is one item in the Telemetry table under
+a separate ``<device_id>#chunks`` partition. Its columns are packed as
+arrays and zlib-compressed into one binary attribute:
+
+* ``t``: int64 first timestamp plus int32 millisecond deltas
+* ``latitude`` / ``longitude``: int32 deltas in 1e-7 degrees
+* other ``TRACKING_FIELDS``: float32
+* ``phase``: uint8 indexes into the item's ``phases`` list
+
+The sort key is the chunk's first timestamp in milliseconds multiplied by
+1000, plus a per-process writer slot. Two API workers flushing the same
+mission therefore never overwrite each other's chunks.
+"""
+import os
+import zlib
+import random
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fleet_state import TRACKING_FIELDS
+
+TELEMETRY_CHUNK_SECONDS = float(os.environ.get('TELEMETRY_CHUNK_SECONDS', 60))
+TELEMETRY_CHUNK_MAX_SAMPLES = int(os.environ.get('TELEMETRY_CHUNK_MAX_SAMPLES', 2000))
+CHUNK_FORMAT = 'cols-v1'
+POSITION_SCALE = 1e7
+SLOTS_PER_MS = 1000
+WRITER_SLOT = random.randrange(SLOTS_PER_MS)
+# Samples can arrive late, so readers look back further than one chunk span
+CHUNK_LOOKBACK_MS = int(TELEMETRY_CHUNK_SECONDS * 2 * 1000)
+
+INT32_MAX = 2 ** 31 - 1
+
+FLOAT_FIELDS = tuple(field for field in TRACKING_FIELDS if field not in ('latitude', 'longitude'))
+
+
+def chunk_partition(device_id: str) -> str:
+    return f"{device_id}#chunks"
+
+
+def chunk_sort_key(start_ms: int, slot: int = WRITER_SLOT) -> int:
+    return start_ms * SLOTS_PER_MS + slot
+
+
+def _int32_deltas(name: str, values: np.ndarray, first: int) -> bytes:
+    """Deltas packed as int32; refuses any that would wrap"""
+    deltas = np.diff(values, prepend=first)
+    if len(deltas) and int(np.abs(deltas).max()) > INT32_MAX:
+        raise ValueError(f"{name} delta does not fit in int32; split the chunk")
+    return deltas.astype('<i4').tobytes()
+
+
+def encode_columns(t: np.ndarray, columns: Dict[str, np.ndarray], phase: List[str]) -> Tuple[bytes, List[str]]:
+    """Compress time-ordered columns; returns the blob and its phase dictionary"""
+    lat = np.round(columns['latitude'] * POSITION_SCALE).astype(np.int64)
+    lon = np.round(columns['longitude'] * POSITION_SCALE).astype(np.int64)
+    phases = sorted(set(phase))
+    phase_codes = {name: code for code, name in enumerate(phases)}
+    parts = [
+        _int32_deltas('t', np.asarray(t, dtype=np.int64), int(t[0])),
+        _int32_deltas('latitude', lat, 0),
+        _int32_deltas('longitude', lon, 0),
+        *(np.asarray(columns[field]).astype('<f4').tobytes() for field in FLOAT_FIELDS),
+        np.array([phase_codes[name] for name in phase], dtype='u1').tobytes(),
+    ]
+    return zlib.compress(b''.join(parts), 6), phases
+
+
+def decode_columns(blob: bytes, start_ms: int, count: int, phases: List[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
+    """Inverse of ``encode_columns``: (ms timestamps, TRACKING_FIELDS columns, phases)"""
+    raw = zlib.decompress(blob)
+    offset = 0
+
+    def column(dtype: str) -> np.ndarray:
+        nonlocal offset
+        values = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    t = start_ms + np.cumsum(column('<i4'), dtype=np.int64)
+    columns = {
+        'latitude': np.cumsum(column('<i4'), dtype=np.int64) / POSITION_SCALE,
+        'longitude': np.cumsum(column('<i4'), dtype=np.int64) / POSITION_SCALE,
+    }
+    for field in FLOAT_FIELDS:
+        # float32 storage; round away the representation noise
+        columns[field] = np.round(column('<f4').astype(np.float64), 3)
+    phase = [phases[code] for code in column('u1').tolist()]
+    return t, {field: columns[field] for field in TRACKING_FIELDS}, phase
+
+
+def encode_chunk(device_id: str, mission_id: str, samples: List[Dict], sort_key: Optional[int] = None) -> Dict:
+    """Pack history samples (tracking dicts with ``lastUpdate``) into one chunk item"""
+    # Time order, keeping the last copy of a duplicated timestamp
+    ordered = list({int(sample['lastUpdate']): sample for sample in samples}.items())
+    ordered.sort(key=lambda pair: pair[0])
+    t = np.array([ms for ms, _ in ordered], dtype=np.int64)
+    rows = [sample for _, sample in ordered]
+    columns = {
+        field: np.array([float(row.get(field) or 0) for row in rows], dtype=np.float64)
+        for field in TRACKING_FIELDS
+    }
+    data, phases = encode_columns(t, columns, [row.get('phase') or '' for row in rows])
+    return {
+        'device_id': chunk_partition(device_id),
+        'timestamp': sort_key if sort_key is not None else chunk_sort_key(int(t[0])),
+        'mission_id': mission_id,
+        'format': CHUNK_FORMAT,
+        'count': len(t),
+        'start_ms': int(t[0]),
+        'end_ms': int(t[-1]),
+        'phases': phases,
+        'data': data,
+    }
+
+
+def decode_chunk(item: Dict) -> Tuple[np.ndarray, Dict[str, np.ndarray], List[str]]:
+    """Unpack a chunk item into (ms timestamps, TRACKING_FIELDS columns, phases)"""
+    if item.get('format') != CHUNK_FORMAT:
+        raise ValueError(f"Unknown telemetry chunk format {item.get('format')}")
+    data = item['data']
+    blob = data.value if hasattr(data, 'value') else bytes(data)
+    return decode_columns(blob, int(item['start_ms']), int(item['count']), list(item.get('phases') or []))
+
+
+class ChunkAccumulator:
+    """Open (unsealed) chunks per device, sealed by span, size or idleness"""
+
+    def __init__(self, chunk_seconds: float = TELEMETRY_CHUNK_SECONDS, max_samples: int = TELEMETRY_CHUNK_MAX_SAMPLES):
+        self.chunk_ms = int(chunk_seconds * 1000)
+        self.max_samples = max_samples
+        # device_id -> (mission_id, samples, monotonic time of last sample)
+        self._open: Dict[str, tuple] = {}
+        # device_id -> (sort key of its last sealed chunk, monotonic time it was sealed)
+        self._last_key: Dict[str, Tuple[int, float]] = {}
+
+    def __len__(self):
+        return sum(len(samples) for _, samples, _ in self._open.values())
+
+    def _fits(self, samples: List[Dict], sample: Dict) -> bool:
+        """Whether ``sample`` can join the open chunk without an int32 delta overflowing
+
+        Late samples may land before the chunk's first one, so the span is
+        bounded on both sides; readers look back ``CHUNK_LOOKBACK_MS`` for them.
+        A jump across the antimeridian starts a new chunk too, since its
+        longitude delta is about 3.6e9 units of 1e-7 degrees.
+        """
+        if len(samples) >= self.max_samples:
+            return False
+        if abs(int(sample['lastUpdate']) - int(samples[0]['lastUpdate'])) >= self.chunk_ms:
+            return False
+        return abs(float(sample.get('longitude') or 0) - float(samples[-1].get('longitude') or 0)) < 180
+
+    def add(self, device_id: str, mission_id: str, sample: Dict, now: float) -> Optional[Dict]:
+        """Append a sample; returns a sealed chunk item when the open chunk fills up"""
+        entry = self._open.get(device_id)
+        sealed = None
+        if entry is not None and not self._fits(entry[1], sample):
+            sealed = self._seal(device_id, now)
+            entry = None
+        if entry is None:
+            entry = (mission_id, [], now)
+        entry[1].append(sample)
+        self._open[device_id] = (entry[0], entry[1], now)
+        return sealed
+
+    def seal_idle(self, now: float, idle_seconds: float, force: bool = False) -> List[Dict]:
+        """Seal chunks that have received nothing for ``idle_seconds`` (all of them when ``force``)"""
+        idle = [device for device, (_, _, last) in self._open.items() if force or now - last >= idle_seconds]
+        sealed = [self._seal(device_id, now) for device_id in idle]
+        # Forget devices that have stayed quiet for another idle period after their last seal
+        expired = [
+            device for device, (_, sealed_at) in self._last_key.items()
+            if device not in self._open and now - sealed_at > idle_seconds
+        ]
+        for device_id in expired:
+            del self._last_key[device_id]
+        return sealed
+
+    def seal(self, device_id: str) -> Optional[Dict]:
+        """Seal one device's open chunk now (mission completed)"""
+        sealed = self._seal(device_id, 0.0) if device_id in self._open else None
+        self._last_key.pop(device_id, None)
+        return sealed
+
+    def _seal(self, device_id: str, now: float) -> Dict:
+        mission_id, samples, _ = self._open.pop(device_id)
+        start_ms = int(min(int(sample['lastUpdate']) for sample in samples))
+        sort_key = chunk_sort_key(start_ms)
+        # Keep keys unique even if a late sample starts a chunk at the same
+        # millisecond; the next slot wraps within that millisecond so
+        # sort_key // SLOTS_PER_MS still gives the chunk's start
+        previous = self._last_key.get(device_id, (None, 0.0))[0]
+        if previous is not None and previous // SLOTS_PER_MS == start_ms:
+            sort_key = start_ms * SLOTS_PER_MS + (previous + 1) % SLOTS_PER_MS
+        self._last_key[device_id] = (sort_key, now)
+        return encode_chunk(device_id, mission_id, samples, sort_key)
@@ -0,0 +1,164 @@
+"""Compact binary telemetry frames for the simulator bridge.
+
+Plugins that opt in during the welcome handshake send binary WebSocket
+messages instead of camelCase JSON. A frame carries one or more samples for
+a single mission. All integers are little-endian.
+
+Header::
+
+    uint8   version          (1)
+    uint8   flags            (reserved, 0)
+    uint16  sample_count
+    uint8   mission_id_len
+    bytes   mission_id       (UTF-8)
+    int64   base_timestamp_ms
+    int32   base_latitude    (1e-6 degrees)
+    int32   base_longitude   (1e-6 degrees)
+
+Then ``sample_count`` fixed 20-byte samples. Time and position are deltas from the
+previous sample (the first from the header base)::
+
+    uint16  dt_ms
+    int16   dlat             (1e-6 degrees, about 11 cm)
+    int16   dlon             (1e-6 degrees)
+    int16   altitude_ft
+    uint16  ground_speed     (0.1 kt)
+    uint16  heading          (0.01 degrees)
+    int16   vertical_speed_ftmin
+    uint16  fuel_remaining_lbs
+    uint16  time_enroute     (0.1 min)
+    uint8   phase            (index into PHASES)
+    uint8   status           (bit 0: engine running)
+
+A JSON sample is around 330 bytes, while a binary sample is 20 bytes. Samples
+are unpacked with a precompiled ``struct`` layout, with no text parsing.
+"""
+import struct
+from typing import Dict, List, Tuple
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY_V1 = 'binary-v1'
+SUPPORTED_FORMATS = [FORMAT_BINARY_V1, FORMAT_JSON]
+
+FRAME_VERSION = 1
+MAX_SAMPLES_PER_FRAME = 1000
+POSITION_SCALE = 1e6
+
+# Same order as MISSION_PHASES in the web app
+PHASES = (
+    'Dispatch',
+    'Enroute Pickup',
+    'At Scene/Transfer',
+    'Enroute Dropoff',
+    'At Hospital',
+    'Returning to Base',
+    'Complete',
+    'pre-flight',
+    'en-route-outbound',
+    'on-scene',
+    'en-route-inbound',
+    'landed',
+    'standby',
+)
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+ENGINE_RUNNING = 0x01
+
+HEADER = struct.Struct('<BBHB')
+BASE = struct.Struct('<qii')
+SAMPLE = struct.Struct('<HhhhHHhHHBB')
+
+
+class FrameError(ValueError):
+    """Malformed or unsupported binary frame"""
+
+
+def decode_frame(data: bytes) -> Tuple[str, List[Dict]]:
+    """Decode a frame into its mission id and API-format telemetry payloads"""
+    if len(data) < HEADER.size:
+        raise FrameError("Frame too short")
+    version, _flags, count, id_len = HEADER.unpack_from(data, 0)
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version {version}")
+    if not 0 < count <= MAX_SAMPLES_PER_FRAME:
+        raise FrameError(f"Invalid sample count {count}")
+
+    offset = HEADER.size
+    mission_id = data[offset:offset + id_len].decode('utf-8', errors='strict') if id_len else ''
+    offset += id_len
+    if not mission_id or len(data) != offset + BASE.size + count * SAMPLE.size:
+        raise FrameError("Frame length does not match header")
+    base_ms, base_lat, base_lon = BASE.unpack_from(data, offset)
+
+    payloads = []
+    ms, lat, lon = base_ms, base_lat, base_lon
+    for dt, dlat, dlon, alt, speed, heading, vs, fuel, ete, phase, status in SAMPLE.iter_unpack(data[offset + BASE.size:]):
+        ms += dt
+        lat += dlat
+        lon += dlon
+        # Reject the whole frame if any sample leaves the globe, not just the last one
+        if abs(lat) > 90 * POSITION_SCALE or abs(lon) > 180 * POSITION_SCALE:
+            raise FrameError("Position out of range")
+        payloads.append({
+            'mission_id': mission_id,
+            'latitude': lat / POSITION_SCALE,
+            'longitude': lon / POSITION_SCALE,
+            'altitude_ft': alt,
+            'ground_speed_kts': speed / 10,
+            'heading_deg': heading / 100,
+            'vertical_speed_ftmin': vs,
+            'fuel_remaining_lbs': fuel,
+            'time_enroute_minutes': ete / 10,
+            'phase': PHASES[phase] if phase < len(PHASES) else 'Dispatch',
+            'engine_status': 'Running' if status & ENGINE_RUNNING else 'Shutdown',
+            'timestamp_ms': ms
+        })
+    return mission_id, payloads
+
+
+def _clamp(value: float, low: int, high: int) -> int:
+    return max(low, min(high, int(round(value))))
+
+
+def encode_frame(mission_id: str, payloads: List[Dict]) -> bytes:
+    """Reference encoder for plugin authors and tests (API-format payloads, oldest first)"""
+    if not payloads or len(payloads) > MAX_SAMPLES_PER_FRAME:
+        raise FrameError("A frame holds 1 to %d samples" % MAX_SAMPLES_PER_FRAME)
+    mission_bytes = mission_id.encode('utf-8')
+    if not 0 < len(mission_bytes) < 256:
+        raise FrameError("Mission id must be 1-255 bytes")
+
+    first = payloads[0]
+    base_ms = int(first['timestamp_ms'])
+    base_lat = round(first['latitude'] * POSITION_SCALE)
+    base_lon = round(first['longitude'] * POSITION_SCALE)
+
+    samples = []
+    prev_ms, prev_lat, prev_lon = base_ms, base_lat, base_lon
+    for payload in payloads:
+        ms = int(payload['timestamp_ms'])
+        lat = round(payload['latitude'] * POSITION_SCALE)
+        lon = round(payload['longitude'] * POSITION_SCALE)
+        deltas = (ms - prev_ms, lat - prev_lat, lon - prev_lon)
+        if not (0 <= deltas[0] <= 0xFFFF and all(-0x8000 <= d <= 0x7FFF for d in deltas[1:])):
+            raise FrameError("Sample too far from the previous one; start a new frame")
+        samples.append(SAMPLE.pack(
+            deltas[0],
+            deltas[1],
+            deltas[2],
+            _clamp(payload.get('altitude_ft', 0), -0x8000, 0x7FFF),
+            _clamp(payload.get('ground_speed_kts', 0) * 10, 0, 0xFFFF),
+            _clamp((payload.get('heading_deg', 0) % 360) * 100, 0, 35999),
+            _clamp(payload.get('vertical_speed_ftmin', 0), -0x8000, 0x7FFF),
+            _clamp(payload.get('fuel_remaining_lbs', 0), 0, 0xFFFF),
+            _clamp(payload.get('time_enroute_minutes', 0) * 10, 0, 0xFFFF),
+            PHASE_CODES.get(payload.get('phase'), 0),
+            ENGINE_RUNNING if payload.get('engine_status', 'Running') == 'Running' else 0,
+        ))
+        prev_ms, prev_lat, prev_lon = ms, lat, lon
+
+    return (
+        HEADER.pack(FRAME_VERSION, 0, len(payloads), len(mission_bytes))
+        + mission_bytes
+        + BASE.pack(base_ms, base_lat, base_lon)
+        + b''.join(samples)
+    )
@@ -0,0 +1,308 @@
+"""Destinations for telemetry received by the simulator WebSocket bridge.
+
+A sink receives one API-format telemetry payload at a time together with the
+plugin's credentials. ``HttpSink`` forwards each sample to the REST API,
+``BatchedHttpSink`` uploads accumulated samples to the batch endpoint, and ``InProcessSink``
+hands samples straight to the FastAPI ingestion path when the bridge runs
+inside the API process.
+"""
+import os
+import gzip
+import json
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+API_URL = os.environ.get("API_URL", "http://localhost:8001")
+API_POOL_SIZE = int(os.environ.get("API_POOL_SIZE", 20))
+API_MAX_INFLIGHT = int(os.environ.get("API_MAX_INFLIGHT", 200))
+API_TIMEOUT_SECONDS = float(os.environ.get("API_TIMEOUT_SECONDS", 2.0))
+API_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("API_CONNECT_TIMEOUT_SECONDS", 1.0))
+BRIDGE_BATCH_INTERVAL_SECONDS = float(os.environ.get("BRIDGE_BATCH_INTERVAL_SECONDS", 1.0))
+BRIDGE_BATCH_MAX_SAMPLES = int(os.environ.get("BRIDGE_BATCH_MAX_SAMPLES", 500))
+
+
+class LatencyStats:
+    """Rolling latency and outcome counters for telemetry delivery"""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.dropped = 0
+        self.unauthenticated = 0
+        self.in_flight = 0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        ms = seconds * 1000
+        self.samples.append(ms)
+        self.requests += 1
+        self.max_ms = max(self.max_ms, ms)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "unauthenticated": self.unauthenticated,
+            "in_flight": self.in_flight,
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "max_ms": round(self.max_ms, 1)
+        }
+
+
+class TelemetrySink(ABC):
+    """Base class for bridge telemetry destinations"""
+
+    name = "base"
+
+    def __init__(self):
+        self.latency = LatencyStats()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def send(self, mission_id: str, payload: Dict, authorization: Optional[str]):
+        """Accept one sample; must not block the WebSocket receive loop for long"""
+
+    async def send_many(self, mission_id: str, payloads: List[Dict], authorization: Optional[str]):
+        """Accept several samples for one mission, oldest first"""
+        for payload in payloads:
+            await self.send(mission_id, payload, authorization)
+
+    def stats(self) -> Dict:
+        return {"sink": self.name, **self.latency.stats()}
+
+
+class HttpSink(TelemetrySink):
+    """Forwards each sample to the REST API over a pooled keep-alive client"""
+
+    name = "http"
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        pool_size: int = API_POOL_SIZE,
+        max_inflight: int = API_MAX_INFLIGHT,
+        timeout_seconds: float = API_TIMEOUT_SECONDS,
+        connect_timeout_seconds: float = API_CONNECT_TIMEOUT_SECONDS,
+    ):
+        super().__init__()
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.max_inflight = max_inflight
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.client: Optional[httpx.AsyncClient] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.api_url,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=30
+                ),
+                timeout=httpx.Timeout(self.timeout_seconds, connect=self.connect_timeout_seconds)
+            )
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def send(self, mission_id: str, payload: Dict, authorization: Optional[str]):
+        if not authorization:
+            self.latency.unauthenticated += 1
+            return
+        # Shed load once the pool is saturated rather than piling up tasks
+        if self.latency.in_flight >= self.max_inflight:
+            self.latency.dropped += 1
+            return
+        # Counted from scheduling, so a burst of not-yet-started tasks still hits the limit
+        self.latency.in_flight += 1
+        task = asyncio.create_task(self._put(f"/api/missions/{mission_id}/telemetry", payload, authorization))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        # A done callback also runs for a task cancelled before it started
+        self._tasks.discard(task)
+        self.latency.in_flight -= 1
+
+    async def _put(self, path: str, body, authorization: str, compress: bool = False) -> bool:
+        started = time.perf_counter()
+        ok = False
+        headers = {"Authorization": authorization}
+        try:
+            if compress:
+                headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+                response = await self.client.put(path, content=gzip.compress(json.dumps(body).encode()), headers=headers)
+            else:
+                response = await self.client.put(path, json=body, headers=headers)
+            ok = response.status_code < 400
+            if not ok:
+                print(f"[API] {path} rejected ({response.status_code})")
+        except Exception as e:
+            print(f"[API] Error sending telemetry: {e}")
+        finally:
+            self.latency.record(time.perf_counter() - started, ok)
+        return ok
+
+
+class BatchedHttpSink(HttpSink):
+    """Accumulates samples per mission and uploads them on a fixed interval.
+
+    Each interval sends one gzip-compressed request per mission and
+    credential to ``/telemetry/batch``. Request volume therefore depends on
+    the number of aircraft rather than their sample rate.
+
+    Delivery is best effort. If more than ``max_samples`` samples for a mission
+    build up between flushes, the oldest are dropped. A batch whose upload
+    fails is not retried. Both cases are counted in ``dropped``.
+    """
+
+    name = "batched-http"
+
+    def __init__(
+        self,
+        interval_seconds: float = BRIDGE_BATCH_INTERVAL_SECONDS,
+        max_samples: int = BRIDGE_BATCH_MAX_SAMPLES,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.interval_seconds = interval_seconds
+        self.max_samples = max_samples
+        self._pending: Dict[Tuple[str, str], List[Dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.batched_samples = 0
+
+    async def start(self):
+        await super().start()
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        # The flush loop sends whatever is pending before it exits
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await super().close()
+
+    async def send(self, mission_id: str, payload: Dict, authorization: Optional[str]):
+        if not authorization:
+            self.latency.unauthenticated += 1
+            return
+        samples = self._pending.setdefault((mission_id, authorization), [])
+        if len(samples) >= self.max_samples:
+            # The API is falling behind; keep the newest samples
+            samples.pop(0)
+            self.latency.dropped += 1
+        samples.append(payload)
+
+    async def send_many(self, mission_id: str, payloads: List[Dict], authorization: Optional[str]):
+        if not authorization:
+            self.latency.unauthenticated += len(payloads)
+            return
+        samples = self._pending.setdefault((mission_id, authorization), [])
+        samples.extend(payloads)
+        overflow = len(samples) - self.max_samples
+        if overflow > 0:
+            del samples[:overflow]
+            self.latency.dropped += overflow
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.latency.in_flight += len(pending)
+            try:
+                results = await asyncio.gather(*(
+                    self._put(f"/api/missions/{mission_id}/telemetry/batch", samples, authorization, compress=True)
+                    for (mission_id, authorization), samples in pending.items()
+                ))
+            finally:
+                self.latency.in_flight -= len(pending)
+            self.latency.dropped += sum(len(samples) for samples, ok in zip(pending.values(), results) if not ok)
+            self.batched_samples += sum(len(samples) for samples in pending.values())
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "batched_samples": self.batched_samples,
+            "pending": sum(len(samples) for samples in self._pending.values())
+        }
+
+
+IngestFn = Callable[[str, Dict, Optional[str]], Awaitable[None]]
+
+
+class InProcessSink(TelemetrySink):
+    """Hands samples directly to the API's ingestion function, skipping the HTTP hop.
+
+    ``ingest`` is supplied by the FastAPI app and is responsible for
+    authenticating the credentials and buffering the sample.
+    """
+
+    name = "in-process"
+
+    def __init__(self, ingest: IngestFn):
+        super().__init__()
+        self.ingest = ingest
+
+    async def send(self, mission_id: str, payload: Dict, authorization: Optional[str]):
+        if not authorization:
+            self.latency.unauthenticated += 1
+            return
+        started = time.perf_counter()
+        ok = False
+        try:
+            await self.ingest(mission_id, payload, authorization)
+            ok = True
+        except Exception as e:
+            print(f"[Bridge] Telemetry rejected for {mission_id}: {e}")
+        finally:
+            self.latency.record(time.perf_counter() - started, ok)
+
+
+def create_sink(kind: str) -> TelemetrySink:
+    """Build an HTTP-based sink by name (the in-process sink is built by the API)"""
+    if kind == "http":
+        return HttpSink()
+    if kind == "batched-http":
+        return BatchedHttpSink()
+    raise ValueError(f"Unknown telemetry sink: {kind}")
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from ai_scheduler import AIBusyError, AIScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    """Let queued tasks run up to their next await"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def take_turn(scheduler, user_id, order):
+    lease = await scheduler.acquire(user_id)
+    order.append(user_id)
+    lease.release()
+
+
+def test_admits_immediately_below_limit():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=2)
+        leases = [await scheduler.acquire('a'), await scheduler.acquire('b')]
+        assert scheduler.stats()['active'] == 2
+        for lease in leases:
+            lease.release()
+            lease.release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_freed_slots_rotate_across_users():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1, max_queue_per_user=10)
+        holder = await scheduler.acquire('x')
+        order = []
+        # One user floods the queue before two others ask once each
+        tasks = [asyncio.create_task(take_turn(scheduler, 'a', order)) for _ in range(3)]
+        await settle()
+        tasks += [asyncio.create_task(take_turn(scheduler, user, order)) for user in ('b', 'c')]
+        await settle()
+        assert scheduler.stats()['queue_depth'] == 5
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ['a', 'b', 'c', 'a', 'a']
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+@pytest.mark.parametrize('max_queue, max_queue_per_user, queued, reason', [
+    (2, 10, [('a', 1), ('b', 1)], "AI request queue is full"),
+    (10, 2, [('a', 2)], "Too many AI requests in progress"),
+])
+def test_queue_limits_fail_fast(max_queue, max_queue_per_user, queued, reason):
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1, max_queue=max_queue, max_queue_per_user=max_queue_per_user)
+        holder = await scheduler.acquire('x')
+        tasks = [asyncio.create_task(scheduler.acquire(user)) for user, count in queued for _ in range(count)]
+        await settle()
+        with pytest.raises(AIBusyError) as busy:
+            await scheduler.acquire('a')
+        assert busy.value.reason == reason
+        assert busy.value.retry_after >= 1
+        assert scheduler.stats()['rejected_full'] == 1
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        holder.release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_per_user_limit_leaves_other_users_queueing():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1, max_queue_per_user=1)
+        holder = await scheduler.acquire('x')
+        first = asyncio.create_task(scheduler.acquire('a'))
+        await settle()
+        with pytest.raises(AIBusyError):
+            await scheduler.acquire('a')
+        other = asyncio.create_task(scheduler.acquire('b'))
+        await settle()
+        assert scheduler.stats()['queue_depth'] == 2
+        holder.release()
+        (await first).release()
+        (await other).release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_wait_past_deadline_raises_busy_and_leaves_queue():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1, queue_timeout_seconds=0.01)
+        holder = await scheduler.acquire('x')
+        with pytest.raises(AIBusyError) as busy:
+            await scheduler.acquire('a')
+        assert busy.value.reason == "Timed out waiting for AI capacity"
+        stats = scheduler.stats()
+        assert stats['expired'] == 1 and stats['queue_depth'] == 0 and stats['queued_users'] == 0
+        holder.release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_cancel_while_queued_removes_waiter():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1)
+        holder = await scheduler.acquire('x')
+        waiter = asyncio.create_task(scheduler.acquire('a'))
+        await settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()['queue_depth'] == 0
+        holder.release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_cancel_after_grant_passes_slot_on():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1)
+        holder = await scheduler.acquire('x')
+        granted = asyncio.create_task(scheduler.acquire('a'))
+        await settle()
+        next_in_line = asyncio.create_task(scheduler.acquire('b'))
+        await settle()
+        # The slot is handed to 'a', which is cancelled before it resumes
+        holder.release()
+        granted.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await granted
+        lease = await asyncio.wait_for(next_in_line, 1)
+        assert scheduler.stats()['active'] == 1
+        lease.release()
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
+
+
+def test_cancel_after_grant_frees_slot_when_nobody_waits():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1)
+        holder = await scheduler.acquire('x')
+        granted = asyncio.create_task(scheduler.acquire('a'))
+        await settle()
+        holder.release()
+        granted.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await granted
+        assert scheduler.stats()['active'] == 0
+        (await scheduler.acquire('b')).release()
+
+    run(scenario())
+
+
+def test_call_retries_throttling_then_reports_busy():
+    async def scenario():
+        scheduler = AIScheduler(max_concurrency=1, throttle_retries=2)
+        scheduler.backoff = lambda attempt: 0
+        calls = []
+
+        async def throttled():
+            calls.append(1)
+            raise ClientError({'Error': {'Code': 'ThrottlingException'}}, 'InvokeModel')
+
+        with pytest.raises(AIBusyError):
+            await scheduler.call('a', throttled)
+        assert len(calls) == 3
+        assert scheduler.stats()['active'] == 0
+
+    run(scenario())
@@ -0,0 +1,113 @@
+import pytest
+
+from atc_phraseology import ATCPhraseologyEngine, say_altitude, say_digits
+
+MISSION = {
+    'mission_id': 'mission-1',
+    'callsign': 'Lifeguard 12',
+    'tracking': {'altitudeFt': 1500, 'latitude': 40.0, 'longitude': -80.0},
+    'origin': {'name': 'County Base'},
+    'destination': {'name': 'Mercy Hospital', 'latitude': 40.5, 'longitude': -80.0},
+}
+
+
+@pytest.fixture
+def engine():
+    return ATCPhraseologyEngine(enabled=True, min_confidence=0.75)
+
+
+@pytest.mark.parametrize('controller, message, intent', [
+    ('ground', "Ground, Lifeguard 12 at the hangar, request air taxi to the pad", 'taxi'),
+    ('ground', "Ground, Lifeguard 12 request taxi to runway 22", 'taxi'),
+    ('tower', "Tower, Lifeguard 12 ready for departure", 'takeoff'),
+    ('tower', "Tower, Lifeguard 12 inbound for landing at Mercy Hospital", 'landing'),
+    ('approach', "Approach, Lifeguard 12 with you at 1500", 'check_in'),
+    ('departure', "Departure, Lifeguard 12 climbing through 1200", 'check_in'),
+    ('center', "Center, Lifeguard 12 request flight following to Mercy Hospital", 'flight_following'),
+    ('approach', "Approach, Lifeguard 12 request climb to 2500", 'altitude_change'),
+    ('approach', "Approach, Lifeguard 12 request visual approach Mercy Hospital", 'approach'),
+    ('tower', "Tower, Lifeguard 12 request frequency change", 'frequency_change'),
+    ('approach', "Lifeguard 12 with you at 1500, Approach", 'check_in'),
+    ('tower', "KJFK Tower, Lifeguard 12 ready for departure", 'takeoff'),
+])
+def test_routine_calls_are_answered_locally(engine, controller, message, intent):
+    airport = 'KJFK' if message.startswith('KJFK') else None
+    reply = engine.reply(MISSION, controller, airport, message)
+    assert reply is not None
+    assert reply.intent == intent
+    assert reply.confidence >= 0.75
+    assert reply.text.startswith('Lifeguard 12, ')
+
+
+@pytest.mark.parametrize('controller, message', [
+    ('tower', "Tower, Lifeguard 12 not ready for departure"),
+    ('tower', "Tower, Lifeguard 12 unable departure, holding on the pad"),
+    ('tower', "Tower, Lifeguard 12 cancel landing clearance"),
+    ('ground', "Ground, Lifeguard 12 negative, we do not need taxi"),
+    ('approach', "Approach, Lifeguard 12 disregard the climb request"),
+    ('tower', "Tower, Lifeguard 12 mayday mayday, engine failure, inbound for landing"),
+    ('approach', "Approach, Lifeguard 12 minimum fuel, request descent"),
+])
+def test_negations_and_emergencies_go_to_the_model(engine, controller, message):
+    assert engine.reply(MISSION, controller, None, message) is None
+
+
+@pytest.mark.parametrize('controller, message', [
+    ('approach', "Approach, Lifeguard 12 with you at 1500, request flight following"),
+    ('tower', "Tower, Lifeguard 12 ready for departure, request frequency change after"),
+])
+def test_two_requests_in_one_call_go_to_the_model(engine, controller, message):
+    intent, confidence = engine.classify(MISSION, controller, None, message)
+    assert intent is not None and confidence < 0.75
+    assert engine.reply(MISSION, controller, None, message) is None
+
+
+@pytest.mark.parametrize('controller, message', [
+    ('tower', "Tower, Lifeguard 12 with you at 1500"),
+    ('ground', "Ground, Lifeguard 12 ready for departure"),
+    ('center', "Center, Lifeguard 12 request the weather at Mercy Hospital"),
+])
+def test_calls_no_intent_covers_for_the_controller_go_to_the_model(engine, controller, message):
+    assert engine.classify(MISSION, controller, None, message) == (None, 0.0)
+
+
+@pytest.mark.parametrize('message, served', [
+    ("Tower, Lifeguard 12 ready for departure", True),
+    ("Tower, Lifeguard 12 ready for departure from the helipad, northbound", True),
+    ("Tower, Lifeguard 12 ready for departure, patient loaded", False),
+    ("Tower, Lifeguard 12 ready for departure, two crew plus the patient, doors closed and latched", False),
+])
+def test_confidence_threshold(engine, message, served):
+    _, confidence = engine.classify(MISSION, 'tower', None, message)
+    assert (confidence >= 0.75) is served
+    assert (engine.reply(MISSION, 'tower', None, message) is not None) is served
+
+
+def test_disabled_engine_never_answers():
+    assert ATCPhraseologyEngine(enabled=False).reply(MISSION, 'tower', None, "Tower, Lifeguard 12 ready for departure") is None
+
+
+@pytest.mark.parametrize('message, expected, absent', [
+    ("request taxi to runway 22", "taxi to runway two two, hold short of runway two two", "clear of all runways"),
+    ("request taxi to runway 4L", "runway four left", "clear of all runways"),
+    ("request taxi to the runway", "taxi to the active runway", "clear of all runways"),
+    ("request air taxi to the pad", "air taxi to the departure pad, remain clear of all runways", "hold short"),
+])
+def test_taxi_clearance_matches_the_request(engine, message, expected, absent):
+    reply = engine.reply(MISSION, 'ground', None, f"Ground, Lifeguard 12 {message}")
+    assert expected in reply.text
+    assert absent not in reply.text
+
+
+def test_takeoff_from_runway_names_it(engine):
+    reply = engine.reply(MISSION, 'tower', None, "Tower, Lifeguard 12 ready for departure runway 4")
+    assert "runway four, cleared for takeoff" in reply.text
+
+
+@pytest.mark.parametrize('feet, spoken', [(1500, 'one thousand five hundred'), (12000, 'one two thousand'), (40, 'the surface')])
+def test_say_altitude(feet, spoken):
+    assert say_altitude(feet) == spoken
+
+
+def test_say_digits():
+    assert say_digits('125.9') == 'one two five point niner'
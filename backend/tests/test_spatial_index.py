@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from spatial_index import EARTH_RADIUS_NM, FacilityIndex, SpatialIndex
+
+
+def haversine_nm(lat1, lon1, lat2, lon2):
+    """Reference great-circle distance, independent of the index's chord maths"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def random_points(rng, n):
+    # Uniform on the sphere, plus clusters straddling the antimeridian and at both poles
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    edge = n // 4
+    lat[:edge] = rng.uniform(-5, 5, edge)
+    lon[:edge] = np.where(rng.random(edge) < 0.5, rng.uniform(178, 180, edge), rng.uniform(-180, -178, edge))
+    lat[edge:2 * edge] = rng.uniform(88, 90, edge) * np.where(rng.random(edge) < 0.5, 1, -1)
+    return lat, lon
+
+
+@pytest.fixture(scope='module')
+def index():
+    rng = np.random.default_rng(7)
+    lat, lon = random_points(rng, 2000)
+    items = [{'id': i, 'latitude': float(a), 'longitude': float(o)} for i, (a, o) in enumerate(zip(lat, lon))]
+    return SpatialIndex(items, leaf_size=8), lat, lon
+
+
+QUERIES = [
+    (0.0, 179.9),
+    (0.0, -179.9),
+    (1.0, 180.0),
+    (89.99, 0.0),
+    (90.0, 45.0),
+    (-89.5, 120.0),
+    (-90.0, -60.0),
+    (40.4, -79.9),
+    (-33.9, 151.2),
+]
+
+
+@pytest.mark.parametrize('latitude, longitude', QUERIES)
+@pytest.mark.parametrize('k', [1, 5, 25])
+def test_knn_matches_brute_force(index, latitude, longitude, k):
+    tree, lat, lon = index
+    expected = np.sort(haversine_nm(latitude, longitude, lat, lon))[:k]
+    hits = tree.nearest(latitude, longitude, k)
+    assert len(hits) == k
+    assert [d for d, _ in hits] == pytest.approx(expected.tolist(), abs=1e-6)
+    for distance, i in hits:
+        assert distance == pytest.approx(haversine_nm(latitude, longitude, lat[i], lon[i]), abs=1e-6)
+
+
+@pytest.mark.parametrize('latitude, longitude', QUERIES)
+@pytest.mark.parametrize('radius_nm', [5, 60, 600])
+def test_radius_matches_brute_force(index, latitude, longitude, radius_nm):
+    tree, lat, lon = index
+    distances = haversine_nm(latitude, longitude, lat, lon)
+    expected = set(np.flatnonzero(distances <= radius_nm - 1e-6).tolist())
+    hits = tree.nearest(latitude, longitude, len(lat), radius_nm)
+    found = {i for _, i in hits}
+    assert expected <= found
+    assert all(distance <= radius_nm + 1e-6 for distance, _ in hits)
+    assert [d for d, _ in hits] == sorted(d for d, _ in hits)
+
+
+def test_antimeridian_neighbours_are_found_across_the_seam():
+    tree = SpatialIndex([
+        {'id': 'east', 'latitude': 0.0, 'longitude': 179.95},
+        {'id': 'west', 'latitude': 0.0, 'longitude': -179.95},
+        {'id': 'far', 'latitude': 0.0, 'longitude': 0.0},
+    ])
+    hits = tree.nearest(0.0, -179.99, 2)
+    assert {tree.items[i]['id'] for _, i in hits} == {'east', 'west'}
+    assert hits[-1][0] == pytest.approx(0.06 * 60, rel=1e-3)
+
+
+def test_pole_neighbours_ignore_longitude():
+    tree = SpatialIndex([{'id': lon, 'latitude': 89.9, 'longitude': lon} for lon in (-180, -90, 0, 90)])
+    hits = tree.nearest(90.0, 33.0, 4)
+    assert [d for d, _ in hits] == pytest.approx([6.0] * 4, rel=1e-3)
+
+
+def test_mask_filters_candidates(index):
+    tree, lat, lon = index
+    mask = np.arange(len(tree)) % 3 == 0
+    distances = haversine_nm(10.0, 10.0, lat, lon)
+    expected = np.flatnonzero(mask)[np.argsort(distances[mask])][:10]
+    assert [i for _, i in tree.nearest(10.0, 10.0, 10, mask=mask)] == expected.tolist()
+
+
+def test_items_without_coordinates_are_skipped():
+    tree = SpatialIndex([{'id': 1}, {'id': 2, 'latitude': 'n/a', 'longitude': 3}, {'id': 3, 'latitude': 1, 'longitude': 2}])
+    assert len(tree) == 1
+    assert tree.nearest(0, 0, 5)[0][1] == 0
+
+
+def test_empty_index_and_zero_k():
+    assert SpatialIndex([]).nearest(0, 0, 5) == []
+    assert SpatialIndex([{'latitude': 0, 'longitude': 0}]).nearest(0, 0, 0) == []
+
+
+def test_facility_index_trauma_filter():
+    facilities = FacilityIndex()
+    facilities.set_hospitals([
+        {'id': 'near', 'latitude': 40.0, 'longitude': -80.0, 'traumaLevel': 3, 'isTraumaCenter': False},
+        {'id': 'far', 'latitude': 41.0, 'longitude': -80.0, 'traumaLevel': 1, 'isTraumaCenter': True},
+    ])
+    assert [h['id'] for h in facilities.nearest_hospitals(40.0, -80.0, 1)] == ['near']
+    result = facilities.nearest_hospitals(40.0, -80.0, 1, max_trauma_level=2)
+    assert [h['id'] for h in result] == ['far']
+    assert result[0]['bearing_deg'] == pytest.approx(0.0, abs=0.1)
+    assert result[0]['distance_nm'] == pytest.approx(60.0, rel=0.01)
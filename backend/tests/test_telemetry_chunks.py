@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from fleet_state import TRACKING_FIELDS
+from telemetry_chunks import SLOTS_PER_MS, ChunkAccumulator, decode_chunk, encode_columns
+
+
+def sample(ms, longitude=0.0):
+    return {'device_id': 'u:m', 'mission_id': 'm', 'lastUpdate': ms, 'latitude': 40.0, 'longitude': longitude, 'phase': 'Dispatch'}
+
+
+def collect(accumulator, samples):
+    chunks = [accumulator.add('u:m', 'm', s, 0.0) for s in samples]
+    chunks += accumulator.seal_idle(0.0, 0.0, force=True)
+    return [decode_chunk(chunk) for chunk in chunks if chunk is not None]
+
+
+@pytest.mark.parametrize('t', [[0, 2 ** 31], [2 ** 40, 0]])
+def test_encode_refuses_time_delta_outside_int32(t):
+    columns = {field: np.zeros(2) for field in TRACKING_FIELDS}
+    with pytest.raises(ValueError):
+        encode_columns(np.array(sorted(t), dtype=np.int64), columns, ['', ''])
+
+
+def test_far_timestamp_starts_new_chunk():
+    decoded = collect(ChunkAccumulator(60), [sample(1_700_000_000_000), sample(1_000), sample(1_005)])
+    assert [t.tolist() for t, _, _ in decoded] == [[1_700_000_000_000], [1_000, 1_005]]
+
+
+def test_late_sample_within_span_joins_chunk():
+    decoded = collect(ChunkAccumulator(60), [sample(100_000), sample(80_000), sample(110_000)])
+    assert [t.tolist() for t, _, _ in decoded] == [[80_000, 100_000, 110_000]]
+
+
+def test_antimeridian_crossing_round_trips():
+    longitudes = [179.8, 179.9, -179.9, -179.8]
+    decoded = collect(ChunkAccumulator(60), [sample(i * 1000, lon) for i, lon in enumerate(longitudes)])
+    assert len(decoded) == 2
+    assert np.concatenate([columns['longitude'] for _, columns, _ in decoded]).tolist() == longitudes
+
+
+def test_same_millisecond_keys_stay_unique_within_the_millisecond():
+    accumulator = ChunkAccumulator(60, max_samples=1)
+    chunks = [accumulator.add('u:m', 'm', sample(5_000), 0.0) for _ in range(SLOTS_PER_MS + 1)]
+    keys = [int(chunk['timestamp']) for chunk in chunks if chunk is not None]
+    assert len(keys) == SLOTS_PER_MS == len(set(keys))
+    assert all(key // SLOTS_PER_MS == 5_000 for key in keys)
+
+
+def test_idle_devices_are_forgotten_after_another_idle_period():
+    accumulator = ChunkAccumulator(60)
+    accumulator.add('u:m', 'm', sample(1_000), 0.0)
+    assert len(accumulator.seal_idle(10.0, 5.0)) == 1
+    assert 'u:m' in accumulator._last_key
+    accumulator.seal_idle(20.0, 5.0)
+    assert accumulator._last_key == {}
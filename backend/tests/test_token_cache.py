@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import token_cache
+from token_cache import JWKSCache, VerifiedClaimsCache
+
+
+class Clock:
+    """Stand-in for the ``time`` module with a settable clock"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(token_cache, 'time', clock)
+    return clock
+
+
+def signing_key(kid: str):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key(), as_dict=True)
+    return private, jwt.PyJWK({**jwk, 'kid': kid, 'alg': 'RS256'})
+
+
+def token_for(private, kid: str) -> str:
+    return jwt.encode({'sub': 'user-1'}, private, algorithm='RS256', headers={'kid': kid})
+
+
+class FakeJWKS(JWKSCache):
+    """Serves a mutable key set from memory and counts downloads"""
+
+    def __init__(self, keys, **kwargs):
+        super().__init__('https://example.invalid/jwks.json', **kwargs)
+        self.published = dict(keys)
+        self.downloads = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def _download(self):
+        self.downloads += 1
+        self.release.wait(5)
+        return dict(self.published)
+
+
+@pytest.fixture(scope='module')
+def keys():
+    return {kid: signing_key(kid) for kid in ('old', 'new', 'forged')}
+
+
+def test_concurrent_unknown_kid_shares_one_fetch(clock, keys):
+    async def scenario():
+        cache = FakeJWKS({'old': keys['old'][1]}, min_refresh_interval_seconds=30)
+        await cache.refresh()
+        # Cognito rotates; many requests arrive with the new kid at once
+        cache.published['new'] = keys['new'][1]
+        clock.now += 60
+        cache.release.clear()
+        token = token_for(keys['new'][0], 'new')
+        callers = [asyncio.create_task(cache.get_signing_key(token)) for _ in range(20)]
+        await asyncio.sleep(0.05)
+        cache.release.set()
+        found = await asyncio.gather(*callers)
+        assert all(key.key_id == 'new' for key in found)
+        assert cache.downloads == 2 and cache.fetch_count == 2
+
+    asyncio.run(scenario())
+
+
+def test_unknown_kid_refresh_is_rate_limited(clock, keys):
+    async def scenario():
+        cache = FakeJWKS({'old': keys['old'][1]}, min_refresh_interval_seconds=30)
+        await cache.refresh()
+        forged = token_for(keys['forged'][0], 'forged')
+        for _ in range(10):
+            with pytest.raises(jwt.InvalidTokenError):
+                await cache.get_signing_key(forged)
+        assert cache.downloads == 1
+
+        clock.now += 30
+        with pytest.raises(jwt.InvalidTokenError):
+            await cache.get_signing_key(forged)
+        assert cache.downloads == 2
+        with pytest.raises(jwt.InvalidTokenError):
+            await cache.get_signing_key(forged)
+        assert cache.downloads == 2
+
+    asyncio.run(scenario())
+
+
+def test_known_kid_is_served_without_fetching(clock, keys):
+    async def scenario():
+        cache = FakeJWKS({'old': keys['old'][1]}, ttl_seconds=3600)
+        token = token_for(keys['old'][0], 'old')
+        for _ in range(5):
+            assert (await cache.get_signing_key(token)).key_id == 'old'
+        assert cache.downloads == 1
+        clock.now += 3600
+        await cache.get_signing_key(token)
+        assert cache.downloads == 2
+
+    asyncio.run(scenario())
+
+
+def test_failed_refresh_keeps_serving_cached_keys(clock, keys):
+    async def scenario():
+        cache = FakeJWKS({'old': keys['old'][1]}, ttl_seconds=3600, min_refresh_interval_seconds=30)
+        token = token_for(keys['old'][0], 'old')
+        await cache.get_signing_key(token)
+
+        def unreachable():
+            cache.downloads += 1
+            raise jwt.PyJWKClientConnectionError("down")
+
+        cache._download = unreachable
+        clock.now += 3600
+        assert (await cache.get_signing_key(token)).key_id == 'old'
+        # The next attempt waits for the minimum interval
+        await cache.get_signing_key(token)
+        assert cache.downloads == 2
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('exp_in, max_ttl, lifetime', [
+    (60, 300, 60),
+    (3600, 300, 300),
+    (300, 300, 300),
+])
+def test_claims_expire_at_min_of_exp_and_max_ttl(clock, exp_in, max_ttl, lifetime):
+    cache = VerifiedClaimsCache(max_ttl_seconds=max_ttl)
+    cache.put('token', {'sub': 'user-1', 'exp': clock.now + exp_in})
+    clock.now += lifetime - 1
+    assert cache.get('token') == {'sub': 'user-1', 'exp': clock.now - lifetime + 1 + exp_in}
+    clock.now += 1
+    assert cache.get('token') is None
+
+
+@pytest.mark.parametrize('claims', [{'sub': 'user-1'}, {'sub': 'user-1', 'exp': 999_999.0}])
+def test_tokens_without_future_exp_are_not_cached(clock, claims):
+    cache = VerifiedClaimsCache()
+    cache.put('token', claims)
+    assert cache.get('token') is None
+
+
+def test_cached_claims_are_copies(clock):
+    cache = VerifiedClaimsCache()
+    cache.put('token', {'sub': 'user-1', 'exp': clock.now + 60})
+    cache.get('token')['sub'] = 'someone-else'
+    assert cache.get('token')['sub'] == 'user-1'
+
+
+def test_claims_cache_evicts_least_recently_used(clock):
+    cache = VerifiedClaimsCache(max_entries=2)
+    for name in ('a', 'b'):
+        cache.put(name, {'sub': name, 'exp': clock.now + 60})
+    cache.get('a')
+    cache.put('c', {'sub': 'c', 'exp': clock.now + 60})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,147 @@
+import asyncio
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import track_archive
+from aws_async import AsyncClient, AsyncDynamoDB, ServiceExecutor, convert_floats
+from telemetry_chunks import encode_chunk
+from track_archive import TrackArchiver
+from track_history import device_id_for
+
+REGION = 'us-east-1'
+BUCKET = 'tracks-test'
+USER = 'user-1'
+MISSION = 'HEMS-TEST'
+DEVICE = device_id_for(USER, MISSION)
+BASE_MS = 1_700_000_000_000
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', REGION)
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name=REGION)
+        dynamodb.create_table(
+            TableName='Missions',
+            KeySchema=[{'AttributeName': 'mission_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'mission_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        dynamodb.create_table(
+            TableName='Telemetry',
+            KeySchema=[
+                {'AttributeName': 'device_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'device_id', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'N'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        boto3.client('s3', region_name=REGION).create_bucket(Bucket=BUCKET)
+        dynamodb.Table('Missions').put_item(Item={'mission_id': MISSION, 'user_id': USER, 'status': 'completed'})
+        yield dynamodb
+
+
+def make_archiver() -> TrackArchiver:
+    db = AsyncDynamoDB(REGION, max_concurrency=4)
+    s3 = AsyncClient(boto3.client('s3', region_name=REGION), ServiceExecutor('s3', 4))
+    return TrackArchiver(db, s3, BUCKET, db.Table('Missions'), db.Table('Telemetry'), delay_seconds=0)
+
+
+def sample(ms):
+    return {'lastUpdate': ms, 'latitude': 40 + ms % 1000 / 1e4, 'longitude': -80.0, 'phase': 'Enroute'}
+
+
+def sample_item(ms):
+    return convert_floats({'device_id': DEVICE, 'timestamp': ms // 1000, 'mission_id': MISSION, **sample(ms)})
+
+
+def write_samples(aws, seconds):
+    """One chunk per 600 seconds of 1 Hz samples plus a raw item per second in ``seconds``"""
+    table = aws.Table('Telemetry')
+    with table.batch_writer() as writer:
+        for start in range(0, 1800, 600):
+            samples = [sample(BASE_MS + s * 1000) for s in range(start, start + 600)]
+            writer.put_item(Item=encode_chunk(DEVICE, MISSION, samples))
+        for s in seconds:
+            writer.put_item(Item=sample_item(BASE_MS + s * 1000))
+
+
+def remaining_items(aws):
+    return aws.Table('Telemetry').scan()['Items']
+
+
+def test_archive_round_trips_and_reads_only_overlapping_blocks(aws):
+    write_samples(aws, [1800, 1801])
+    archiver = make_archiver()
+    summary = asyncio.run(archiver.archive(MISSION, USER))
+
+    assert summary['samples'] == 1802
+    assert remaining_items(aws) == []
+    mission = aws.Table('Missions').get_item(Key={'mission_id': MISSION})['Item']
+    assert mission['track_archive']['key'] == summary['key']
+    assert 'track_archive_claim' not in mission
+
+    track, truncated = asyncio.run(archiver.read_track(DEVICE, mission['track_archive']))
+    assert not truncated
+    assert track.t.tolist() == [BASE_MS + s * 1000 for s in range(1802)]
+    assert track.columns['latitude'].tolist() == [sample(ms)['latitude'] for ms in track.t.tolist()]
+
+    start_ms, end_ms = BASE_MS + 700_000, BASE_MS + 710_000
+    reads, read = archiver.range_reads, archiver.bytes_read
+    window, _ = asyncio.run(archiver.load(summary['key'], start_ms, end_ms))
+    assert window.t.tolist() == list(range(start_ms, end_ms + 1, 1000))
+    # The index is cached, so one ranged GET covering a single block
+    assert archiver.range_reads == reads + 1
+    assert archiver.bytes_read - read < summary['bytes'] / 3
+
+
+def test_second_archiver_does_not_take_a_claimed_mission(aws, monkeypatch):
+    write_samples(aws, [])
+    first, second = make_archiver(), make_archiver()
+    load_track = track_archive.load_track
+    competing = []
+
+    async def load_then_compete(*args, **kwargs):
+        result = await load_track(*args, **kwargs)
+        competing.append(await second.archive(MISSION, USER))
+        return result
+
+    monkeypatch.setattr(track_archive, 'load_track', load_then_compete)
+    summary = asyncio.run(first.archive(MISSION, USER))
+    monkeypatch.setattr(track_archive, 'load_track', load_track)
+
+    assert summary is not None and competing == [None]
+    assert second.skipped == 1 and second.archived == 0
+    # Once archived, later attempts skip it too
+    assert asyncio.run(second.archive(MISSION, USER)) is None
+    objects = boto3.client('s3', region_name=REGION).list_objects_v2(Bucket=BUCKET)['Contents']
+    assert [obj['Key'] for obj in objects] == [summary['key']]
+
+
+def test_sample_written_after_the_read_survives_and_is_merged(aws, monkeypatch):
+    write_samples(aws, [1800])
+    archiver = make_archiver()
+    load_track = track_archive.load_track
+    late = sample_item(BASE_MS + 1_900_000)
+
+    async def load_then_write(*args, **kwargs):
+        result = await load_track(*args, **kwargs)
+        aws.Table('Telemetry').put_item(Item=late)
+        return result
+
+    monkeypatch.setattr(track_archive, 'load_track', load_then_write)
+    summary = asyncio.run(archiver.archive(MISSION, USER))
+    monkeypatch.setattr(track_archive, 'load_track', load_track)
+
+    assert summary['samples'] == 1801
+    assert [int(item['lastUpdate']) for item in remaining_items(aws)] == [BASE_MS + 1_900_000]
+    track, _ = asyncio.run(archiver.read_track(DEVICE, summary))
+    assert len(track) == 1802
+    assert int(track.t[-1]) == BASE_MS + 1_900_000
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from fleet_state import TRACKING_FIELDS
+from track_history import Track, lttb_indices, page_track
+
+
+def make_track(t, latitude=None, longitude=None):
+    t = np.asarray(t, dtype=np.int64)
+    columns = {field: np.zeros(len(t)) for field in TRACKING_FIELDS}
+    if latitude is not None:
+        columns['latitude'] = np.asarray(latitude, dtype=np.float64)
+    if longitude is not None:
+        columns['longitude'] = np.asarray(longitude, dtype=np.float64)
+    return Track(t, columns, [''] * len(t))
+
+
+def read_pages(track, limit, read_size=None):
+    """Page through ``track`` the way clients do, passing next_start_ms back as start_ms"""
+    pages = []
+    start_ms = None
+    while True:
+        window = track.window(start_ms, None)
+        read = window.take(np.arange(min(len(window), read_size or limit + 1)))
+        page, start_ms = page_track(read, limit, len(read) < len(window))
+        pages.append(page)
+        if start_ms is None:
+            return pages
+
+
+# ---- LTTB ----
+
+@pytest.mark.parametrize('n, n_out', [(10, 10), (10, 20), (5, 100)])
+def test_lttb_keeps_everything_when_not_reducing(n, n_out):
+    x = np.arange(n, dtype=np.float64)
+    assert lttb_indices(x, x, n_out).tolist() == list(range(n))
+
+
+@pytest.mark.parametrize('n_out', [0, 1, 2])
+def test_lttb_degenerate_output_keeps_endpoints(n_out):
+    x = np.arange(10, dtype=np.float64)
+    assert lttb_indices(x, x, n_out).tolist() == [0, 9]
+
+
+@pytest.mark.parametrize('n, n_out', [(100, 3), (100, 10), (1000, 97), (5001, 500)])
+def test_lttb_selects_sorted_unique_indices_with_endpoints(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.random(n))
+    y = rng.standard_normal(n)
+    indices = lttb_indices(x, y, n_out)
+    assert len(indices) == n_out
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_spike():
+    x = np.arange(101, dtype=np.float64)
+    y = np.zeros(101)
+    y[37] = 50.0
+    assert 37 in lttb_indices(x, y, 10).tolist()
+
+
+def test_downsample_keeps_turn_of_a_dogleg():
+    # East for 50 samples, then north; the corner must survive
+    longitude = np.concatenate([np.linspace(0, 1, 51), np.ones(50)])
+    latitude = np.concatenate([np.zeros(51), np.linspace(0, 1, 51)[1:]])
+    track = make_track(np.arange(101) * 1000, latitude, longitude)
+    sampled = track.downsample(5)
+    assert len(sampled) == 5
+    assert 50000 in sampled.t.tolist()
+
+
+# ---- paging ----
+
+@pytest.mark.parametrize('n, limit', [(0, 10), (5, 10), (10, 10), (11, 10), (25, 10), (1000, 33)])
+def test_pages_cover_every_sample_once(n, limit):
+    track = make_track(np.arange(n) * 250)
+    pages = read_pages(track, limit)
+    assert all(len(page) <= limit for page in pages)
+    assert np.concatenate([page.t for page in pages]).tolist() == track.t.tolist()
+
+
+def test_page_cursor_is_first_unreturned_sample():
+    track = make_track([100, 101, 105, 200])
+    page, next_start = page_track(track, 3, False)
+    assert page.t.tolist() == [100, 101, 105]
+    assert next_start == 200
+
+
+def test_page_stops_before_repeated_millisecond():
+    # Duplicate timestamps across a page cut must not be skipped
+    track = make_track([10, 20, 30, 30, 40])
+    page, next_start = page_track(track, 3, False)
+    assert page.t.tolist() == [10, 20]
+    assert next_start == 30
+
+
+def test_last_page_has_no_cursor():
+    page, next_start = page_track(make_track([1, 2, 3]), 10, False)
+    assert len(page) == 3 and next_start is None
+
+
+def test_truncated_read_continues_after_last_sample():
+    page, next_start = page_track(make_track([1, 2, 3]), 10, True)
+    assert page.t.tolist() == [1, 2, 3]
+    assert next_start == 4
+
+
+def test_truncated_empty_read_has_no_cursor():
+    page, next_start = page_track(Track.empty(), 10, True)
+    assert len(page) == 0 and next_start is None
+
+
+def test_short_truncated_reads_still_cover_every_sample():
+    track = make_track(np.arange(100) * 7)
+    pages = read_pages(track, 30, read_size=12)
+    assert np.concatenate([page.t for page in pages]).tolist() == track.t.tolist()
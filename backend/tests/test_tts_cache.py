@@ -0,0 +1,126 @@
+import asyncio
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from aws_async import AsyncClient, ServiceExecutor
+from tts_cache import TTSCache, tts_digest
+
+REGION = 'us-east-1'
+BUCKET = 'tts-test'
+
+
+class Body:
+    def __init__(self, data: bytes, gate: threading.Event):
+        self.data = data
+        self.gate = gate
+
+    def read(self):
+        self.gate.wait(5)
+        return self.data
+
+    def iter_chunks(self, size):
+        self.gate.wait(5)
+        for i in range(0, len(self.data), size):
+            yield self.data[i:i + size]
+
+    def close(self):
+        pass
+
+
+class FakePolly:
+    """Polly client whose audio is held back until ``gate`` is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def synthesize_speech(self, Text, **kwargs):
+        self.calls += 1
+        return {'AudioStream': Body(b'ID3' + Text.encode() * 5000, self.gate)}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', REGION)
+    with mock_aws():
+        client = boto3.client('s3', region_name=REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def make_cache(s3, polly):
+    return TTSCache(
+        AsyncClient(polly, ServiceExecutor('polly', 8)),
+        AsyncClient(s3, ServiceExecutor('s3', 8)),
+        BUCKET
+    )
+
+
+async def read_stream(cache, text):
+    digest, cached, chunks = await cache.stream(text)
+    return digest, cached, b''.join([chunk async for chunk in chunks])
+
+
+def test_second_request_is_a_memory_hit(s3):
+    polly = FakePolly()
+    cache = make_cache(s3, polly)
+
+    async def run():
+        first = await cache.audio('roger')
+        second = await cache.audio('roger')
+        streamed = await read_stream(cache, 'roger')
+        return first, second, streamed
+
+    (audio, _, first_cached), (again, _, second_cached), (_, stream_cached, streamed) = asyncio.run(run())
+    assert (first_cached, second_cached, stream_cached) == (False, True, True)
+    assert audio == again == streamed
+    assert polly.calls == 1
+    assert cache.memory_hits == 2 and cache.misses == 1
+
+
+def test_audio_in_s3_is_read_without_synthesis(s3):
+    polly = FakePolly()
+    digest = tts_digest('cleared for takeoff', 'Joanna', 'neural')
+    s3.put_object(Bucket=BUCKET, Key=f"tts/{digest}.mp3", Body=b'ID3stored')
+    cache = make_cache(s3, polly)
+
+    assert asyncio.run(cache.audio('cleared for takeoff')) == (b'ID3stored', digest, True)
+    assert asyncio.run(read_stream(make_cache(s3, polly), 'cleared for takeoff')) == (digest, True, b'ID3stored')
+    assert polly.calls == 0
+    assert cache.s3_hits == 1
+
+
+@pytest.mark.parametrize('leader', ['audio', 'stream'])
+def test_concurrent_misses_share_one_synthesis(s3, leader):
+    polly = FakePolly()
+    polly.gate.clear()
+    cache = make_cache(s3, polly)
+
+    async def run():
+        if leader == 'audio':
+            first = asyncio.create_task(cache.audio('ready for departure'))
+        else:
+            first = asyncio.create_task(read_stream(cache, 'ready for departure'))
+        while polly.calls == 0:
+            await asyncio.sleep(0.01)
+        joiners = [
+            asyncio.create_task(cache.audio('ready for departure')),
+            asyncio.create_task(read_stream(cache, 'ready for departure')),
+        ]
+        await asyncio.sleep(0.05)
+        polly.gate.set()
+        return await first, await asyncio.gather(*joiners)
+
+    first, (joined_audio, joined_stream) = asyncio.run(run())
+    assert polly.calls == 1
+    audio = first[0] if leader == 'audio' else first[2]
+    assert joined_audio[0] == joined_stream[2] == audio
+    # Nobody got this phrase from a cache
+    assert not joined_audio[2] and not joined_stream[1]
+    assert cache._inflight == {}
@@ -0,0 +1,200 @@
+"""Process-wide caches used by Cognito token verification"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+JWKS_CACHE_TTL_SECONDS = float(os.environ.get('JWKS_CACHE_TTL_SECONDS', 3600))
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.environ.get('JWKS_MIN_REFRESH_INTERVAL_SECONDS', 30))
+JWKS_FETCH_TIMEOUT_SECONDS = float(os.environ.get('JWKS_FETCH_TIMEOUT_SECONDS', 5))
+CLAIMS_CACHE_MAX_ENTRIES = int(os.environ.get('CLAIMS_CACHE_MAX_ENTRIES', 10000))
+CLAIMS_CACHE_MAX_TTL_SECONDS = float(os.environ.get('CLAIMS_CACHE_MAX_TTL_SECONDS', 300))
+
+
+class JWKSCache:
+    """Cognito signing keys keyed by kid, refreshed on TTL expiry or unknown kid.
+
+    Concurrent callers that need a refresh share a single in-flight fetch, so a
+    key rotation costs one download regardless of how many requests see it.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        ttl_seconds: float = JWKS_CACHE_TTL_SECONDS,
+        min_refresh_interval_seconds: float = JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+        fetch_timeout_seconds: float = JWKS_FETCH_TIMEOUT_SECONDS,
+    ):
+        self.jwks_url = jwks_url
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval_seconds = min_refresh_interval_seconds
+        self.fetch_timeout_seconds = fetch_timeout_seconds
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self.fetch_count = 0
+
+    async def warm(self):
+        """Prefetch keys at startup; failures are retried on first use"""
+        try:
+            await self.refresh()
+            print(f"JWKS cache loaded {len(self._keys)} signing keys")
+        except jwt.PyJWKClientError as e:
+            print(f"JWKS prefetch failed: {e}")
+
+    async def get_signing_key(self, token: str) -> jwt.PyJWK:
+        """Return the signing key for a token, fetching the key set only when needed"""
+        kid = jwt.get_unverified_header(token).get('kid')
+        if not kid:
+            raise jwt.InvalidTokenError("Token header is missing 'kid'")
+
+        if self._is_stale():
+            await self._refresh_keeping_stale_keys()
+
+        key = self._keys.get(kid)
+        if key is None and self._may_refresh_for_unknown_kid():
+            await self._refresh_keeping_stale_keys()
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+    async def refresh(self):
+        """Fetch the key set, joining a fetch already in flight if there is one"""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, task: asyncio.Task):
+        if self._inflight is task:
+            self._inflight = None
+
+    async def _refresh_keeping_stale_keys(self):
+        # An expired key set is still better than failing every request while
+        # Cognito is unreachable; only surface the error when nothing is cached.
+        try:
+            await self.refresh()
+        except jwt.PyJWKClientError as e:
+            if not self._keys:
+                raise
+            print(f"JWKS refresh failed, serving cached keys: {e}")
+            # Retry after the minimum interval rather than on every request
+            self._fetched_at = time.monotonic() - self.ttl_seconds + self.min_refresh_interval_seconds
+
+    async def _fetch(self):
+        keys = await asyncio.to_thread(self._download)
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        self.fetch_count += 1
+
+    def _download(self) -> Dict[str, jwt.PyJWK]:
+        try:
+            with urllib.request.urlopen(self.jwks_url, timeout=self.fetch_timeout_seconds) as response:
+                data = json.load(response)
+        except Exception as e:
+            raise jwt.PyJWKClientConnectionError(f"Failed to fetch JWKS from {self.jwks_url}: {e}")
+
+        try:
+            jwk_set = jwt.PyJWKSet.from_dict(data)
+        except jwt.PyJWKSetError as e:
+            raise jwt.PyJWKClientError(f"Invalid JWKS document: {e}")
+        return {key.key_id: key for key in jwk_set.keys if key.key_id}
+
+    def _is_stale(self) -> bool:
+        if self._fetched_at is None:
+            return True
+        return time.monotonic() - self._fetched_at >= self.ttl_seconds
+
+    def _may_refresh_for_unknown_kid(self) -> bool:
+        # Rate-limit refreshes triggered by unknown kids so forged tokens
+        # cannot turn into a stream of outbound fetches.
+        if self._fetched_at is None:
+            return True
+        return time.monotonic() - self._fetched_at >= self.min_refresh_interval_seconds
+
+    def stats(self) -> Dict:
+        return {
+            "keys": len(self._keys),
+            "fetches": self.fetch_count,
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at is not None else None,
+        }
+
+
+class VerifiedClaimsCache:
+    """Bounded LRU of already-verified token claims keyed by a SHA-256 of the token.
+
+    Entries expire at the token's own ``exp`` or after ``max_ttl_seconds``,
+    whichever comes first, so a cached token is never honoured past expiry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CLAIMS_CACHE_MAX_ENTRIES,
+        max_ttl_seconds: float = CLAIMS_CACHE_MAX_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_ttl_seconds = max_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._verify_seconds_total = 0.0
+        self._verify_count = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, claims = entry
+            if time.time() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(claims)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: Dict):
+        exp = claims.get('exp')
+        if exp is None:
+            return
+        expires_at = min(float(exp), time.time() + self.max_ttl_seconds)
+        if expires_at <= time.time():
+            return
+
+        key = self._key(token)
+        self._entries[key] = (expires_at, dict(claims))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_verification(self, seconds: float):
+        """Record the cost of a full signature check, used to estimate savings"""
+        self._verify_seconds_total += seconds
+        self._verify_count += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        avg_verify_ms = (self._verify_seconds_total / self._verify_count * 1000) if self._verify_count else 0.0
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_verify_ms": round(avg_verify_ms, 3),
+            "estimated_cpu_saved_ms": round(self.hits * avg_verify_ms, 1),
+        }
@@ -0,0 +1,452 @@
+"""Archive of completed mission tracks in S3.
+
+After a mission completes, its telemetry is read out of DynamoDB and written
+as a single columnar object at ``tracks/<mission_id>.<attempt>.vht``. The
+telemetry items that went into it are then deleted. The object holds a run of compressed column blocks
+in the ``telemetry_chunks`` encoding, each covering at most
+``TRACK_ARCHIVE_BLOCK_SECONDS``. A JSON index and a fixed 16-byte trailer
+follow the blocks::
+
+    [block 0][block 1]...[index JSON][uint64 index length][b'VHTRACK1']
+
+Readers fetch the tail with a suffix range request and parse the index. They
+then fetch only the byte range covering the blocks that overlap the
+requested time window. Archives never change once written, so parsed indexes
+are cached.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import struct
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from aws_async import AsyncClient, AsyncDynamoDB, AsyncTable
+from fleet_state import TRACKING_FIELDS
+from telemetry_chunks import CHUNK_FORMAT, decode_columns, encode_columns
+from track_history import Track, device_id_for, load_track
+
+TRACK_ARCHIVE_PREFIX = os.environ.get('TRACK_ARCHIVE_PREFIX', 'tracks/')
+TRACK_ARCHIVE_BLOCK_SECONDS = int(os.environ.get('TRACK_ARCHIVE_BLOCK_SECONDS', 300))
+TRACK_ARCHIVE_BLOCK_MAX_SAMPLES = 4096
+# Give buffered and late samples time to reach DynamoDB before archiving
+TRACK_ARCHIVE_DELAY_SECONDS = float(os.environ.get('TRACK_ARCHIVE_DELAY_SECONDS', 30))
+TRACK_ARCHIVE_WORKERS = int(os.environ.get('TRACK_ARCHIVE_WORKERS', 2))
+TRACK_ARCHIVE_INDEX_CACHE = 256
+# How long a worker may hold a mission before another one can take it over
+TRACK_ARCHIVE_CLAIM_SECONDS = int(os.environ.get('TRACK_ARCHIVE_CLAIM_SECONDS', 600))
+
+ARCHIVE_VERSION = 1
+MAGIC = b'VHTRACK1'
+TRAILER = struct.Struct('<Q8s')
+# One suffix request usually covers the trailer and the whole index
+TAIL_READ_BYTES = 64 * 1024
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_MAX_RETRIES = 6
+
+
+class ArchiveError(ValueError):
+    """Object is not a readable track archive"""
+
+
+def archive_key(mission_id: str, attempt: str) -> str:
+    # Each attempt writes its own object, so a stale worker cannot replace the recorded one
+    return f"{TRACK_ARCHIVE_PREFIX}{mission_id}.{attempt}.vht"
+
+
+def build_archive(mission_id: str, track: Track, block_seconds: int = TRACK_ARCHIVE_BLOCK_SECONDS) -> bytes:
+    """Serialise a track into blocks, index and trailer"""
+    blocks: List[bytes] = []
+    entries: List[Dict] = []
+    offset = 0
+    n = len(track)
+    # Longitude deltas across the antimeridian do not fit in int32, so blocks split there
+    crossings = np.flatnonzero(np.abs(np.diff(track.columns['longitude'])) >= 180) + 1
+    start = 0
+    while start < n:
+        # Block ends at the first sample past the time span, the sample cap or a crossing
+        limit = int(track.t[start]) + block_seconds * 1000
+        end = min(int(np.searchsorted(track.t, limit, side='left')), start + TRACK_ARCHIVE_BLOCK_MAX_SAMPLES, n)
+        crossing = int(np.searchsorted(crossings, start, side='right'))
+        if crossing < len(crossings):
+            end = min(end, int(crossings[crossing]))
+        end = max(end, start + 1)
+        block = track.take(np.arange(start, end))
+        data, phases = encode_columns(block.t, block.columns, block.phase)
+        blocks.append(data)
+        entries.append({
+            'offset': offset,
+            'length': len(data),
+            'count': len(block),
+            'start_ms': int(block.t[0]),
+            'end_ms': int(block.t[-1]),
+            'phases': phases,
+        })
+        offset += len(data)
+        start = end
+
+    index = json.dumps({
+        'version': ARCHIVE_VERSION,
+        'format': CHUNK_FORMAT,
+        'mission_id': mission_id,
+        'fields': list(TRACKING_FIELDS),
+        'count': n,
+        'start_ms': int(track.t[0]) if n else None,
+        'end_ms': int(track.t[-1]) if n else None,
+        'blocks': entries,
+    }, separators=(',', ':')).encode()
+    return b''.join(blocks) + index + TRAILER.pack(len(index), MAGIC)
+
+
+def parse_index(tail: bytes, object_size: int) -> Tuple[Optional[Dict], int]:
+    """Parse the index from the object's last bytes.
+
+    Returns (index, 0), or (None, bytes_needed) when ``tail`` is too short.
+    """
+    if len(tail) < TRAILER.size:
+        raise ArchiveError("Archive too short")
+    index_length, magic = TRAILER.unpack_from(tail, len(tail) - TRAILER.size)
+    if magic != MAGIC:
+        raise ArchiveError("Not a track archive")
+    needed = index_length + TRAILER.size
+    if needed > object_size:
+        raise ArchiveError("Archive index length out of range")
+    if needed > len(tail):
+        return None, needed
+    index = json.loads(tail[len(tail) - needed:len(tail) - TRAILER.size])
+    if index.get('version') != ARCHIVE_VERSION or index.get('format') != CHUNK_FORMAT:
+        raise ArchiveError("Unsupported track archive version")
+    return index, 0
+
+
+def blocks_in_window(index: Dict, start_ms: Optional[int], end_ms: Optional[int]) -> List[Dict]:
+    return [
+        block for block in index['blocks']
+        if (start_ms is None or block['end_ms'] >= start_ms) and (end_ms is None or block['start_ms'] <= end_ms)
+    ]
+
+
+def _conditional_check_failed(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def decode_blocks(blocks: List[Dict], data: bytes, base_offset: int) -> Track:
+    """Decode consecutive blocks from one ranged read that starts at ``base_offset``"""
+    tracks = []
+    for block in blocks:
+        lo = block['offset'] - base_offset
+        blob = data[lo:lo + block['length']]
+        tracks.append(Track(*decode_columns(blob, block['start_ms'], block['count'], block['phases'])))
+    return Track.concat(tracks)
+
+
+class TrackArchiver:
+    """Moves completed missions' telemetry from DynamoDB into S3 and reads it back"""
+
+    def __init__(
+        self,
+        db: AsyncDynamoDB,
+        s3: AsyncClient,
+        bucket: str,
+        missions_table: AsyncTable,
+        telemetry_table: AsyncTable,
+        delay_seconds: float = TRACK_ARCHIVE_DELAY_SECONDS,
+        workers: int = TRACK_ARCHIVE_WORKERS,
+    ):
+        self.db = db
+        self.s3 = s3
+        self.bucket = bucket
+        self.missions_table = missions_table
+        self.telemetry_table = telemetry_table
+        self.delay_seconds = delay_seconds
+        self.workers = workers
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._indexes: 'OrderedDict[str, Tuple[Dict, int]]' = OrderedDict()
+
+        self.archived = 0
+        self.archived_samples = 0
+        self.archived_bytes = 0
+        self.skipped = 0
+        self.deleted_items = 0
+        self.failures = 0
+        self.range_reads = 0
+        self.bytes_read = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket)
+
+    # ---- pipeline ----
+
+    def schedule(self, mission_id: str, user_id: str):
+        """Queue a completed mission for archiving after ``delay_seconds``"""
+        if self.enabled:
+            self._queue.put_nowait((time.monotonic() + self.delay_seconds, mission_id, user_id))
+
+    async def start(self):
+        if not self.enabled or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self.sweep()))
+
+    async def stop(self):
+        """Stop workers; unfinished missions are picked up by the next start's sweep"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    async def sweep(self):
+        """Queue completed missions that were never archived (e.g. after a restart)"""
+        kwargs = {
+            'IndexName': 'status-index',
+            'KeyConditionExpression': Key('status').eq('completed'),
+            'FilterExpression': 'attribute_not_exists(track_archive)',
+            'ProjectionExpression': 'mission_id, user_id',
+        }
+        try:
+            while True:
+                response = await self.missions_table.query(**kwargs)
+                for item in response.get('Items', []):
+                    if item.get('user_id'):
+                        self._queue.put_nowait((0.0, item['mission_id'], item['user_id']))
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    break
+                kwargs['ExclusiveStartKey'] = last_key
+        except Exception as e:
+            print(f"Track archive sweep failed: {e}")
+
+    async def _worker(self):
+        while True:
+            due, mission_id, user_id = await self._queue.get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self.archive(mission_id, user_id)
+            except Exception as e:
+                self.failures += 1
+                print(f"Track archive failed for {mission_id}: {e}")
+
+    async def archive(self, mission_id: str, user_id: str) -> Optional[Dict]:
+        """Write the archive object, record it on the mission, then delete the telemetry read into it.
+
+        The mission is claimed first, so duplicate queue entries and other
+        workers skip it. ``track_archive`` is only ever set once, and only by
+        the holder of the claim. A worker whose claim expired therefore cannot
+        replace an archive, and it deletes nothing. Telemetry written after the
+        read stays in DynamoDB, where ``read_track`` merges it in. A crash
+        part-way leaves the mission to a later sweep once the claim expires.
+        """
+        attempt = uuid.uuid4().hex
+        if not await self._claim(mission_id, attempt):
+            self.skipped += 1
+            return None
+        key = None
+        try:
+            device_id = device_id_for(user_id, mission_id)
+            keys: List[Dict] = []
+            track, _ = await load_track(self.telemetry_table, device_id, keys=keys)
+            body = build_archive(mission_id, track)
+            key = archive_key(mission_id, attempt)
+            await self.s3.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=body,
+                ContentType='application/octet-stream',
+                Metadata={'mission-id': mission_id, 'samples': str(len(track))}
+            )
+            summary = {
+                'key': key,
+                'samples': len(track),
+                'bytes': len(body),
+                'archived_at': datetime.now(timezone.utc).isoformat(),
+            }
+            await self.missions_table.update_item(
+                Key={'mission_id': mission_id},
+                UpdateExpression='SET track_archive = :archive REMOVE track_archive_claim',
+                ConditionExpression='attribute_not_exists(track_archive) AND track_archive_claim.attempt = :attempt',
+                ExpressionAttributeValues={':archive': summary, ':attempt': attempt}
+            )
+        except Exception as e:
+            await self._abandon(mission_id, attempt, key)
+            if _conditional_check_failed(e):
+                # The claim expired and another worker took the mission over
+                self.skipped += 1
+                return None
+            raise
+        await self._delete_telemetry(keys)
+
+        self.archived += 1
+        self.archived_samples += len(track)
+        self.archived_bytes += len(body)
+        return summary
+
+    async def _claim(self, mission_id: str, attempt: str) -> bool:
+        """Take the mission for this attempt unless it is archived or claimed by a live worker"""
+        now = int(time.time())
+        try:
+            await self.missions_table.update_item(
+                Key={'mission_id': mission_id},
+                UpdateExpression='SET track_archive_claim = :claim',
+                ConditionExpression=(
+                    'attribute_exists(mission_id) AND attribute_not_exists(track_archive) '
+                    'AND (attribute_not_exists(track_archive_claim) OR track_archive_claim.expires < :now)'
+                ),
+                ExpressionAttributeValues={
+                    ':claim': {'attempt': attempt, 'expires': now + TRACK_ARCHIVE_CLAIM_SECONDS},
+                    ':now': now,
+                }
+            )
+        except ClientError as e:
+            if _conditional_check_failed(e):
+                return False
+            raise
+        return True
+
+    async def _abandon(self, mission_id: str, attempt: str, key: Optional[str]):
+        """Best-effort cleanup after a failed attempt: drop its object and release the claim"""
+        try:
+            if key is not None:
+                await self.s3.delete_object(Bucket=self.bucket, Key=key)
+            await self.missions_table.update_item(
+                Key={'mission_id': mission_id},
+                UpdateExpression='REMOVE track_archive_claim',
+                ConditionExpression='track_archive_claim.attempt = :attempt',
+                ExpressionAttributeValues={':attempt': attempt}
+            )
+        except ClientError as e:
+            if not _conditional_check_failed(e):
+                print(f"Track archive cleanup failed for {mission_id}: {e}")
+
+    async def _delete_telemetry(self, keys: List[Dict]):
+        table_name = self.telemetry_table.name
+        for i in range(0, len(keys), BATCH_WRITE_LIMIT):
+            requests = [{'DeleteRequest': {'Key': key}} for key in keys[i:i + BATCH_WRITE_LIMIT]]
+            for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+                response = await self.db.batch_write_item(RequestItems={table_name: requests})
+                pending = (response.get('UnprocessedItems') or {}).get(table_name, [])
+                self.deleted_items += len(requests) - len(pending)
+                if not pending:
+                    break
+                if attempt == BATCH_WRITE_MAX_RETRIES:
+                    raise RuntimeError(f"{len(pending)} telemetry deletes left unprocessed")
+                requests = pending
+                delay = 0.05 * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+    # ---- reads ----
+
+    async def _get_range(self, key: str, byte_range: str) -> Tuple[bytes, int]:
+        def fetch():
+            response = self.s3.client.get_object(Bucket=self.bucket, Key=key, Range=byte_range)
+            total = int(response['ContentRange'].rsplit('/', 1)[1])
+            return response['Body'].read(), total
+
+        data, total = await self.s3.run(fetch)
+        self.range_reads += 1
+        self.bytes_read += len(data)
+        return data, total
+
+    async def _index(self, key: str) -> Tuple[Dict, int]:
+        cached = self._indexes.get(key)
+        if cached is not None:
+            self._indexes.move_to_end(key)
+            return cached
+        tail, size = await self._get_range(key, f"bytes=-{TAIL_READ_BYTES}")
+        index, needed = parse_index(tail, size)
+        if index is None:
+            tail, size = await self._get_range(key, f"bytes=-{needed}")
+            index, _ = parse_index(tail, size)
+        self._indexes[key] = (index, size)
+        while len(self._indexes) > TRACK_ARCHIVE_INDEX_CACHE:
+            self._indexes.popitem(last=False)
+        return index, size
+
+    async def load(
+        self,
+        key: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        max_samples: Optional[int] = None,
+    ) -> Tuple[Track, bool]:
+        """Archived samples in a time window, reading only the overlapping blocks
+        
+        With ``max_samples`` only enough leading blocks are fetched; the second
+        value is then True and the track is complete up to its last sample.
+        """
+        try:
+            index, _ = await self._index(key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'InvalidRange'):
+                return Track.empty(), False
+            raise
+        blocks = blocks_in_window(index, start_ms, end_ms)
+        truncated = False
+        if max_samples is not None and blocks:
+            # The first block may lie mostly before start_ms, so it does not count
+            total = 0
+            for i, block in enumerate(blocks[1:], start=1):
+                total += block['count']
+                if total >= max_samples:
+                    truncated = i + 1 < len(blocks)
+                    blocks = blocks[:i + 1]
+                    break
+        if not blocks:
+            return Track.empty(), False
+        # Overlapping blocks are contiguous, so one ranged GET covers them
+        first, last = blocks[0]['offset'], blocks[-1]['offset'] + blocks[-1]['length'] - 1
+        data, _ = await self._get_range(key, f"bytes={first}-{last}")
+        return decode_blocks(blocks, data, first).window(start_ms, end_ms), truncated
+
+    async def read_track(
+        self,
+        device_id: str,
+        archive: Optional[Dict],
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        max_samples: Optional[int] = None,
+    ) -> Tuple[Track, bool]:
+        """``load_track`` plus the mission's archive, when it has one
+        
+        Samples that reached DynamoDB after archiving are merged in.
+        """
+        track, truncated = await load_track(self.telemetry_table, device_id, start_ms, end_ms, max_samples)
+        if not archive:
+            return track, truncated
+        archived, archive_truncated = await self.load(archive['key'], start_ms, end_ms, max_samples)
+        cutoffs = [int(part.t[-1]) for part, cut in ((track, truncated), (archived, archive_truncated)) if cut and len(part)]
+        merged = Track.concat([archived, track])
+        if not cutoffs:
+            return merged, False
+        return merged.window(None, min(cutoffs)), True
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "archived": self.archived,
+            "archived_samples": self.archived_samples,
+            "archived_bytes": self.archived_bytes,
+            "skipped": self.skipped,
+            "deleted_items": self.deleted_items,
+            "failures": self.failures,
+            "range_reads": self.range_reads,
+            "bytes_read": self.bytes_read,
+            "cached_indexes": len(self._indexes),
+        }
@@ -0,0 +1,288 @@
+"""Read-back and downsampling of recorded mission telemetry.
+
+Samples are loaded into a column-oriented ``Track`` (one NumPy array per
+field), so filtering and downsampling are array operations. Downsampling
+uses Largest-Triangle-Three-Buckets over the horizontal path, which keeps
+turns and hover points while dropping straight-line filler.
+
+Recorded telemetry lives in two layouts: legacy one-item-per-sample rows and
+compressed chunks (``telemetry_chunks``). ``load_track`` reads both and merges
+them, so callers never see the difference.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from boto3.dynamodb.conditions import Key
+
+from aws_async import AsyncTable
+from fleet_state import TRACKING_FIELDS
+from telemetry_chunks import CHUNK_LOOKBACK_MS, SLOTS_PER_MS, chunk_partition, decode_chunk
+
+TRACK_MAX_POINTS = 5000
+TRACK_DEFAULT_POINTS = 500
+TRACK_MAX_PAGE_SIZE = 5000
+
+
+def device_id_for(user_id: str, mission_id: str) -> str:
+    """Telemetry partition key for a mission flown by ``user_id``"""
+    return f"{user_id}:{mission_id}"
+
+
+class Track:
+    """Time-ordered telemetry samples stored as parallel columns"""
+
+    __slots__ = ('t', 'columns', 'phase')
+
+    def __init__(self, t: np.ndarray, columns: Dict[str, np.ndarray], phase: List[str]):
+        self.t = t
+        self.columns = columns
+        self.phase = phase
+
+    @classmethod
+    def empty(cls) -> 'Track':
+        return cls(np.zeros(0, dtype=np.int64), {field: np.zeros(0) for field in TRACKING_FIELDS}, [])
+
+    @classmethod
+    def from_samples(cls, samples: List[Dict]) -> 'Track':
+        """Build from tracking dicts (DynamoDB items or API payloads) carrying ``lastUpdate``"""
+        if not samples:
+            return cls.empty()
+        t = np.array([int(sample.get('lastUpdate') or 0) for sample in samples], dtype=np.int64)
+        columns = {
+            field: np.array([float(sample.get(field) or 0) for sample in samples], dtype=np.float64)
+            for field in TRACKING_FIELDS
+        }
+        return cls(t, columns, [sample.get('phase') or '' for sample in samples]).sorted()
+
+    @classmethod
+    def concat(cls, tracks: List['Track']) -> 'Track':
+        tracks = [track for track in tracks if len(track)]
+        if not tracks:
+            return cls.empty()
+        if len(tracks) == 1:
+            return tracks[0]
+        return cls(
+            np.concatenate([track.t for track in tracks]),
+            {field: np.concatenate([track.columns[field] for track in tracks]) for field in TRACKING_FIELDS},
+            [phase for track in tracks for phase in track.phase]
+        ).sorted()
+
+    def __len__(self):
+        return len(self.t)
+
+    def take(self, indices: np.ndarray) -> 'Track':
+        return Track(
+            self.t[indices],
+            {field: values[indices] for field, values in self.columns.items()},
+            [self.phase[i] for i in indices.tolist()]
+        )
+
+    def sorted(self) -> 'Track':
+        """Order by time, keeping the last copy of any duplicated timestamp"""
+        if len(self.t) < 2 or (np.all(np.diff(self.t) > 0)):
+            return self
+        order = np.argsort(self.t, kind='stable')
+        t = self.t[order]
+        keep = np.append(t[1:] != t[:-1], True)
+        return self.take(order[keep])
+
+    def window(self, start_ms: Optional[int], end_ms: Optional[int]) -> 'Track':
+        lo = 0 if start_ms is None else int(np.searchsorted(self.t, start_ms, side='left'))
+        hi = len(self.t) if end_ms is None else int(np.searchsorted(self.t, end_ms, side='right'))
+        if lo == 0 and hi == len(self.t):
+            return self
+        return self.take(np.arange(lo, hi))
+
+    def downsample(self, max_points: int) -> 'Track':
+        if len(self) <= max_points:
+            return self
+        return self.take(lttb_indices(self.columns['longitude'], self.columns['latitude'], max_points))
+
+    def points(self) -> List[Dict]:
+        values = {field: column.tolist() for field, column in self.columns.items()}
+        return [
+            {'t': t, **{field: values[field][i] for field in TRACKING_FIELDS}, 'phase': self.phase[i]}
+            for i, t in enumerate(self.t.tolist())
+        ]
+
+
+def page_track(track: Track, limit: int, truncated: bool) -> Tuple[Track, Optional[int]]:
+    """First ``limit`` samples of a time-ordered track and the ``start_ms`` of the next page
+
+    ``track`` should hold up to ``limit + 1`` samples, so an extra sample shows
+    that more exist. The next page starts at the first sample not returned, and
+    the page stops before a millisecond that continues past the cut, so a page
+    never exceeds ``limit`` samples and no sample is skipped. When the read was
+    ``truncated`` without reaching ``limit``, the track is complete up to its
+    last sample and the next page starts just after it.
+    """
+    if len(track) > limit:
+        next_start = int(track.t[limit])
+        end = int(np.searchsorted(track.t, next_start, side='left'))
+        if end == 0:
+            # One millisecond holds more than a page; return all of it rather than loop
+            end = int(np.searchsorted(track.t, next_start, side='right'))
+            next_start = next_start + 1 if end < len(track) or truncated else None
+        return track.take(np.arange(end)), next_start
+    if truncated and len(track):
+        return track, int(track.t[-1]) + 1
+    return track, None
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets selection of ``n_out`` indices (first and last always kept).
+
+    Bucket bounds and next-bucket centroids are computed for all buckets at
+    once; only the dependency on the previously selected point is sequential,
+    and each bucket's triangle areas are evaluated as one array expression.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array(sorted({0, n - 1}), dtype=np.int64)
+
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    # Centroid of each following bucket (the last bucket looks ahead to the final point)
+    cx, cy = np.cumsum(np.append(0.0, x)), np.cumsum(np.append(0.0, y))
+    next_starts = np.append(starts[1:], n - 1)
+    next_ends = np.append(ends[1:], n)
+    counts = next_ends - next_starts
+    avg_x = (cx[next_ends] - cx[next_starts]) / counts
+    avg_y = (cy[next_ends] - cy[next_starts]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for bucket, (lo, hi) in enumerate(zip(starts.tolist(), ends.tolist())):
+        if hi <= lo:
+            hi = lo + 1
+        bx, by = x[lo:hi], y[lo:hi]
+        areas = np.abs((x[prev] - avg_x[bucket]) * (by - y[prev]) - (x[prev] - bx) * (avg_y[bucket] - y[prev]))
+        prev = lo + int(np.argmax(areas))
+        selected[bucket + 1] = prev
+    return selected
+
+
+def _item_key(item: Dict) -> Dict:
+    return {'device_id': item['device_id'], 'timestamp': item['timestamp']}
+
+
+def _in_window_before(tracks: List[Track], start_ms: Optional[int], boundary: int) -> int:
+    lower = start_ms if start_ms is not None else np.iinfo(np.int64).min
+    return sum(int(np.count_nonzero((track.t >= lower) & (track.t < boundary))) for track in tracks)
+
+
+async def load_sample_items(
+    telemetry_table: AsyncTable,
+    device_id: str,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    max_items: Optional[int] = None,
+    keys: Optional[List[Dict]] = None,
+) -> Tuple[Track, Optional[int]]:
+    """Query per-sample telemetry items for a time range, following LastEvaluatedKey
+    
+    Returns the track and, when ``max_items`` cut the query short, the time
+    before which the track is complete. The primary key of every item read is
+    appended to ``keys`` when it is given.
+    """
+    condition = Key('device_id').eq(device_id)
+    if start_ms is not None and end_ms is not None:
+        condition = condition & Key('timestamp').between(start_ms // 1000, end_ms // 1000)
+    elif start_ms is not None:
+        condition = condition & Key('timestamp').gte(start_ms // 1000)
+    elif end_ms is not None:
+        condition = condition & Key('timestamp').lte(end_ms // 1000)
+
+    kwargs = {'KeyConditionExpression': condition}
+    items: List[Dict] = []
+    in_window = 0
+    while True:
+        if max_items is not None:
+            kwargs['Limit'] = max_items - in_window
+        response = await telemetry_table.query(**kwargs)
+        page = response.get('Items', [])
+        items.extend(page)
+        if keys is not None:
+            keys.extend(_item_key(item) for item in page)
+        # Range keys are whole seconds, so the first page can start before start_ms
+        in_window += sum(1 for item in page if start_ms is None or int(item.get('lastUpdate') or 0) >= start_ms)
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return Track.from_samples(items).window(start_ms, end_ms), None
+        if max_items is not None and in_window >= max_items:
+            # Later items share or follow the last key's second
+            return Track.from_samples(items).window(start_ms, end_ms), int(last_key['timestamp']) * 1000
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+async def load_chunk_samples(
+    telemetry_table: AsyncTable,
+    device_id: str,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    max_samples: Optional[int] = None,
+    keys: Optional[List[Dict]] = None,
+) -> Tuple[Track, Optional[int]]:
+    """Query and decode the compressed chunks overlapping a time range
+    
+    Chunks are keyed by their first sample, so the query starts
+    ``CHUNK_LOOKBACK_MS`` early to catch chunks that began before
+    ``start_ms``. Returns the track and, when ``max_samples`` cut the query
+    short, the time before which the track is complete. The primary key of
+    every decoded chunk is appended to ``keys`` when it is given.
+    """
+    condition = Key('device_id').eq(chunk_partition(device_id))
+    low = None if start_ms is None else max(start_ms - CHUNK_LOOKBACK_MS, 0) * SLOTS_PER_MS
+    high = None if end_ms is None else (end_ms + 1) * SLOTS_PER_MS - 1
+    if low is not None and high is not None:
+        condition = condition & Key('timestamp').between(low, high)
+    elif low is not None:
+        condition = condition & Key('timestamp').gte(low)
+    elif high is not None:
+        condition = condition & Key('timestamp').lte(high)
+
+    kwargs = {'KeyConditionExpression': condition}
+    tracks: List[Track] = []
+    while True:
+        response = await telemetry_table.query(**kwargs)
+        for item in response.get('Items', []):
+            if start_ms is not None and int(item['end_ms']) < start_ms:
+                continue
+            tracks.append(Track(*decode_chunk(item)))
+            if keys is not None:
+                keys.append(_item_key(item))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return Track.concat(tracks).window(start_ms, end_ms), None
+        # Unread chunks start at or after the last key, so samples before it are final
+        boundary = int(last_key['timestamp']) // SLOTS_PER_MS
+        if max_samples is not None and _in_window_before(tracks, start_ms, boundary) >= max_samples:
+            return Track.concat(tracks).window(start_ms, end_ms), boundary
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+async def load_track(
+    telemetry_table: AsyncTable,
+    device_id: str,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    max_samples: Optional[int] = None,
+    keys: Optional[List[Dict]] = None,
+) -> Tuple[Track, bool]:
+    """Recorded samples for a mission from both storage layouts
+    
+    With ``max_samples`` the read may stop early; the second value is then
+    True and the track is complete only up to its last sample. ``keys``
+    collects the primary keys of the items and chunks that were read.
+    """
+    (items, items_until), (chunks, chunks_until) = await asyncio.gather(
+        load_sample_items(telemetry_table, device_id, start_ms, end_ms, max_samples, keys),
+        load_chunk_samples(telemetry_table, device_id, start_ms, end_ms, max_samples, keys),
+    )
+    track = Track.concat([items, chunks])
+    bounds = [bound for bound in (items_until, chunks_until) if bound is not None]
+    if not bounds:
+        return track, False
+    return track.window(None, min(bounds) - 1), True
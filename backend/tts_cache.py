@@ -0,0 +1,297 @@
+"""Content-addressed cache for Polly speech.
+
+Audio is keyed by a SHA-256 of voice, engine, output format and text, and
+stored once in S3 at ``tts/<digest>.mp3``. A byte-bounded in-memory LRU sits
+in front of S3, so repeated phrases ("roger", "cleared for takeoff") never
+reach Polly again. On a miss, the streaming path relays Polly's audio to the
+client chunk by chunk and fills both cache tiers as it goes. Concurrent
+requests for the same phrase share one synthesis.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from aws_async import AsyncClient
+
+TTS_CACHE_PREFIX = os.environ.get('TTS_CACHE_PREFIX', 'tts/')
+TTS_CACHE_MEMORY_BYTES = int(os.environ.get('TTS_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+TTS_DEFAULT_VOICE = os.environ.get('TTS_DEFAULT_VOICE', 'Joanna')
+TTS_DEFAULT_ENGINE = os.environ.get('TTS_DEFAULT_ENGINE', 'neural')
+TTS_OUTPUT_FORMAT = 'mp3'
+TTS_STREAM_CHUNK_BYTES = 8192
+# Remember which digests are already in S3 without a HEAD per request
+KNOWN_KEYS_LIMIT = 100000
+
+
+def tts_digest(text: str, voice: str, engine: str, output_format: str = TTS_OUTPUT_FORMAT) -> str:
+    return hashlib.sha256(f"{voice}\n{engine}\n{output_format}\n{text}".encode()).hexdigest()
+
+
+def _not_found(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+
+class TTSCache:
+    """Polly synthesis behind an in-memory LRU and a content-addressed S3 prefix"""
+
+    def __init__(self, polly: AsyncClient, s3: AsyncClient, bucket: str, memory_bytes: int = TTS_CACHE_MEMORY_BYTES):
+        self.polly = polly
+        self.s3 = s3
+        self.bucket = bucket
+        self.memory_bytes = memory_bytes
+        self._memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_size = 0
+        self._in_s3: 'OrderedDict[str, None]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._uploads = set()
+
+        self.memory_hits = 0
+        self.s3_hits = 0
+        self.misses = 0
+        self.synthesized_chars = 0
+        self.uploads = 0
+        self.upload_errors = 0
+        self.first_chunk_ms = 0.0
+
+    def s3_key(self, digest: str) -> str:
+        return f"{TTS_CACHE_PREFIX}{digest}.mp3"
+
+    def url(self, digest: str) -> Optional[str]:
+        if not self.bucket:
+            return None
+        return f"https://{self.bucket}.s3.amazonaws.com/{self.s3_key(digest)}"
+
+    # ---- tiers ----
+
+    def _remember(self, digest: str, audio: bytes):
+        if digest in self._memory or len(audio) > self.memory_bytes:
+            return
+        self._memory[digest] = audio
+        self._memory_size += len(audio)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _from_memory(self, digest: str) -> Optional[bytes]:
+        audio = self._memory.get(digest)
+        if audio is not None:
+            self._memory.move_to_end(digest)
+        return audio
+
+    def _mark_in_s3(self, digest: str):
+        self._in_s3[digest] = None
+        self._in_s3.move_to_end(digest)
+        while len(self._in_s3) > KNOWN_KEYS_LIMIT:
+            self._in_s3.popitem(last=False)
+
+    async def _in_bucket(self, digest: str) -> bool:
+        if not self.bucket:
+            return False
+        if digest in self._in_s3:
+            return True
+        try:
+            await self.s3.head_object(Bucket=self.bucket, Key=self.s3_key(digest))
+        except ClientError as e:
+            if _not_found(e):
+                return False
+            raise
+        self._mark_in_s3(digest)
+        return True
+
+    async def _upload(self, digest: str, audio: bytes):
+        if not self.bucket:
+            return
+        try:
+            await self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.s3_key(digest),
+                Body=audio,
+                ContentType='audio/mpeg',
+                CacheControl='public, max-age=31536000, immutable'
+            )
+            self._mark_in_s3(digest)
+            self.uploads += 1
+        except ClientError as e:
+            self.upload_errors += 1
+            print(f"TTS cache upload failed: {e}")
+
+    def _upload_later(self, digest: str, audio: bytes):
+        task = asyncio.create_task(self._upload(digest, audio))
+        self._uploads.add(task)
+        task.add_done_callback(self._uploads.discard)
+
+    async def _synthesize(self, text: str, voice: str, engine: str) -> bytes:
+        self.synthesized_chars += len(text)
+        return await self.polly.run(lambda: self.polly.client.synthesize_speech(
+            Text=text,
+            OutputFormat=TTS_OUTPUT_FORMAT,
+            VoiceId=voice,
+            Engine=engine
+        )['AudioStream'].read())
+
+    # ---- public API ----
+
+    async def audio(self, text: str, voice: str = TTS_DEFAULT_VOICE, engine: str = TTS_DEFAULT_ENGINE) -> Tuple[bytes, str, bool]:
+        """Complete audio for a phrase as (mp3, digest, cached); concurrent misses share one synthesis"""
+        digest = tts_digest(text, voice, engine)
+        while True:
+            audio = self._from_memory(digest)
+            if audio is not None:
+                self.memory_hits += 1
+                return audio, digest, True
+            pending = self._inflight.get(digest)
+            if pending is None:
+                break
+            # Joiners report what the leader did: an S3 read is cached, a synthesis is not
+            result = await asyncio.shield(pending)
+            if result is not None:
+                return result[0], digest, result[1]
+            # The leader gave up part-way (client went away); take over
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            cached = await self._in_bucket(digest)
+            if cached:
+                audio = await self.s3.run(lambda: self.s3.client.get_object(Bucket=self.bucket, Key=self.s3_key(digest))['Body'].read())
+                self.s3_hits += 1
+            else:
+                self.misses += 1
+                audio = await self._synthesize(text, voice, engine)
+                await self._upload(digest, audio)
+            self._remember(digest, audio)
+            future.set_result((audio, cached))
+            return audio, digest, cached
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting on it
+            future.exception()
+            raise
+        finally:
+            self._finish(digest, future)
+
+    def _finish(self, digest: str, future: asyncio.Future):
+        if self._inflight.get(digest) is future:
+            del self._inflight[digest]
+        if not future.done():
+            future.set_result(None)
+
+    async def ensure_url(self, text: str, voice: str = TTS_DEFAULT_VOICE, engine: str = TTS_DEFAULT_ENGINE) -> Tuple[Optional[str], bool]:
+        """S3 URL of the phrase's audio, synthesising and uploading it on a miss"""
+        digest = tts_digest(text, voice, engine)
+        if self._from_memory(digest) is not None and digest in self._in_s3:
+            self.memory_hits += 1
+            return self.url(digest), True
+        if await self._in_bucket(digest):
+            self.s3_hits += 1
+            return self.url(digest), True
+        _, digest, cached = await self.audio(text, voice, engine)
+        return self.url(digest), cached
+
+    async def stream(self, text: str, voice: str = TTS_DEFAULT_VOICE, engine: str = TTS_DEFAULT_ENGINE) -> Tuple[str, bool, AsyncIterator[bytes]]:
+        """(digest, cached, chunks): cached audio in one piece, otherwise Polly's stream as it arrives"""
+        digest = tts_digest(text, voice, engine)
+        audio = self._from_memory(digest)
+        if audio is not None:
+            self.memory_hits += 1
+            return digest, True, self._single(audio)
+        in_bucket = digest not in self._inflight and await self._in_bucket(digest)
+        if in_bucket or digest in self._inflight:
+            # Join the synthesis already running for this phrase, or read it from S3
+            audio, _, cached = await self.audio(text, voice, engine)
+            return digest, cached, self._single(audio)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        relay = self._relay(digest, future, text, voice, engine)
+        # Wait for the first chunk so Polly errors surface before the response starts
+        try:
+            first = await relay.__anext__()
+        except StopAsyncIteration:
+            first = b''
+        return digest, False, self._chain(first, relay)
+
+    async def _single(self, audio: bytes) -> AsyncIterator[bytes]:
+        yield audio
+
+    async def _chain(self, first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            yield first
+            async for chunk in rest:
+                yield chunk
+        finally:
+            await rest.aclose()
+
+    async def _relay(self, digest: str, future: asyncio.Future, text: str, voice: str, engine: str) -> AsyncIterator[bytes]:
+        """Read Polly's AudioStream on the Polly pool, yield each chunk, cache the whole
+
+        ``future`` is this synthesis' entry in the in-flight map; callers that
+        join it get the complete audio once the stream ends.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        started = time.perf_counter()
+        self.synthesized_chars += len(text)
+
+        def pump():
+            try:
+                stream = self.polly.client.synthesize_speech(
+                    Text=text,
+                    OutputFormat=TTS_OUTPUT_FORMAT,
+                    VoiceId=voice,
+                    Engine=engine
+                )['AudioStream']
+                for chunk in stream.iter_chunks(TTS_STREAM_CHUNK_BYTES):
+                    if cancelled.is_set():
+                        stream.close()
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        reader = asyncio.ensure_future(self.polly.run(pump))
+        parts = []
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                if not parts:
+                    self.first_chunk_ms = (time.perf_counter() - started) * 1000
+                parts.append(chunk)
+                yield chunk
+            await reader
+            # Only complete audio is cached
+            audio = b''.join(parts)
+            self._remember(digest, audio)
+            future.set_result((audio, False))
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            cancelled.set()
+            self._finish(digest, future)
+        self._upload_later(digest, audio)
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.s3_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "memory_hits": self.memory_hits,
+            "s3_hits": self.s3_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.s3_hits) / lookups, 3) if lookups else None,
+            "synthesized_chars": self.synthesized_chars,
+            "uploads": self.uploads,
+            "upload_errors": self.upload_errors,
+            "last_first_chunk_ms": round(self.first_chunk_ms, 1),
+        }
@@ -1,27 +1,55 @@
 """
 WebSocket Server for Simulator Plugins
-Bridges WebSocket connections to REST API
+Bridges WebSocket connections to a pluggable telemetry sink
 """
+import os
 import asyncio
 import json
 import websockets
-import requests
 from datetime import datetime
-from typing import Set
+from typing import Optional, Set
+
+from telemetry_frames import FORMAT_JSON, SUPPORTED_FORMATS, FrameError, decode_frame
+from telemetry_sinks import API_URL, TelemetrySink, create_sink
 
 # Configuration
 WS_HOST = "0.0.0.0"
 WS_PORT_XPLANE = 8787
 WS_PORT_MSFS = 8788
-API_URL = "http://localhost:8001"
+TELEMETRY_SINK = os.environ.get("TELEMETRY_SINK", "http")  # http, batched-http
+API_STATS_INTERVAL_SECONDS = float(os.environ.get("API_STATS_INTERVAL_SECONDS", 60))
 
 # Connected clients
 xplane_clients: Set[websockets.WebSocketServerProtocol] = set()
 msfs_clients: Set[websockets.WebSocketServerProtocol] = set()
 
+# Destination for telemetry (set by run_bridge)
+sink: Optional[TelemetrySink] = None
+
+class BridgeSession:
+    """Per-connection state for a simulator plugin"""
+    
+    def __init__(self, websocket, simulator: str):
+        self.websocket = websocket
+        self.simulator = simulator
+        self.format = FORMAT_JSON  # binary frames are accepted once negotiated
+        self.authorization = handshake_authorization(websocket)
+        self.warned_unauthenticated = False
+    
+    def set_token(self, token: Optional[str]):
+        if token:
+            self.authorization = token if token.startswith('Bearer ') else f"Bearer {token}"
+
+def handshake_authorization(websocket) -> Optional[str]:
+    """Authorization header sent with the WebSocket upgrade request, if any"""
+    request = getattr(websocket, 'request', None)
+    headers = request.headers if request is not None else getattr(websocket, 'request_headers', None)
+    return headers.get('Authorization') if headers is not None else None
+
 async def handle_xplane_client(websocket):
     """Handle X-Plane plugin connections"""
     xplane_clients.add(websocket)
+    session = BridgeSession(websocket, "xplane")
     print(f"[X-Plane] Client connected from {websocket.remote_address}")
     
     try:
@@ -30,18 +58,24 @@ async def handle_xplane_client(websocket):
             "type": "status",
             "status": "connected",
             "simulator": "xplane",
-            "version": "2.0.0"
+            "version": "2.0.0",
+            "formats": SUPPORTED_FORMATS
         }))
         
         async for message in websocket:
             try:
-                data = json.loads(message)
-                await process_message(data, "xplane")
+                if isinstance(message, bytes):
+                    await process_binary_frame(message, session)
+                else:
+                    data = json.loads(message)
+                    await process_message(data, session)
             except json.JSONDecodeError:
                 print(f"[X-Plane] Invalid JSON: {message}")
+            except FrameError as e:
+                print(f"[X-Plane] Invalid telemetry frame: {e}")
             except Exception as e:
                 print(f"[X-Plane] Error processing message: {e}")
-                
+    
     except websockets.exceptions.ConnectionClosed:
         print("[X-Plane] Client disconnected")
     finally:
@@ -50,6 +84,7 @@ async def handle_xplane_client(websocket):
 async def handle_msfs_client(websocket):
     """Handle MSFS plugin connections"""
     msfs_clients.add(websocket)
+    session = BridgeSession(websocket, "msfs")
     print(f"[MSFS] Client connected from {websocket.remote_address}")
     
     try:
@@ -58,35 +93,58 @@ async def handle_msfs_client(websocket):
             "type": "status",
             "status": "connected",
             "simulator": "msfs",
-            "version": "1.0.0"
+            "version": "1.0.0",
+            "formats": SUPPORTED_FORMATS
         }))
         
         async for message in websocket:
             try:
-                data = json.loads(message)
-                await process_message(data, "msfs")
+                if isinstance(message, bytes):
+                    await process_binary_frame(message, session)
+                else:
+                    data = json.loads(message)
+                    await process_message(data, session)
             except json.JSONDecodeError:
                 print(f"[MSFS] Invalid JSON: {message}")
+            except FrameError as e:
+                print(f"[MSFS] Invalid telemetry frame: {e}")
             except Exception as e:
                 print(f"[MSFS] Error processing message: {e}")
-                
+    
     except websockets.exceptions.ConnectionClosed:
         print("[MSFS] Client disconnected")
     finally:
         msfs_clients.remove(websocket)
 
-async def process_message(data: dict, simulator: str):
+async def process_message(data: dict, session: BridgeSession):
     """Process messages from simulator plugins"""
     msg_type = data.get('type')
+    simulator = session.simulator
     
     if msg_type == 'ping':
         # Respond to ping
         return
     
+    elif msg_type == 'auth':
+        # Plugins may authenticate once per connection instead of per frame
+        session.set_token(data.get('token'))
+    
+    elif msg_type == 'format':
+        # Plugins opt into binary telemetry frames after the welcome message
+        requested = data.get('format')
+        if requested in SUPPORTED_FORMATS:
+            session.format = requested
+        await session.websocket.send(json.dumps({
+            "type": "format",
+            "format": session.format,
+            "accepted": requested == session.format
+        }))
+    
     elif msg_type == 'telemetry':
-        # Forward telemetry to REST API
+        # Forward telemetry to the configured sink
         telemetry_data = data.get('data', {})
         mission_id = telemetry_data.get('missionId')
+        session.set_token(data.get('token'))
         
         if mission_id:
             try:
@@ -102,31 +160,39 @@ async def process_message(data: dict, simulator: str):
                     'fuel_remaining_lbs': telemetry_data.get('fuelRemainingLbs', 0),
                     'time_enroute_minutes': telemetry_data.get('timeEnrouteMinutes', 0),
                     'phase': telemetry_data.get('phase', 'Dispatch'),
-                    'engine_status': telemetry_data.get('engineStatus', 'Running')
+                    'engine_status': telemetry_data.get('engineStatus', 'Running'),
+                    'timestamp_ms': data.get('timestamp')
                 }
                 
-                # Send to REST API (non-blocking)
-                asyncio.create_task(send_telemetry_to_api(mission_id, payload))
+                if not session.authorization and not session.warned_unauthenticated:
+                    session.warned_unauthenticated = True
+                    print(f"[{simulator.upper()}] No credentials on connection; telemetry for {mission_id} will be dropped")
                 
-                print(f"[{simulator.upper()}] Telemetry for {mission_id}: {telemetry_data.get('phase')} @ {telemetry_data.get('latitude'):.4f}, {telemetry_data.get('longitude'):.4f}")
+                await sink.send(mission_id, payload, session.authorization)
                 
+                print(f"[{simulator.upper()}] Telemetry for {mission_id}: {telemetry_data.get('phase')} @ {telemetry_data.get('latitude'):.4f}, {telemetry_data.get('longitude'):.4f}")
+            
             except Exception as e:
                 print(f"[{simulator.upper()}] Error forwarding telemetry: {e}")
 
-async def send_telemetry_to_api(mission_id: str, payload: dict):
-    """Send telemetry to REST API (async)"""
-    try:
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: requests.put(
-                f"{API_URL}/api/missions/{mission_id}/telemetry",
-                json=payload,
-                timeout=2
-            )
-        )
-    except Exception as e:
-        print(f"[API] Error sending telemetry: {e}")
+async def process_binary_frame(frame: bytes, session: BridgeSession):
+    """Decode a negotiated binary frame and forward its samples to the sink"""
+    if session.format == FORMAT_JSON:
+        raise FrameError("binary frames were not negotiated on this connection")
+    
+    mission_id, payloads = decode_frame(frame)
+    if not session.authorization and not session.warned_unauthenticated:
+        session.warned_unauthenticated = True
+        print(f"[{session.simulator.upper()}] No credentials on connection; telemetry for {mission_id} will be dropped")
+    
+    await sink.send_many(mission_id, payloads, session.authorization)
+
+async def report_sink_stats():
+    """Periodically log telemetry delivery latency"""
+    while True:
+        await asyncio.sleep(API_STATS_INTERVAL_SECONDS)
+        if sink.latency.requests:
+            print(f"[Bridge] {sink.stats()}")
 
 async def broadcast_to_clients(message: dict, simulator: str = "all"):
     """Broadcast message to connected clients"""
@@ -158,6 +224,21 @@ async def start_msfs_server():
         print(f"[MSFS] WebSocket server running on ws://{WS_HOST}:{WS_PORT_MSFS}")
         await asyncio.Future()  # run forever
 
+async def run_bridge(telemetry_sink: TelemetrySink):
+    """Run both WebSocket servers, delivering telemetry to the given sink"""
+    global sink
+    sink = telemetry_sink
+    await sink.start()
+    try:
+        # Run both servers concurrently
+        await asyncio.gather(
+            start_xplane_server(),
+            start_msfs_server(),
+            report_sink_stats()
+        )
+    finally:
+        await sink.close()
+
 async def main():
     """Start both WebSocket servers"""
     print("="*60)
@@ -166,14 +247,11 @@ async def main():
     print(f"X-Plane Port: {WS_PORT_XPLANE}")
     print(f"MSFS Port: {WS_PORT_MSFS}")
     print(f"API URL: {API_URL}")
+    print(f"Telemetry Sink: {TELEMETRY_SINK}")
     print("="*60)
     print()
     
-    # Run both servers concurrently
-    await asyncio.gather(
-        start_xplane_server(),
-        start_msfs_server()
-    )
+    await run_bridge(create_sink(TELEMETRY_SINK))
 
 if __name__ == "__main__":
     try:
@@ -244,6 +244,14 @@ class VirtualHEMSAPITester:
             401
         )
         
+        self.run_test(
+            "Unauthorized Batch Telemetry",
+            "PUT",
+            "api/missions/HEMS-TEST/telemetry/batch",
+            401,
+            data=[]
+        )
+        
         # Restore token
         self.token = original_token
 
@@ -79,10 +79,16 @@ export const supabase = {
         
         const executeQuery = async () => {
           try {
-            const result = await apiRequest(buildQuery());
+            let result = await apiRequest(buildQuery());
             // Extract data from response object (e.g., { bases: [...] })
             const dataKey = Object.keys(result).find(k => Array.isArray(result[k]));
-            const data = dataKey ? result[dataKey] : result;
+            const data = dataKey ? [...result[dataKey]] : result;
+            // Follow cursor-paginated endpoints to the last page
+            while (dataKey && result.next_cursor) {
+              queryParams.cursor = result.next_cursor;
+              result = await apiRequest(buildQuery());
+              data.push(...result[dataKey]);
+            }
             return { data, error: null };
           } catch (error) {
             console.error('API Error:', error);
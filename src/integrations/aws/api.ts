@@ -80,6 +80,38 @@ class APIClient {
     return response.json();
   }
   
+  // POST that reads a text/event-stream response, calling onEvent per message
+  async stream<T>(endpoint: string, data: unknown, onEvent: (event: T) => void): Promise<void> {
+    if (!this.baseUrl) await this.init();
+    
+    const response = await fetch(`${this.baseUrl}${endpoint}`, {
+      method: 'POST',
+      headers: await this.getHeaders(true),
+      body: JSON.stringify(data)
+    });
+    
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: response.statusText }));
+      throw new Error(error.detail || 'Request failed');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        if (message.startsWith('data: ')) onEvent(JSON.parse(message.slice(6)));
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+  }
+  
   async delete<T>(endpoint: string): Promise<T> {
     if (!this.baseUrl) await this.init();
     
@@ -151,6 +183,25 @@ export interface Mission {
   updated_at: string;
 }
 
+// Position-only record served by /api/missions/active from the in-memory fleet state
+export interface ActiveMission {
+  mission_id: string;
+  user_id: string | null;
+  callsign: string | null;
+  tracking: {
+    latitude: number;
+    longitude: number;
+    altitudeFt: number;
+    groundSpeedKts: number;
+    headingDeg: number;
+    verticalSpeedFtMin: number;
+    fuelRemainingLbs: number;
+    timeEnrouteMinutes: number;
+    phase: string;
+    lastUpdate: number;
+  };
+}
+
 export interface HemsBase {
   id: string;
   name: string;
@@ -199,18 +250,41 @@ export const authAPI = {
 };
 
 export const profilesAPI = {
-  getAll: async () => api.get<{ profiles: UserProfile[] }>('/api/profiles'),
+  getPage: async (cursor?: string, limit = 100) =>
+    api.get<{ profiles: UserProfile[]; next_cursor: string | null }>(
+      `/api/profiles?limit=${limit}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`
+    ),
+  getAll: async () => {
+    const profiles: UserProfile[] = [];
+    let cursor: string | undefined;
+    do {
+      const page = await profilesAPI.getPage(cursor, 500);
+      profiles.push(...page.profiles);
+      cursor = page.next_cursor ?? undefined;
+    } while (cursor);
+    return { profiles };
+  },
   update: async (data: Partial<UserProfile>) => api.put<{ success: boolean }>('/api/profiles/me', data),
   rotateKey: async () => api.post<{ api_key: string }>('/api/profiles/rotate-key')
 };
 
+export interface RadioLogMessage {
+  seq: number;
+  channel: 'dispatch' | 'atc';
+  sender: string;
+  message: string;
+  timestamp: string;
+}
+
 export const missionsAPI = {
   create: async (data: any) => api.post<{ success: boolean; mission_id: string; mission: Mission }>('/api/missions', data),
   getAll: async (status?: string) => api.get<{ missions: Mission[] }>(`/api/missions${status ? `?status=${status}` : ''}`),
-  getActive: async () => api.get<{ missions: Mission[] }>('/api/missions/active'),
+  getActive: async () => api.get<{ missions: ActiveMission[] }>('/api/missions/active'),
   getById: async (id: string) => api.get<{ mission: Mission }>(`/api/missions/${id}`),
   updateTelemetry: async (id: string, data: any) => api.put<{ success: boolean }>(`/api/missions/${id}/telemetry`, data),
-  complete: async (id: string) => api.put<{ success: boolean }>(`/api/missions/${id}/complete`)
+  complete: async (id: string) => api.put<{ success: boolean }>(`/api/missions/${id}/complete`),
+  getRadioLog: async (id: string, limit = 200) =>
+    api.get<{ mission_id: string; summary: string; messages: RadioLogMessage[] }>(`/api/missions/${id}/radio?limit=${limit}`)
 };
 
 export const dataAPI = {
@@ -219,11 +293,24 @@ export const dataAPI = {
   getHelicopters: async () => api.getPublic<{ helicopters: Helicopter[] }>('/api/helicopters')
 };
 
+// Server-sent events from the streaming AI endpoints
+export type AIStreamEvent =
+  | { type: 'delta'; text: string }
+  | { type: 'done'; success: boolean; response_text: string; [key: string]: unknown }
+  | { type: 'error'; detail: string };
+
+export type ATCSpeechEvent =
+  | { type: 'sentence'; index: number; text: string; audio: string }
+  | { type: 'done'; success: boolean; response_text: string; cached: boolean; [key: string]: unknown }
+  | { type: 'error'; detail: string };
+
 export const dispatchAPI = {
   sendMessage: async (missionId: string, message: string) =>
-    api.post<{ success: boolean; response_text: string }>('/api/dispatch/ai', { mission_id: missionId, message }),
+    api.post<{ success: boolean; response_text: string; cached?: boolean }>('/api/dispatch/ai', { mission_id: missionId, message }),
+  streamMessage: async (missionId: string, message: string, onEvent: (event: AIStreamEvent) => void) =>
+    api.stream<AIStreamEvent>('/api/dispatch/ai/stream', { mission_id: missionId, message }, onEvent),
   generateTTS: async (text: string) =>
-    api.post<{ audio_url: string }>('/api/dispatch/tts', { text })
+    api.post<{ audio_url: string; cached?: boolean }>('/api/dispatch/tts', { text })
 };
 
 export const atcAPI = {
@@ -231,6 +318,8 @@ export const atcAPI = {
     api.post<{ 
       success: boolean; 
       response_text: string; 
+      cached?: boolean;
+      local?: boolean;
       controller_type: string;
       airport_code?: string;
       frequency?: string;
@@ -240,5 +329,36 @@ export const atcAPI = {
       controller_type: controllerType,
       airport_code: airportCode,
       frequency: frequency
-    })
+    }),
+  contactStream: async (
+    missionId: string,
+    message: string,
+    controllerType: string,
+    onEvent: (event: AIStreamEvent) => void,
+    airportCode?: string,
+    frequency?: string
+  ) =>
+    api.stream<AIStreamEvent>('/api/atc/contact/stream', {
+      mission_id: missionId,
+      message,
+      controller_type: controllerType,
+      airport_code: airportCode,
+      frequency: frequency
+    }, onEvent),
+  // Each sentence event carries base64 MP3 that can be played while later sentences are still generating
+  contactSpeech: async (
+    missionId: string,
+    message: string,
+    controllerType: string,
+    onEvent: (event: ATCSpeechEvent) => void,
+    airportCode?: string,
+    frequency?: string
+  ) =>
+    api.stream<ATCSpeechEvent>('/api/atc/contact/speech?format=sse', {
+      mission_id: missionId,
+      message,
+      controller_type: controllerType,
+      airport_code: airportCode,
+      frequency: frequency
+    }, onEvent)
 };